@@ -0,0 +1,5 @@
+# Este archivo expone los destinos de alertas salientes y el dispatcher
+# para que puedan ser importados directamente desde 'alerts'
+
+from .dispatcher import AlertDispatcher, DeadLetterFile, SinkWorker
+from .sinks import AlertSink, SmtpSink, SyslogSink, WebhookSink, format_alert
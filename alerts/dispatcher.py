@@ -0,0 +1,180 @@
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Marca de fin que se encola al detener un worker
+_STOP = object()
+
+
+class DeadLetterFile:
+    """
+    Archivo NDJSON donde quedan los lotes de alertas que no se pudieron
+    entregar, con el destino, el error y la fecha, para reenviarlos a mano.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, sink_name, events, error):
+        entry = {
+            'sink': sink_name,
+            'failed_at': datetime.now(timezone.utc).isoformat(),
+            'error': error,
+            'alerts': events,
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+class SinkWorker:
+    """
+    Cola acotada y hilo de envío de un destino de alertas.
+
+    El hilo junta las alertas que llegan en ráfaga (hasta 'batch_size' o
+    durante 'batch_window' segundos) y las entrega juntas. Si el envío
+    falla se reintenta con backoff exponencial (backoff, 2*backoff, ...
+    hasta 'max_backoff') y, agotados los 'max_retries', el lote va al
+    dead-letter. Un destino lento o caído no demora a los demás.
+    """
+
+    def __init__(self, sink, dead_letter, queue_size=10000, batch_size=50, batch_window=2.0,
+                 max_retries=5, backoff=1.0, max_backoff=60.0):
+        self.sink = sink
+        self.dead_letter = dead_letter
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.sent = 0
+        self.batches = 0
+        self.retries = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None and not self._stopping.is_set():
+                self._thread = threading.Thread(target=self._run, name=f"alerts-{self.sink.name}", daemon=True)
+                self._thread.start()
+
+    def submit(self, events):
+        """Encola alertas sin esperar; si la cola está llena van al dead-letter."""
+        if self._thread is None:
+            self.start()
+        rejected = []
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                rejected.append(event)
+        if rejected:
+            with self._stats_lock:
+                self.dropped += len(rejected)
+            self.dead_letter.write(self.sink.name, rejected, "cola llena")
+
+    def stop(self, timeout=None):
+        """Entrega lo pendiente (sin reintentos) y detiene el hilo."""
+        with self._start_lock:
+            self._stopping.set()
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+        self.sink.close()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'sent': self.sent,
+                'batches': self.batches,
+                'retries': self.retries,
+                'dropped': self.dropped,
+                'dead_lettered': self.dead_lettered,
+            }
+
+    def _deliver(self, batch):
+        attempt = 0
+        while True:
+            try:
+                self.sink.send(batch)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if attempt >= self.max_retries or self._stopping.is_set():
+                    logger.warning("No se pudieron entregar %d alerta(s) a %s: %s", len(batch), self.sink.name, error)
+                    self.dead_letter.write(self.sink.name, batch, error)
+                    with self._stats_lock:
+                        self.dead_lettered += len(batch)
+                    return
+                delay = min(self.backoff * (2 ** attempt), self.max_backoff)
+                attempt += 1
+                with self._stats_lock:
+                    self.retries += 1
+                # Al detenerse se corta la espera y el lote va al dead-letter
+                self._stopping.wait(delay)
+                continue
+            with self._stats_lock:
+                self.sent += len(batch)
+                self.batches += 1
+            return
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._deliver(batch)
+            if stopping:
+                return
+
+
+class AlertDispatcher:
+    """
+    Reparte cada alerta a un SinkWorker por destino (webhook, syslog,
+    smtp). dispatch solo encola: el envío corre en los hilos de cada
+    destino y nunca agrega latencia al tracking ni a la ingesta.
+    """
+
+    def __init__(self, sinks, dead_letter_file, **worker_options):
+        self.dead_letter = DeadLetterFile(dead_letter_file)
+        self.workers = [SinkWorker(sink, self.dead_letter, **worker_options) for sink in sinks]
+
+    def dispatch(self, events):
+        if not events:
+            return
+        for worker in self.workers:
+            worker.submit(events)
+
+    def stop(self, timeout=None):
+        for worker in self.workers:
+            worker.stop(timeout)
+
+    def stats(self):
+        return {worker.sink.name: worker.stats() for worker in self.workers}
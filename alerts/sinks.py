@@ -0,0 +1,149 @@
+import json
+import smtplib
+import socket
+from datetime import datetime, timezone
+from email.message import EmailMessage
+
+import requests
+
+
+def format_alert(event):
+    """Línea de texto de una alerta (mismo formato que la alerta en consola)."""
+    return (f"ALERTA HIT | ID: {event['token']} | Tipo: {event.get('type')} | Descripción: {event.get('description')} "
+            f"| IP: {event.get('ip')} | UA: {event.get('user_agent')} | {event.get('timestamp')}")
+
+
+def parse_address(address, default_port):
+    """
+    (host, port) de 'host', 'host:port', '[ipv6]' o '[ipv6]:port'. Una
+    IPv6 sin corchetes se toma entera como host.
+    """
+    if address.startswith('['):
+        host, _, rest = address[1:].partition(']')
+        port = rest[1:] if rest.startswith(':') else ''
+    elif address.count(':') == 1:
+        host, _, port = address.partition(':')
+    else:
+        host, port = address, ''
+    try:
+        return host or 'localhost', int(port) if port else default_port
+    except ValueError:
+        raise ValueError(f"Puerto inválido en la dirección {address!r}") from None
+
+
+class AlertSink:
+    """
+    Destino de alertas. send recibe un lote de eventos (hits con el tipo y
+    la descripción del token) y lanza una excepción si no se pudo entregar,
+    para que el dispatcher lo reintente.
+    """
+
+    name = None
+
+    def send(self, events):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class WebhookSink(AlertSink):
+    """POST JSON {"count": N, "alerts": [...]} a una URL, un request por lote."""
+
+    name = 'webhook'
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send(self, events):
+        response = self.session.post(self.url, json={'count': len(events), 'alerts': events}, timeout=self.timeout)
+        response.raise_for_status()
+
+    def close(self):
+        self.session.close()
+
+
+class SyslogSink(AlertSink):
+    """
+    Un mensaje syslog (RFC 5424) por alerta, por UDP o TCP (con un salto de
+    línea como separador). 'address' es 'host:port' (ver parse_address,
+    el puerto por defecto es 514).
+    """
+
+    name = 'syslog'
+
+    # facility local0, severidad warning
+    PRIORITY = 16 * 8 + 4
+
+    def __init__(self, address, protocol='udp', timeout=5):
+        self.address = parse_address(address, 514)
+        self.protocol = protocol
+        self.timeout = timeout
+        self.hostname = socket.gethostname()
+        self._sock = None
+
+    def _message(self, event):
+        timestamp = datetime.now(timezone.utc).isoformat()
+        data = json.dumps(event, ensure_ascii=False)
+        return f"<{self.PRIORITY}>1 {timestamp} {self.hostname} tokensnare - hit - {format_alert(event)} {data}".encode('utf-8')
+
+    def _connect(self):
+        if self.protocol == 'tcp':
+            return socket.create_connection(self.address, timeout=self.timeout)
+        # La familia (IPv4/IPv6) depende de la dirección
+        family = socket.getaddrinfo(*self.address, type=socket.SOCK_DGRAM)[0][0]
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        sock.settimeout(self.timeout)
+        return sock
+
+    def send(self, events):
+        if self._sock is None:
+            self._sock = self._connect()
+        try:
+            if self.protocol == 'tcp':
+                self._sock.sendall(b''.join(self._message(event) + b'\n' for event in events))
+            else:
+                for event in events:
+                    self._sock.sendto(self._message(event), self.address)
+        except OSError:
+            # Se reconecta en el próximo intento
+            self.close()
+            raise
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class SmtpSink(AlertSink):
+    """Un mail por lote con una línea por alerta y el detalle en JSON."""
+
+    name = 'smtp'
+
+    def __init__(self, host, port, sender, recipients, username=None, password=None, starttls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send(self, events):
+        message = EmailMessage()
+        message['Subject'] = f"TokenSnare: {len(events)} alerta(s) de honeytokens"
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        summary = '\n'.join(format_alert(event) for event in events)
+        message.set_content(f"{summary}\n\n{json.dumps(events, indent=2, ensure_ascii=False)}\n")
+
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Latencia de los endpoints de detalle y borrado según el tamaño del
+historial del token: GET /api/tokens/<token> (completo y paginado),
+GET /api/tokens/<token>/stats, el detalle del panel web y DELETE.
+
+Uso: python3 benchmarks/api_latency.py --sizes 100,1000,10000,100000
+Imprime los resultados en JSON (ver benchutil.emit).
+"""
+import argparse
+import base64
+import tempfile
+from pathlib import Path
+
+from benchutil import add_output_argument, auth_headers, emit, load_server, make_hit, make_token, percentiles, quiet, timed
+
+TARGET = f"{0:016x}"
+
+
+def populate(server, backend, workdir, hits, background_tokens, background_hits):
+    """Crea una DB nueva con 'hits' hits en el token TARGET y el resto repartido en otros tokens."""
+    extension = 'json' if backend == 'json' else 'sqlite3'
+    server.db = server.build_storage(backend, str(Path(workdir) / f"api_{backend}_{hits}.{extension}"))
+    server.load_database()
+    tokens = [make_token(index) for index in range(background_tokens + 1)]
+    records = [make_hit(TARGET, index) for index in range(hits)]
+    records += [make_hit(f"{1 + index % background_tokens:016x}", index) for index in range(background_hits)]
+    tokens[0]['hits'] = hits
+    server.db.bulk_import(tokens, records)
+    server.dashboard_cache.invalidate()
+
+
+def measure(client, path, repeat, headers):
+    samples = []
+    for _ in range(repeat):
+        response, seconds = timed(client.get, path, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path}: {response.status_code}")
+        samples.append(seconds)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de detalle y borrado según el tamaño del historial")
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help='Hits del token medido, separados por coma (default: 100,1000,10000)')
+    parser.add_argument('--repeat', type=int, default=20, help='Requests por medición (default: 20)')
+    parser.add_argument('--page-size', type=int, default=100, help='limit de la consulta paginada (default: 100)')
+    parser.add_argument('--background-tokens', type=int, default=100, help='Otros tokens en la DB (default: 100)')
+    parser.add_argument('--background-hits', type=int, default=10000, help='Hits de los otros tokens (default: 10000)')
+    parser.add_argument('--storage', default='json,sqlite', help='Backends a medir (default: json,sqlite)')
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    sizes = [int(value) for value in args.sizes.split(',')]
+    api_headers = auth_headers()
+    results = []
+
+    with tempfile.TemporaryDirectory() as workdir, quiet():
+        server = load_server(workdir, 'json', INGEST_QUEUE_SIZE=0)
+        web_credentials = base64.b64encode(f"{server.ADMIN_USER}:{server.ADMIN_PASSWORD}".encode()).decode()
+        web_headers = {'Authorization': f"Basic {web_credentials}"}
+        client = server.app.test_client()
+
+        for backend in args.storage.split(','):
+            for hits in sizes:
+                populate(server, backend, workdir, hits, args.background_tokens, args.background_hits)
+                endpoints = {
+                    'detail_full': (f"/api/tokens/{TARGET}", api_headers),
+                    'detail_page': (f"/api/tokens/{TARGET}?limit={args.page_size}", api_headers),
+                    'stats': (f"/api/tokens/{TARGET}/stats", api_headers),
+                    'web_detail': (f"/tokens/{TARGET}", web_headers),
+                }
+                result = {'backend': backend, 'hits': hits}
+                for name, (path, headers) in endpoints.items():
+                    result[name] = measure(client, path, args.repeat, headers)
+
+                response, seconds = timed(client.delete, f"/api/tokens/{TARGET}", headers=api_headers)
+                if response.status_code != 200:
+                    raise RuntimeError(f"DELETE: {response.status_code}")
+                result['delete_ms'] = round(seconds * 1000, 3)
+                results.append(result)
+                server.db.close()
+        # Vacía la cola de logs antes de volver a la consola
+        server.log_pipeline.stop()
+
+    params = {key: getattr(args, key) for key in ('repeat', 'page_size', 'background_tokens', 'background_hits')}
+    params['sizes'] = sizes
+    emit('api_latency', params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
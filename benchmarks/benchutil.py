@@ -0,0 +1,128 @@
+"""
+Utilidades compartidas por los benchmarks: percentiles, metadatos del
+entorno, salida en JSON y carga del servidor sobre una DB temporal.
+"""
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+API_KEY = "benchmark"
+
+
+def percentiles(samples):
+    """Resumen en milisegundos de una lista de duraciones en segundos."""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': at(0.50),
+        'p95_ms': at(0.95),
+        'p99_ms': at(0.99),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(func, *args, **kwargs):
+    """Retorna (resultado, segundos) de una llamada."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def environment():
+    """Datos para saber si dos corridas son comparables."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def add_output_argument(parser):
+    parser.add_argument('--output', help='Archivo donde guardar el JSON (default: stdout)')
+
+
+def emit(name, params, results, output=None):
+    """Imprime (o guarda en 'output') el resultado con el mismo formato en todos los benchmarks."""
+    report = {'benchmark': name, 'environment': environment(), 'params': params, 'results': results}
+    text = json.dumps(report, indent=2)
+    if output:
+        Path(output).write_text(text + '\n')
+    # Los hits imprimen alertas en stdout durante la corrida, el JSON va al stdout original
+    print(text, file=sys.__stdout__)
+    return report
+
+
+@contextlib.contextmanager
+def quiet():
+    """Descarta lo que el servidor imprime en consola (alertas) mientras se mide."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def load_server(workdir, backend='json', **env):
+    """
+    Importa tokensnare_server con la DB en 'workdir' y la API key de
+    benchmark. 'env' pisa variables de configuración (ej: INGEST_QUEUE_SIZE).
+    Retorna el módulo con la DB ya cargada.
+    """
+    os.environ['API_KEY'] = API_KEY
+    os.environ['STORAGE_BACKEND'] = backend
+    for name, value in env.items():
+        os.environ[name] = str(value)
+    os.chdir(workdir)
+    import tokensnare_server as server
+    server.API_KEY = API_KEY
+    # Los logs pasan por el pipeline como en el servidor (la consola la descarta quiet())
+    server.start_logging()
+    server.db = server.build_storage(backend, str(Path(workdir) / f"bench_db.{'json' if backend == 'json' else 'sqlite3'}"))
+    server.load_database()
+    return server
+
+
+def auth_headers():
+    return {'Authorization': f"Bearer {API_KEY}"}
+
+
+def make_token(index, token_type='link'):
+    return {
+        'token': f"{index:016x}",
+        'type': token_type,
+        'description': f"benchmark {index}",
+        'created_at': "2025-06-01T12:00:00-03:00",
+        'hits': 0,
+        'last_hit': None,
+    }
+
+
+def make_hit(token_id, index):
+    ip = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+    user_agent = f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/{100 + index % 200}.0.0.0 Safari/537.36"
+    return {
+        'token': token_id,
+        'timestamp': f"2025-06-01T{index // 3600 % 24:02d}:{index // 60 % 60:02d}:{index % 60:02d}-03:00",
+        'ip': ip,
+        'user_agent': user_agent,
+        'headers': {'Host': 'canary.example.com', 'User-Agent': user_agent, 'Accept': 'image/*', 'X-Forwarded-For': ip},
+    }
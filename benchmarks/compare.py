@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compara dos corridas de un mismo benchmark (los JSON de --output) y marca
+las regresiones: tiempos que subieron o throughput que bajó más que
+--threshold (relativo).
+
+Uso: python3 benchmarks/compare.py antes.json despues.json --threshold 0.2
+Imprime la comparación en JSON y sale con código 1 si hubo regresiones.
+"""
+import argparse
+import json
+import sys
+
+# Métricas donde más es mejor; en el resto (tiempos, bytes) menos es mejor
+HIGHER_IS_BETTER = ('requests_per_second', 'hits_per_second')
+IGNORED = ('count',)
+
+
+def identity(result):
+    """Campos que identifican un resultado (backend, hits, target, concurrencia, tipo...)."""
+    return tuple(sorted((key, value) for key, value in result.items()
+                        if isinstance(value, (str, int)) and key in ('backend', 'hits', 'target', 'concurrency', 'type', 'format')))
+
+
+def metrics(result, prefix=''):
+    """Métricas numéricas de un resultado, aplanadas ('latency.p95_ms')."""
+    flat = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(metrics(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key not in IGNORED:
+            flat[name] = value
+    return flat
+
+
+def compare(before, after, threshold):
+    previous = {identity(result): result for result in before['results']}
+    rows = []
+    for result in after['results']:
+        key = identity(result)
+        if key not in previous:
+            continue
+        old_metrics = metrics(previous[key])
+        for name, new in metrics(result).items():
+            if name in dict(key) or name not in old_metrics or not old_metrics[name]:
+                continue
+            old = old_metrics[name]
+            change = (new - old) / old
+            worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+            rows.append({
+                'result': dict(key),
+                'metric': name,
+                'before': old,
+                'after': new,
+                'change': round(change, 3),
+                'regression': worse > threshold,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dos corridas de un benchmark")
+    parser.add_argument('before', help='JSON de la corrida anterior')
+    parser.add_argument('after', help='JSON de la corrida nueva')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Empeoramiento relativo que cuenta como regresión (default: 0.2)')
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before.get('benchmark') != after.get('benchmark'):
+        parser.error(f"Benchmarks distintos: {before.get('benchmark')} y {after.get('benchmark')}")
+
+    rows = compare(before, after, args.threshold)
+    regressions = [row for row in rows if row['regression']]
+    print(json.dumps({
+        'benchmark': after['benchmark'],
+        'before': before.get('environment', {}).get('commit'),
+        'after': after.get('environment', {}).get('commit'),
+        'threshold': args.threshold,
+        'regressions': regressions,
+        'compared': rows,
+    }, indent=2))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
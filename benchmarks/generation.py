@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tiempo de generación de honeytokens por formato, sin red (los tokens se
+pasan ya registrados en 'token_data'):
+- template: armar la plantilla desde cero (primer pedido con ese título,
+  autor y contenido);
+- generate: la función generate_*_honeytoken de generators/ con la
+  plantilla ya cacheada, escribiendo el archivo;
+- service: GenerationPool.generate, el camino de POST /api/generate/<tipo>.
+
+Uso: python3 benchmarks/generation.py --repeat 50
+Imprime los resultados en JSON (ver benchutil.emit).
+"""
+import argparse
+import os
+import tempfile
+
+from benchutil import add_output_argument, emit, percentiles, timed
+
+from generators import (GenerationPool, generate_binary_honeytoken, generate_docx_honeytoken,
+                        generate_epub_honeytoken, generate_pdf_honeytoken, generate_qrcode_honeytoken,
+                        generate_xlsx_honeytoken)
+from generators.service import DOCUMENT_TYPES
+
+TITLE = "Informe trimestral"
+AUTHOR = "Finanzas"
+CONTENT = "Resultados consolidados del trimestre. " * 40
+
+
+def token_data(index):
+    token_id = f"{index:016x}"
+    return {
+        'token': token_id,
+        'tracking_url_image': f"http://127.0.0.1:5000/image/{token_id}.png",
+        'tracking_url_link': f"http://127.0.0.1:5000/link/{token_id}",
+    }
+
+
+# Función de generators/ por formato, con los argumentos de cada una
+GENERATORS = {
+    'pdf': lambda output, data: generate_pdf_honeytoken(None, output, None, TITLE, AUTHOR, CONTENT, token_data=data),
+    'docx': lambda output, data: generate_docx_honeytoken(None, output, None, TITLE, AUTHOR, CONTENT, token_data=data),
+    'xlsx': lambda output, data: generate_xlsx_honeytoken(None, output, None, TITLE, AUTHOR, CONTENT, token_data=data),
+    'epub': lambda output, data: generate_epub_honeytoken(None, output, TITLE, AUTHOR, None, CONTENT, token_data=data),
+    'qrcode': lambda output, data: generate_qrcode_honeytoken(None, output, None, token_data=data),
+    'binary': lambda output, data: generate_binary_honeytoken(None, output, 'linux', None, token_data=data),
+}
+
+
+def bench_format(file_type, workdir, repeat, template_repeat, pool):
+    result = {'type': file_type}
+    try:
+        if file_type in DOCUMENT_TYPES:
+            build, _ = DOCUMENT_TYPES[file_type]
+            # Contenido distinto en cada vuelta para no pegarle al cache
+            result['template'] = percentiles([
+                timed(build, TITLE, AUTHOR, f"{CONTENT} {index}")[1] for index in range(template_repeat)
+            ])
+
+        output = os.path.join(workdir, f"honeytoken.{file_type}")
+        generate = GENERATORS[file_type]
+        generate(output, token_data(0))
+        result['generate'] = percentiles([timed(generate, output, token_data(index))[1] for index in range(1, repeat + 1)])
+        result['bytes'] = os.path.getsize(output)
+
+        pool.generate(file_type, token_data(0), TITLE, AUTHOR, CONTENT)
+        result['service'] = percentiles([
+            timed(pool.generate, file_type, token_data(index), TITLE, AUTHOR, CONTENT)[1] for index in range(1, repeat + 1)
+        ])
+    except Exception as e:
+        # Ej: la plantilla del binario no está compilada en este entorno
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de generación de honeytokens por formato")
+    parser.add_argument('--repeat', type=int, default=20, help='Generaciones por formato (default: 20)')
+    parser.add_argument('--template-repeat', type=int, default=3, help='Plantillas armadas por formato (default: 3)')
+    parser.add_argument('--types', default=','.join(GENERATORS),
+                        help=f"Formatos a medir (default: {','.join(GENERATORS)})")
+    parser.add_argument('--workers', type=int, default=2, help='Procesos del GenerationPool (default: 2)')
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    pool = GenerationPool(workers=args.workers)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for file_type in args.types.split(','):
+                results.append(bench_format(file_type, workdir, args.repeat, args.template_repeat, pool))
+    finally:
+        pool.shutdown()
+
+    params = {key: getattr(args, key) for key in ('repeat', 'template_repeat', 'workers')}
+    params['content_bytes'] = len(CONTENT)
+    emit('generation', params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
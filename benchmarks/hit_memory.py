@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria de los hits en memoria: dicts (formato anterior)
+contra CompactHit, con y sin headers comprimidos.
+
+Uso: python3 benchmarks/hit_memory.py --hits 1000000
+Imprime los resultados en JSON. Los tiempos incluyen el overhead de
+tracemalloc, sirven solo para comparar formatos entre sí.
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import CompactHit
+
+USER_AGENTS = [
+    f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{version}.0.0.0 Safari/537.36"
+    for version in range(100, 300)
+]
+
+
+def make_hit(index, rng):
+    """
+    Hit con headers de navegador. Los strings se arman en cada llamada,
+    como cuando salen de un request, para no compartirlos entre hits.
+    """
+    ip = f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+    user_agent = "".join(rng.choice(USER_AGENTS))
+    headers = {
+        "".join("Host"): "".join("canary.example.com"),
+        "".join("User-Agent"): user_agent,
+        "".join("Accept"): "".join("image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8"),
+        "".join("Accept-Language"): "".join("es-AR,es;q=0.9,en;q=0.8"),
+        "".join("Accept-Encoding"): "".join("gzip, deflate, br"),
+        "".join("Connection"): "".join("keep-alive"),
+        "".join("X-Forwarded-For"): ip,
+        "".join("Referer"): f"https://mail.example.com/inbox/{index}",
+    }
+    return {
+        'id': index,
+        'token': f"{index % 1000:016x}",
+        'timestamp': f"2025-06-01T12:{index // 60 % 60:02d}:{index % 60:02d}.{index % 1000000:06d}-03:00",
+        'ip': ip,
+        'user_agent': user_agent,
+        'headers': headers,
+    }
+
+
+def measure(name, hits, build):
+    rng = random.Random(1234)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    records = [build(make_hit(index, rng)) for index in range(hits)]
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    gc.collect()
+    return {
+        'format': name,
+        'hits': hits,
+        'bytes': current,
+        'bytes_per_hit': round(current / hits, 1),
+        'build_seconds': round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria de los hits: dict vs CompactHit")
+    parser.add_argument('--hits', type=int, default=1000000, help='Cantidad de hits (default: 1000000)')
+    args = parser.parse_args()
+
+    results = [
+        measure('dict', args.hits, lambda hit: hit),
+        measure('compact', args.hits, lambda hit: CompactHit.from_dict(hit)),
+        measure('compact+zlib', args.hits, lambda hit: CompactHit.from_dict(hit, compress=True)),
+    ]
+    baseline = results[0]['bytes']
+    for result in results:
+        result['ratio_vs_dict'] = round(result['bytes'] / baseline, 3)
+    print(json.dumps({'benchmark': 'hit_memory', 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Costo de persistir y cargar la DB a medida que crece el historial: escritura
+de hits por lotes (como el escritor de la cola de ingesta), carga con replay
+del journal, snapshot (save) y carga desde el snapshot, para cada backend.
+
+Uso: python3 benchmarks/persistence.py --sizes 1000,10000,100000,1000000
+Imprime los resultados en JSON (ver benchutil.emit).
+"""
+import argparse
+import gc
+import tempfile
+from pathlib import Path
+
+from benchutil import add_output_argument, emit, make_hit, make_token, timed
+
+from storage import create_storage
+
+# Mismo tamaño de lote que INGEST_BATCH_SIZE por defecto
+BATCH_SIZE = 500
+
+
+def ingest(db, hits, hits_per_token):
+    tokens = max(1, hits // hits_per_token)
+    db.save_tokens([make_token(index) for index in range(tokens)])
+    for start in range(0, hits, BATCH_SIZE):
+        db.add_hits([make_hit(f"{index % tokens:016x}", index) for index in range(start, min(hits, start + BATCH_SIZE))])
+
+
+def bench_json(workdir, hits, hits_per_token):
+    db_file = Path(workdir) / f"json_{hits}.json"
+    # Sin compactación automática, así la carga reaplica todo el journal
+    options = {'compact_every': 10 ** 12}
+    db = create_storage('json', db_file, **options)
+    db.load()
+    _, ingest_seconds = timed(ingest, db, hits, hits_per_token)
+    journal_bytes = db.journal.size()
+    db.close()
+    del db
+    gc.collect()
+
+    db = create_storage('json', db_file, **options)
+    _, replay_seconds = timed(db.load)
+    _, save_seconds = timed(db.save)
+    snapshot_bytes = db_file.stat().st_size
+    db.close()
+    del db
+    gc.collect()
+
+    db = create_storage('json', db_file, **options)
+    _, load_seconds = timed(db.load)
+    assert db.count_hits() == hits
+    db.close()
+    return {
+        'backend': 'json',
+        'hits': hits,
+        'ingest_seconds': round(ingest_seconds, 3),
+        'ingest_hits_per_second': round(hits / ingest_seconds, 1),
+        'journal_bytes': journal_bytes,
+        'load_journal_seconds': round(replay_seconds, 3),
+        'save_seconds': round(save_seconds, 3),
+        'snapshot_bytes': snapshot_bytes,
+        'load_snapshot_seconds': round(load_seconds, 3),
+    }
+
+
+def bench_sqlite(workdir, hits, hits_per_token):
+    db_file = Path(workdir) / f"sqlite_{hits}.sqlite3"
+    db = create_storage('sqlite', db_file)
+    db.load()
+    _, ingest_seconds = timed(ingest, db, hits, hits_per_token)
+    db.close()
+
+    db = create_storage('sqlite', db_file)
+    _, load_seconds = timed(db.load)
+    _, count_seconds = timed(db.count_hits)
+    size_bytes = db.stats()['size_bytes']
+    db.close()
+    return {
+        'backend': 'sqlite',
+        'hits': hits,
+        'ingest_seconds': round(ingest_seconds, 3),
+        'ingest_hits_per_second': round(hits / ingest_seconds, 1),
+        'load_seconds': round(load_seconds, 4),
+        'count_hits_seconds': round(count_seconds, 4),
+        'size_bytes': size_bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Costo de guardar y cargar la DB según la cantidad de hits")
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='Cantidades de hits, separadas por coma (default: 1000,10000,100000)')
+    parser.add_argument('--hits-per-token', type=int, default=100, help='Hits por token (default: 100)')
+    parser.add_argument('--backends', default='json,sqlite', help='Backends a medir (default: json,sqlite)')
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    sizes = [int(value) for value in args.sizes.split(',')]
+    benches = {'json': bench_json, 'sqlite': bench_sqlite}
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in args.backends.split(','):
+            for hits in sizes:
+                results.append(benches[backend](workdir, hits, args.hits_per_token))
+
+    params = {'sizes': sizes, 'hits_per_token': args.hits_per_token, 'batch_size': BATCH_SIZE}
+    emit('persistence', params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Throughput y latencia del endpoint de tracking (/image/<token>.png) con
+clientes concurrentes, contra el test client de Flask (sin red, mide solo
+la app) y contra un servidor local real (werkzeug o waitress).
+
+Uso: python3 benchmarks/tracking.py --requests 20000 --concurrency 1,8,32
+Imprime los resultados en JSON (ver benchutil.emit).
+"""
+import argparse
+import http.client
+import tempfile
+import threading
+import time
+
+from benchutil import add_output_argument, emit, load_server, make_token, percentiles, quiet
+
+
+def run_clients(concurrency, total, request_once, make_client):
+    """
+    Reparte 'total' requests entre 'concurrency' hilos. Cada hilo arma su
+    cliente con make_client() y llama a request_once(cliente, i).
+    Retorna (latencias, errores, segundos totales).
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(count):
+        client = make_client()
+        local = []
+        failed = 0
+        barrier.wait()
+        for index in range(count):
+            start = time.perf_counter()
+            try:
+                request_once(client, index)
+            except Exception:
+                failed += 1
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(count,)) for count in per_thread]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def result(target, concurrency, latencies, errors, elapsed):
+    return {
+        'target': target,
+        'concurrency': concurrency,
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'errors': errors,
+        'latency': percentiles(latencies),
+    }
+
+
+def paths_for(tokens, unknown_ratio):
+    """Rutas a pedir: tokens registrados y, según 'unknown_ratio', tokens inexistentes (escaneos)."""
+    paths = []
+    for index in range(1000):
+        if index < unknown_ratio * 1000:
+            paths.append(f"/image/{index:016x}ffff.png")
+        else:
+            paths.append(f"/image/{tokens[index % len(tokens)]}.png")
+    return paths
+
+
+def bench_test_client(server, paths, concurrency, total):
+    def request_once(client, index):
+        response = client.get(paths[index % len(paths)])
+        if response.status_code != 200:
+            raise RuntimeError(response.status_code)
+
+    return run_clients(concurrency, total, request_once, server.app.test_client)
+
+
+def start_http_server(server, kind, threads):
+    """Levanta la app en 127.0.0.1 en un puerto libre. Retorna (puerto, función para detenerlo)."""
+    if kind == 'waitress':
+        from waitress.server import create_server
+        http_server = create_server(server.app, host='127.0.0.1', port=0, threads=threads)
+
+        def serve():
+            try:
+                http_server.run()
+            except OSError:
+                pass  # close() desde otro hilo cierra el socket en medio del select
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        return http_server.effective_port, http_server.close
+    from werkzeug.serving import make_server
+    http_server = make_server('127.0.0.1', 0, server.app, threaded=True)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    return http_server.port, http_server.shutdown
+
+
+def bench_http(port, paths, concurrency, total):
+    def make_client():
+        return http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+    def request_once(connection, index):
+        connection.request('GET', paths[index % len(paths)])
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(response.status)
+        if response.getheader('Connection', '').lower() == 'close':
+            connection.close()
+
+    return run_clients(concurrency, total, request_once, make_client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput y latencia del pixel de tracking")
+    parser.add_argument('--requests', type=int, default=5000, help='Requests por corrida (default: 5000)')
+    parser.add_argument('--concurrency', default='1,8,32', help='Clientes concurrentes, separados por coma (default: 1,8,32)')
+    parser.add_argument('--tokens', type=int, default=1000, help='Tokens registrados (default: 1000)')
+    parser.add_argument('--unknown-ratio', type=float, default=0.0,
+                        help='Fracción de requests a tokens inexistentes (default: 0)')
+    parser.add_argument('--storage', default='json', choices=['json', 'sqlite'], help='Backend (default: json)')
+    parser.add_argument('--targets', default='test-client,werkzeug,waitress',
+                        help='Contra qué medir: test-client, werkzeug, waitress (default: los tres)')
+    parser.add_argument('--threads', type=int, default=8, help='Hilos de waitress (default: 8)')
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    concurrency_levels = [int(value) for value in args.concurrency.split(',')]
+    targets = args.targets.split(',')
+    results = []
+
+    with tempfile.TemporaryDirectory() as workdir, quiet():
+        server = load_server(workdir, args.storage)
+        server.db.save_tokens([make_token(index) for index in range(args.tokens)])
+        paths = paths_for([f"{index:016x}" for index in range(args.tokens)], args.unknown_ratio)
+
+        for target in targets:
+            stop = None
+            if target != 'test-client':
+                port, stop = start_http_server(server, target, args.threads)
+            try:
+                for concurrency in concurrency_levels:
+                    if target == 'test-client':
+                        latencies, errors, elapsed = bench_test_client(server, paths, concurrency, args.requests)
+                    else:
+                        latencies, errors, elapsed = bench_http(port, paths, concurrency, args.requests)
+                    results.append(result(target, concurrency, latencies, errors, elapsed))
+            finally:
+                if stop is not None:
+                    stop()
+        server.shutdown()
+
+    params = {key: getattr(args, key) for key in ('requests', 'tokens', 'unknown_ratio', 'storage', 'threads')}
+    params['concurrency'] = concurrency_levels
+    emit('tracking', params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
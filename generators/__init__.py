@@ -7,6 +7,8 @@ from .xlsx_gen import generate_xlsx_honeytoken
 from .docx_gen import generate_docx_honeytoken
 from .qrcode_gen import generate_qrcode_honeytoken
 from .binary_gen import generate_binary_honeytoken
+from .common import TokenSnareClient, TokenSnareError, get_client, register_token, register_tokens
+from .service import GENERATION_TYPES, GenerationPool, GenerationBusy, GenerationTimeout
 
 # A futuro agregarás aquí los otros:
 # from .word_gen import generate_word_token
\ No newline at end of file
@@ -1,44 +1,112 @@
+import errno
+import mmap
+import os
+from functools import lru_cache
+
 from .common import register_token
 
 # Placeholder para la URL en el binario
 PLACEHOLDER = b"PLACEHOLDER_URL_XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX"
 
+TEMPLATE_PATHS = {
+    "windows": "binary_template/template_win.exe",
+    "linux": "binary_template/template_linux",
+}
+
+# Errores con los que copy_file_range indica que no se puede usar entre esos archivos
+_COPY_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM)
+
 
-def generate_binary_honeytoken(server_url, output_file, platform, description):
+class BinaryTemplate:
     """
-    Genera un binario que realiza el get hacia la URI, parcheando una plantilla pre-compilada.
+    Plantilla pre-compilada cargada una sola vez (memory-mapped), con las
+    posiciones del placeholder calculadas y validadas al cargarla.
+
+    Cada binario nuevo se escribe copiando los tramos sin cambios alrededor
+    del placeholder (con copy_file_range cuando el sistema lo soporta, sin
+    pasar los datos por Python) e intercalando la URL ya rellenada.
     """
 
-    if platform == "windows":
-        template_path = f"binary_template/template_win.exe"
-    elif platform == "linux":
-        template_path = f"binary_template/template_linux"
-    else:
-        raise ValueError("Las plataformas soportadas son windows y linux.")
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
 
-    token_data = register_token(
-        server_url,
-        token_type="binary",
-        description=description
-    )
+        self.offsets = []
+        pos = self.data.find(PLACEHOLDER)
+        while pos != -1:
+            self.offsets.append(pos)
+            pos = self.data.find(PLACEHOLDER, pos + len(PLACEHOLDER))
+        if not self.offsets:
+            raise Exception("Error: No se encontró el placeholder en el binario.")
 
-    tracking_url = token_data['tracking_url_link']
+        self._use_copy_file_range = hasattr(os, "copy_file_range")
 
-    url_bytes = tracking_url.encode('utf-8')
+    def _copy(self, out, start, end):
+        """Copia al archivo de salida el tramo [start, end) de la plantilla."""
+        while start < end:
+            if self._use_copy_file_range:
+                try:
+                    copied = os.copy_file_range(self._file.fileno(), out.fileno(), end - start, start)
+                except OSError as e:
+                    if e.errno not in _COPY_UNSUPPORTED:
+                        raise
+                    self._use_copy_file_range = False
+                    continue
+                if copied == 0:
+                    self._use_copy_file_range = False
+                    continue
+            else:
+                copied = out.write(self.data[start:end])
+            start += copied
 
-    # Validación: La URL no puede ser más larga que el placeholder
-    if len(url_bytes) > len(PLACEHOLDER):
-        raise ValueError("La URL generada es demasiado larga para el placeholder del binario.")
+    @staticmethod
+    def _copy_bytes(out, data):
+        view = memoryview(data)
+        while view:
+            view = view[out.write(view):]
 
-    with open(template_path, "rb") as f:
-        binary_data = f.read()
+    def write(self, output_file, url_bytes):
+        """Escribe el binario con 'url_bytes' en lugar del placeholder."""
+        # Validación: La URL no puede ser más larga que el placeholder
+        if len(url_bytes) > len(PLACEHOLDER):
+            raise ValueError("La URL generada es demasiado larga para el placeholder del binario.")
 
-    if PLACEHOLDER not in binary_data:
-        raise Exception("Error: No se encontró el placeholder en el binario.")
+        padded_url = url_bytes + b'\x00' * (len(PLACEHOLDER) - len(url_bytes))
 
-    padded_url = url_bytes + b'\x00' * (len(PLACEHOLDER) - len(url_bytes))
+        # Sin buffer, así las escrituras y copy_file_range avanzan sobre la misma posición
+        with open(output_file, "wb", buffering=0) as out:
+            pos = 0
+            for offset in self.offsets:
+                self._copy(out, pos, offset)
+                self._copy_bytes(out, padded_url)
+                pos = offset + len(PLACEHOLDER)
+            self._copy(out, pos, self.size)
 
-    new_binary_data = binary_data.replace(PLACEHOLDER, padded_url)
 
-    with open(output_file, "wb") as f:
-        f.write(new_binary_data)
+@lru_cache(maxsize=None)
+def get_binary_template(platform):
+    """Carga (una vez por proceso) la plantilla de la plataforma pedida."""
+    if platform not in TEMPLATE_PATHS:
+        raise ValueError("Las plataformas soportadas son windows y linux.")
+    return BinaryTemplate(TEMPLATE_PATHS[platform])
+
+
+def generate_binary_honeytoken(server_url, output_file, platform, description, token_data=None):
+    """
+    Genera un binario que realiza el get hacia la URI, parcheando una plantilla pre-compilada.
+    Si se pasa 'token_data' (token ya registrado) no se registra uno nuevo.
+    """
+    template = get_binary_template(platform)
+
+    if token_data is None:
+        token_data = register_token(
+            server_url,
+            token_type="binary",
+            description=description
+        )
+
+    tracking_url = token_data['tracking_url_link']
+
+    template.write(output_file, tracking_url.encode('utf-8'))
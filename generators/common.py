@@ -1,40 +1,175 @@
+import asyncio
 import requests
-import sys
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from random import randint
 from datetime import datetime, timezone, timedelta
 import os
 from dotenv import load_dotenv
 
+# Cantidad de tokens por request en register_tokens (el servidor acepta hasta 1000)
+BATCH_SIZE = 1000
+
+
+class TokenSnareError(Exception):
+    """Error al comunicarse con el servidor de TokenSnare."""
+
+
+class _Retry(Retry):
+    """
+    Retry que además reintenta los POST, pero solo cuando el servidor no
+    llegó a procesarlos: errores de conexión (ya cubiertos por Retry) y
+    respuestas 429/503. Un POST que falló después de enviarse (timeout de
+    lectura, 500) no se reintenta para no registrar tokens duplicados.
+    """
+
+    POST_RETRY_STATUS = (429, 503)
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method == 'POST':
+            return status_code in self.POST_RETRY_STATUS
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class TokenSnareClient:
+    """
+    Cliente reutilizable de la API del servidor.
+
+    Mantiene una requests.Session con pool de conexiones (keep-alive) y
+    reintentos con backoff exponencial ante errores de conexión y respuestas
+    429/5xx (los POST solo ante errores de conexión y 429/503). La API key se lee una sola vez (parámetro o API_KEY del .env).
+    Los errores se reportan con TokenSnareError, no terminan el proceso.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, server_url, api_key=None, retries=3, backoff=0.5, timeout=5, pool_size=10):
+        # Aseguramos que no haya doble slash o falte http
+        if not server_url.startswith("http"):
+            server_url = f"http://{server_url}"
+        self.server_url = server_url.rstrip('/')
+        self.timeout = timeout
+
+        if api_key is None:
+            load_dotenv()
+            api_key = os.environ.get("API_KEY", None)
+
+        self.session = requests.Session()
+        if api_key:
+            self.session.headers['Authorization'] = f'Bearer {api_key}'
+
+        retry = _Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=self.RETRY_STATUS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path, payload, timeout=None):
+        try:
+            response = self.session.post(f"{self.server_url}{path}", json=payload, timeout=timeout or self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            raise TokenSnareError(f"Error conectando con el servidor: {e}") from e
+
+    def register_token(self, token_type, description, metadata=None):
+        """Registra un token y retorna sus datos (IDs y URLs)."""
+        return self._post("/api/tokens", {
+            "type": token_type,
+            "description": description,
+            "metadata": metadata or {}
+        })
+
+    def register_tokens(self, tokens):
+        """
+        Registra varios tokens usando /api/tokens/batch (de a BATCH_SIZE por request).
+        'tokens' es una lista de dicts con 'type' y 'description'.
+        Retorna los datos de cada token (IDs y URLs) en el mismo orden.
+        """
+        registered = []
+        for start in range(0, len(tokens), BATCH_SIZE):
+            response = self._post("/api/tokens/batch", {"tokens": tokens[start:start + BATCH_SIZE]}, timeout=30)
+            registered.extend(response['tokens'])
+        return registered
+
+    def export(self, kind, output, export_format='ndjson', after=None, since=None, compress=False):
+        """
+        Descarga en streaming el export de hits o tokens (ver /api/export)
+        y lo escribe en 'output' (archivo binario abierto) a medida que llega.
+        Con 'compress' se escribe tal cual el gzip que envía el servidor.
+        Retorna el cursor para el próximo export incremental (solo hits).
+        """
+        params = {'format': export_format}
+        if after is not None:
+            params['after'] = after
+        if since:
+            params['since'] = since
+        headers = {'Accept-Encoding': 'gzip' if compress else 'identity'}
+        try:
+            with self.session.get(f"{self.server_url}/api/export/{kind}", params=params, headers=headers,
+                                  stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                if compress and response.headers.get('Content-Encoding') != 'gzip':
+                    raise TokenSnareError("El servidor no devolvió el export comprimido")
+                for chunk in response.raw.stream(64 * 1024, decode_content=False):
+                    output.write(chunk)
+                cursor = response.headers.get('X-Export-Cursor')
+        except requests.exceptions.RequestException as e:
+            raise TokenSnareError(f"Error conectando con el servidor: {e}") from e
+        return int(cursor) if cursor is not None else None
+
+    async def register_token_async(self, token_type, description, metadata=None):
+        """Variante para asyncio: la solicitud corre en un hilo usando el pool compartido."""
+        return await asyncio.to_thread(self.register_token, token_type, description, metadata)
+
+    async def register_many_async(self, tokens, concurrency=10):
+        """
+        Registra varios tokens con solicitudes individuales concurrentes
+        (como mucho 'concurrency' a la vez). Retorna en el mismo orden
+        una lista con los datos de cada token o la TokenSnareError que falló,
+        para que el llamador pueda reintentar solo esos.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def register(token):
+            async with semaphore:
+                return await self.register_token_async(token['type'], token.get('description'), token.get('metadata'))
+
+        return await asyncio.gather(*(register(token) for token in tokens), return_exceptions=True)
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+
+
+def get_client(server_url):
+    """Cliente compartido por servidor, así las llamadas sueltas reutilizan el pool."""
+    client = _clients.get(server_url)
+    if client is None:
+        client = _clients[server_url] = TokenSnareClient(server_url)
+    return client
+
+
 def register_token(server_url, token_type, description, metadata=None):
     """
     Registra un token en el servidor y retorna el diccionario con los datos (IDs y URLs).
-    Si falla, maneja el error y termina la ejecución o retorna None.
+    Si falla lanza TokenSnareError.
     """
-    # Aseguramos que no haya doble slash o falte http
-    if not server_url.startswith("http"):
-        server_url = f"http://{server_url}"
-    
-    api_url = f"{server_url.rstrip('/')}/api/tokens"
+    return get_client(server_url).register_token(token_type, description, metadata)
 
-    load_dotenv()
-    api_key = os.environ.get("API_KEY", None)
-    headers = {}
-    if api_key:
-        headers['Authorization'] = f'Bearer {api_key}'
-    
-    payload = {
-        "type": token_type,
-        "description": description,
-        "metadata": metadata or {}
-    }
-    
-    try:
-        response = requests.post(api_url, json=payload, headers=headers, timeout=5)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error conectando con el servidor: {e}")
-        exit(1)
+
+def register_tokens(server_url, tokens):
+    """
+    Registra varios tokens en lote. Ver TokenSnareClient.register_tokens.
+    Si falla lanza TokenSnareError.
+    """
+    return get_client(server_url).register_tokens(tokens)
 
 
 def random_creation_date():
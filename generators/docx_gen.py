@@ -5,8 +5,15 @@ from docx.oxml import parse_xml
 from docx.oxml.ns import qn
 from docx.oxml import CT_Inline, CT_Picture
 from datetime import datetime
+from functools import lru_cache
+import io
+from xml.sax.saxutils import escape
 
 from .common import register_token, random_creation_date, random_modification_date
+from .templates import TEMPLATE_CACHE_SIZE, PLACEHOLDER_URL, PLACEHOLDER_CREATED, PLACEHOLDER_MODIFIED, ZipTemplate
+
+# Miembros del docx que cambian por token (URL del pixel y fechas)
+PATCHED_MEMBERS = ('word/_rels/document.xml.rels', 'docProps/core.xml')
 
 def inject_tracking_pixel(paragraph, tracking_url):
     """
@@ -50,24 +57,11 @@ def inject_tracking_pixel(paragraph, tracking_url):
     run._r.add_drawing(inline)
 
 
-def generate_docx_honeytoken(server_url, output_file, description, title=None, author=None, content=None):
+def build_docx_template(title, author, content):
     """
-    Genera un archivo .docx con un pixel de tracking externo y metadatos anti-forense.
+    Arma el documento para (título, autor, contenido) con valores de
+    relleno en la URL y las fechas, que después se parchean por token.
     """
-    token_data = register_token(
-        server_url,
-        token_type="docx",
-        description=description
-    )
-    
-    tracking_url = token_data['tracking_url_image']
-    
-    # common.py devuelve strings ISO, pero python-docx necesita objetos datetime
-    str_created = random_creation_date()
-    str_modified = random_modification_date(str_created)
-    dt_created = datetime.strptime(str_created, '%Y-%m-%dT%H:%M:%SZ')
-    dt_modified = datetime.strptime(str_modified, '%Y-%m-%dT%H:%M:%SZ')
-
     # Crea el Documento
     doc = Document()
 
@@ -79,13 +73,53 @@ def generate_docx_honeytoken(server_url, output_file, description, title=None, a
 
     # Inyecta el pixel de tracking
     p = doc.add_paragraph()
-    inject_tracking_pixel(p, tracking_url)
+    inject_tracking_pixel(p, PLACEHOLDER_URL)
 
     # Agregamos Metadatos
     core = doc.core_properties
     core.title = title if title else ""
     core.author = author if author else ""
-    core.created = dt_created
-    core.modified = dt_modified
+    core.created = datetime.strptime(PLACEHOLDER_CREATED, '%Y-%m-%dT%H:%M:%SZ')
+    core.modified = datetime.strptime(PLACEHOLDER_MODIFIED, '%Y-%m-%dT%H:%M:%SZ')
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return ZipTemplate(buffer.getvalue(), PATCHED_MEMBERS)
+
+
+# Plantillas ya armadas en este proceso
+get_docx_template = lru_cache(maxsize=TEMPLATE_CACHE_SIZE)(build_docx_template)
+
+
+def patch_docx_template(template, token_data):
+    """Retorna los bytes del docx para 'token_data' parcheando la plantilla."""
+    tracking_url = token_data['tracking_url_image']
+
+    str_created = random_creation_date()
+    str_modified = random_modification_date(str_created)
+
+    return template.render({
+        PLACEHOLDER_URL.encode(): escape(tracking_url, {'"': '&quot;'}).encode('utf-8'),
+        PLACEHOLDER_CREATED.encode(): str_created.encode(),
+        PLACEHOLDER_MODIFIED.encode(): str_modified.encode(),
+    })
+
+
+def generate_docx_honeytoken(server_url, output_file, description, title=None, author=None, content=None, token_data=None):
+    """
+    Genera un archivo .docx con un pixel de tracking externo y metadatos anti-forense.
+    Si se pasa 'token_data' (token ya registrado) no se registra uno nuevo.
+    """
+    if token_data is None:
+        token_data = register_token(
+            server_url,
+            token_type="docx",
+            description=description
+        )
+
+
+    # Parcheamos la plantilla ya armada
+    docx_bytes = patch_docx_template(get_docx_template(title, author, content), token_data)
 
-    doc.save(output_file)
\ No newline at end of file
+    with open(output_file, "wb") as f:
+        f.write(docx_bytes)
@@ -1,5 +1,17 @@
+import io
+import uuid
+from datetime import datetime
+from functools import lru_cache
+from xml.sax.saxutils import escape
 from ebooklib import epub
 from .common import register_token
+from .templates import TEMPLATE_CACHE_SIZE, PLACEHOLDER_URL, PLACEHOLDER_MODIFIED, ZipTemplate
+
+# Identificador de relleno del libro, se reemplaza por un uuid nuevo por token
+PLACEHOLDER_UID = "00000000-0000-0000-0000-000000000000"
+
+# Miembros del epub que cambian por token (URL del pixel, identificador y fecha)
+PATCHED_MEMBERS = ('EPUB/chapter1.xhtml', 'EPUB/content.opf', 'EPUB/toc.ncx')
 
 def get_default_css():
     return """
@@ -8,19 +20,14 @@ def get_default_css():
     h1 { text-align: left; }
     """
 
-def generate_epub_honeytoken(server_url, output_file, title, author, description, content):
+def build_epub_template(title, author, content):
     """
-    Crea un EPUB inyectando un pixel de tracking en el HTML.
+    Arma el libro para (título, autor, contenido) con valores de
+    relleno en la URL, el identificador y la fecha, que después se parchean
+    por token.
     """
-    token_data = register_token(
-        server_url,
-        token_type="epub",
-        description=description
-    )
-    
-    tracking_url_image = token_data['tracking_url_image']
-
     book = epub.EpubBook()
+    book.set_identifier(PLACEHOLDER_UID)
 
     book.set_title(title if title else "")
     book.set_language("es")
@@ -41,7 +48,7 @@ def generate_epub_honeytoken(server_url, output_file, title, author, description
       <body>
         {html_h1}
         {html_content}
-        <div style="background-image:url('{tracking_url_image}'); width:1px; height:1px; position:absolute; left:-9999px;"></div>
+        <div style="background-image:url('{PLACEHOLDER_URL}'); width:1px; height:1px; position:absolute; left:-9999px;"></div>
       </body>
     </html>
     """
@@ -57,4 +64,39 @@ def generate_epub_honeytoken(server_url, output_file, title, author, description
     book.add_item(epub.EpubNcx())
     book.add_item(epub.EpubNav())
 
-    epub.write_epub(output_file, book, {})
\ No newline at end of file
+    buffer = io.BytesIO()
+    epub.write_epub(buffer, book, {'mtime': datetime.strptime(PLACEHOLDER_MODIFIED, '%Y-%m-%dT%H:%M:%SZ')})
+    return ZipTemplate(buffer.getvalue(), PATCHED_MEMBERS)
+
+
+# Plantillas ya armadas en este proceso
+get_epub_template = lru_cache(maxsize=TEMPLATE_CACHE_SIZE)(build_epub_template)
+
+
+def patch_epub_template(template, token_data):
+    """Retorna los bytes del epub para 'token_data' parcheando la plantilla."""
+    return template.render({
+        PLACEHOLDER_URL.encode(): escape(token_data['tracking_url_image']).encode('utf-8'),
+        PLACEHOLDER_UID.encode(): str(uuid.uuid4()).encode(),
+        PLACEHOLDER_MODIFIED.encode(): datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ').encode(),
+    })
+
+
+def generate_epub_honeytoken(server_url, output_file, title, author, description, content, token_data=None):
+    """
+    Crea un EPUB inyectando un pixel de tracking en el HTML.
+    Si se pasa 'token_data' (token ya registrado) no se registra uno nuevo.
+    """
+    if token_data is None:
+        token_data = register_token(
+            server_url,
+            token_type="epub",
+            description=description
+        )
+
+
+    # Parcheamos la plantilla ya armada
+    epub_bytes = patch_epub_template(get_epub_template(title, author, content), token_data)
+
+    with open(output_file, "wb") as f:
+        f.write(epub_bytes)
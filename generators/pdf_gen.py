@@ -1,20 +1,19 @@
 import io
+from functools import lru_cache
 from fpdf import FPDF
 from pypdf import PdfWriter, PdfReader
 from pypdf.generic import DictionaryObject, NameObject, TextStringObject
 from .common import register_token, random_creation_date, random_modification_date
+from .templates import TEMPLATE_CACHE_SIZE, PLACEHOLDER_URL, PLACEHOLDER_CREATED, PLACEHOLDER_MODIFIED, PdfTemplate, pdf_string
 
-def generate_pdf_honeytoken(server_url, output_file, description, title=None, author=None, content=None):
-    """
-    Genera un PDF con una OpenAction que redirige a un URL de tracking.
-    """
-    token_data = register_token(
-        server_url, 
-        token_type="pdf",
-        description=description
-    )
-    tracking_url = token_data['tracking_url_link']
 
+def to_pdf_date(iso_date):
+    """Convierte una fecha ISO (YYYY-MM-DDTHH:MM:SSZ) al formato PDF (D:YYYYMMDDHHmmSSZ)."""
+    return f"D:{iso_date.replace('-', '').replace(':', '').replace('T', '')}"
+
+
+def render_pdf(tracking_url, title, author, content, c_date_pdf, m_date_pdf):
+    """Renderiza el PDF completo y retorna sus bytes."""
     # Creamos el PDF (con su título y contenido) usando la librería FPDF
     pdf = FPDF()
     pdf.add_page()
@@ -48,13 +47,6 @@ def generate_pdf_honeytoken(server_url, output_file, description, title=None, au
     metadata['/Creator'] = fake_creator
     metadata['/Producer'] = fake_creator
 
-    # Fechas de creación y modificación
-    c_date_iso = random_creation_date()
-    m_date_iso = random_modification_date(c_date_iso)
-    # Las convertimos a formato PDF (D:YYYYMMDDHHmmSSZ)
-    c_date_pdf = f"D:{c_date_iso.replace('-', '').replace(':', '').replace('T', '')}"
-    m_date_pdf = f"D:{m_date_iso.replace('-', '').replace(':', '').replace('T', '')}"
-
     metadata['/CreationDate'] = c_date_pdf
     metadata['/ModDate'] = m_date_pdf
 
@@ -71,6 +63,60 @@ def generate_pdf_honeytoken(server_url, output_file, description, title=None, au
         NameObject("/OpenAction"): uri_action
     })
 
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def build_pdf_template(title, author, content):
+    """
+    Renderiza el PDF para (título, autor, contenido) con valores de
+    relleno en la URL y las fechas, que después se parchean por token.
+    """
+    c_date_pdf = to_pdf_date(PLACEHOLDER_CREATED)
+    m_date_pdf = to_pdf_date(PLACEHOLDER_MODIFIED)
+    pdf_bytes = render_pdf(PLACEHOLDER_URL, title, author, content, c_date_pdf, m_date_pdf)
+    return PdfTemplate(pdf_bytes, {
+        'url': pdf_string(PLACEHOLDER_URL),
+        'created': pdf_string(c_date_pdf),
+        'modified': pdf_string(m_date_pdf),
+    })
+
+
+# Plantillas ya armadas en este proceso
+get_pdf_template = lru_cache(maxsize=TEMPLATE_CACHE_SIZE)(build_pdf_template)
+
+
+def patch_pdf_template(template, token_data):
+    """Retorna los bytes del PDF para 'token_data' parcheando la plantilla."""
+    tracking_url = token_data['tracking_url_link']
+
+    # Fechas de creación y modificación
+    c_date_iso = random_creation_date()
+    m_date_iso = random_modification_date(c_date_iso)
+
+    return template.render({
+        'url': pdf_string(tracking_url),
+        'created': pdf_string(to_pdf_date(c_date_iso)),
+        'modified': pdf_string(to_pdf_date(m_date_iso)),
+    })
+
+
+def generate_pdf_honeytoken(server_url, output_file, description, title=None, author=None, content=None, token_data=None):
+    """
+    Genera un PDF con una OpenAction que redirige a un URL de tracking.
+    Si se pasa 'token_data' (token ya registrado) no se registra uno nuevo.
+    """
+    if token_data is None:
+        token_data = register_token(
+            server_url, 
+            token_type="pdf",
+            description=description
+        )
+
+    # Parcheamos la plantilla ya renderizada
+    pdf_bytes = patch_pdf_template(get_pdf_template(title, author, content), token_data)
+
     # Guardamos el PDF
     with open(output_file, "wb") as f:
-        writer.write(f)
\ No newline at end of file
+        f.write(pdf_bytes)
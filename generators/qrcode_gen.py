@@ -1,12 +1,13 @@
 from .common import register_token
 import qrcode
 
-def generate_qrcode_honeytoken(server_url, output_file, description):
-    token_data = register_token(
-        server_url, 
-        token_type="qrcode",
-        description=description
-    )
+def generate_qrcode_honeytoken(server_url, output_file, description, token_data=None):
+    if token_data is None:
+        token_data = register_token(
+            server_url, 
+            token_type="qrcode",
+            description=description
+        )
     
     tracking_url = token_data['tracking_url_link']
 
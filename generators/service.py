@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+from .pdf_gen import build_pdf_template, patch_pdf_template
+from .docx_gen import build_docx_template, patch_docx_template
+from .xlsx_gen import build_xlsx_template, patch_xlsx_template
+from .epub_gen import build_epub_template, patch_epub_template
+from .qrcode_gen import generate_qrcode_honeytoken
+from .binary_gen import generate_binary_honeytoken
+
+# Formatos con plantilla: (armar plantilla, parchear para un token)
+DOCUMENT_TYPES = {
+    'pdf': (build_pdf_template, patch_pdf_template),
+    'docx': (build_docx_template, patch_docx_template),
+    'xlsx': (build_xlsx_template, patch_xlsx_template),
+    'epub': (build_epub_template, patch_epub_template),
+}
+
+# Extensión y tipo MIME del archivo generado por tipo
+GENERATION_TYPES = {
+    'pdf': ('.pdf', 'application/pdf'),
+    'docx': ('.docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'epub': ('.epub', 'application/epub+zip'),
+    'qrcode': ('.png', 'image/png'),
+    'binary': ('', 'application/octet-stream'),
+}
+
+
+class GenerationBusy(Exception):
+    """La cola de generación está llena."""
+
+
+class GenerationTimeout(Exception):
+    """La generación no terminó a tiempo."""
+
+
+def template_key(file_type, title, author, content):
+    """Dirección (sha256) de la plantilla para esos datos."""
+    payload = json.dumps([file_type, title, author, content], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _build_template(file_type, title, author, content):
+    """Arma una plantilla. Corre dentro de los procesos del pool."""
+    build, _ = DOCUMENT_TYPES[file_type]
+    return build(title, author, content)
+
+
+def _generate_file(file_type, token_data, platform):
+    """Genera un QR o un binario y retorna sus bytes. Corre dentro de los procesos del pool."""
+    with tempfile.TemporaryDirectory() as folder:
+        output_file = os.path.join(folder, 'honeytoken')
+        if file_type == 'qrcode':
+            output_file += '.png'
+            generate_qrcode_honeytoken(None, output_file, None, token_data=token_data)
+        else:
+            generate_binary_honeytoken(None, output_file, platform, None, token_data=token_data)
+        with open(output_file, 'rb') as f:
+            return f.read()
+
+
+class TemplateCache:
+    """Plantillas armadas, indexadas por template_key (LRU acotado)."""
+
+    def __init__(self, max_items=64):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            template = self._items.get(key)
+            if template is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return template
+
+    def put(self, key, template):
+        with self._lock:
+            self._items[key] = template
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'items': len(self._items), 'max_items': self.max_items, 'hits': self.hits, 'misses': self.misses}
+
+
+class GenerationPool:
+    """
+    Genera honeytokens del lado del servidor sin frenar el tráfico de tracking.
+
+    El trabajo pesado (armar la plantilla de un documento, el QR o el
+    binario) corre en un pool de 'workers' procesos. Las plantillas de los
+    documentos se guardan en un TemplateCache direccionado por contenido, así
+    que los pedidos con el mismo título, autor y contenido solo parchean la
+    URL y las fechas en el proceso del request. Con 'max_pending' trabajos en
+    curso se rechazan los nuevos (GenerationBusy) en lugar de encolarlos. Un
+    trabajo que venció el timeout sigue ocupando su lugar hasta que el
+    proceso termina, porque no se lo puede interrumpir.
+    """
+
+    def __init__(self, workers=2, max_pending=32, timeout=30, cache_size=64):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.cache = TemplateCache(cache_size)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _run(self, func, *args):
+        """Corre 'func' en el pool respetando el límite de trabajos en curso."""
+        if not self._slots.acquire(blocking=False):
+            raise GenerationBusy("Demasiadas generaciones en curso")
+        try:
+            with self._executor_lock:
+                # Se crea recién al usarlo, así los procesos nacen después del fork de gunicorn
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._pending_lock:
+            self._pending += 1
+        # El lugar se libera cuando el trabajo termina de verdad, no cuando vence el timeout
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise GenerationTimeout(f"La generación tardó más de {self.timeout}s")
+
+    def _release(self, future):
+        with self._pending_lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def get_template(self, file_type, title=None, author=None, content=None):
+        key = template_key(file_type, title, author, content)
+        template = self.cache.get(key)
+        if template is None:
+            template = self._run(_build_template, file_type, title, author, content)
+            self.cache.put(key, template)
+        return template
+
+    def generate(self, file_type, token_data, title=None, author=None, content=None, platform='linux'):
+        """Retorna los bytes del honeytoken de 'file_type' para 'token_data'."""
+        if file_type in DOCUMENT_TYPES:
+            _, patch = DOCUMENT_TYPES[file_type]
+            return patch(self.get_template(file_type, title, author, content), token_data)
+        if file_type in GENERATION_TYPES:
+            return self._run(_generate_file, file_type, token_data, platform)
+        raise ValueError(f"Tipo no soportado: {file_type}")
+
+    def stats(self):
+        with self._pending_lock:
+            pending = self._pending
+        return {'workers': self.workers, 'max_pending': self.max_pending, 'pending': pending,
+                'cache': self.cache.stats()}
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
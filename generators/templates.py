@@ -0,0 +1,172 @@
+import io
+import re
+import struct
+import zipfile
+
+from pypdf.generic import TextStringObject
+
+# Cantidad de plantillas (por combinación de título, autor y contenido) que
+# se mantienen armadas en memoria por formato
+TEMPLATE_CACHE_SIZE = 32
+
+# Valores de relleno con los que se renderiza cada plantilla. Después se
+# reemplazan por los valores reales de cada token.
+PLACEHOLDER_URL = "http://tokensnare.invalid/PLACEHOLDER_URL"
+PLACEHOLDER_CREATED = "1999-01-01T00:00:00Z"
+PLACEHOLDER_MODIFIED = "1999-02-02T00:00:00Z"
+
+# Formatos de la estructura ZIP: header del directorio central y registro de fin (EOCD)
+_CENTRAL_HEADER = b"PK\x01\x02"
+_CENTRAL_HEADER_SIZE = 46
+_EOCD = struct.Struct('<4s4H2LH')
+_PDF_XREF_ENTRY = "{:010d} {:05d} {} \n"
+
+
+def _split_zip(data):
+    """Separa un ZIP en (registros locales, directorio central, cantidad de entradas)."""
+    eocd_pos = data.rfind(b"PK\x05\x06")
+    _, _, _, _, count, cd_size, cd_offset, _ = _EOCD.unpack_from(data, eocd_pos)
+    return data[:cd_offset], data[cd_offset:cd_offset + cd_size], count
+
+
+def _shift_central_offsets(central, delta):
+    """Corre 'delta' bytes el offset de cada entrada del directorio central."""
+    central = bytearray(central)
+    pos = 0
+    while pos < len(central):
+        if central[pos:pos + 4] != _CENTRAL_HEADER:
+            raise ValueError("Directorio central del ZIP inválido")
+        name_len, extra_len, comment_len = struct.unpack_from('<3H', central, pos + 28)
+        (offset,) = struct.unpack_from('<L', central, pos + 42)
+        struct.pack_into('<L', central, pos + 42, offset + delta)
+        pos += _CENTRAL_HEADER_SIZE + name_len + extra_len + comment_len
+    return bytes(central)
+
+
+class ZipTemplate:
+    """
+    Documento ZIP (docx, xlsx, epub) ya armado a partir de un render con
+    valores de relleno.
+
+    Los miembros que no cambian entre tokens se comprimen una sola vez y sus
+    bytes se copian tal cual. Por cada token solo se recomprimen los miembros
+    de 'patched_names' (con los reemplazos aplicados), que se agregan al final
+    del archivo ajustando los offsets del directorio central.
+    """
+
+    def __init__(self, zip_bytes, patched_names):
+        fixed = io.BytesIO()
+        self.patched = {}
+        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as source, zipfile.ZipFile(fixed, 'w') as target:
+            for info in source.infolist():
+                data = source.read(info)
+                if info.filename in patched_names:
+                    self.patched[info.filename] = (data, info.compress_type)
+                else:
+                    target.writestr(info, data, compress_type=info.compress_type)
+        missing = set(patched_names) - set(self.patched)
+        if missing:
+            raise ValueError(f"La plantilla no tiene los miembros: {', '.join(sorted(missing))}")
+        self.records, self.central, self.count = _split_zip(fixed.getvalue())
+
+    def render(self, replacements):
+        """Retorna el documento final aplicando 'replacements' (bytes -> bytes)."""
+        extra = io.BytesIO()
+        with zipfile.ZipFile(extra, 'w') as z:
+            for name, (data, compress_type) in self.patched.items():
+                for old, new in replacements.items():
+                    data = data.replace(old, new)
+                z.writestr(name, data, compress_type=compress_type)
+        records, central, count = _split_zip(extra.getvalue())
+
+        central = self.central + _shift_central_offsets(central, len(self.records))
+        cd_offset = len(self.records) + len(records)
+        total = self.count + count
+        eocd = _EOCD.pack(b"PK\x05\x06", 0, 0, total, total, len(central), cd_offset, 0)
+        return b"".join((self.records, records, central, eocd))
+
+
+def pdf_string(value):
+    """Codifica 'value' como string PDF igual que lo escribe pypdf."""
+    stream = io.BytesIO()
+    TextStringObject(value).write_to_stream(stream)
+    return stream.getvalue()
+
+
+class PdfTemplate:
+    """
+    PDF ya escrito por pypdf con valores de relleno.
+
+    Se guardan los tramos del archivo entre los valores a reemplazar y la
+    tabla xref original. Por cada token se unen los tramos con los valores
+    reales y se regenera la tabla xref (y el startxref) corrigiendo los
+    offsets de los objetos que quedaron después de un reemplazo.
+    """
+
+    def __init__(self, pdf_bytes, placeholders):
+        xref_offset = int(re.search(rb"startxref\s+(\d+)\s+%%EOF\s*$", pdf_bytes).group(1))
+        body, tail = pdf_bytes[:xref_offset], pdf_bytes[xref_offset:]
+
+        table = re.match(rb"xref\s+0 (\d+)\s*\n", tail)
+        if table is None:
+            raise ValueError("El PDF de la plantilla no tiene una tabla xref clásica")
+        size = int(table.group(1))
+        entries = tail[table.end():table.end() + 20 * size]
+        self.xref = [
+            (int(entry[:10]), int(entry[11:16]), entry[17:18].decode())
+            for entry in (entries[i:i + 20] for i in range(0, len(entries), 20))
+        ]
+        trailer = tail[table.end() + 20 * size:]
+        self.trailer = trailer[:trailer.rindex(b"startxref")]
+
+        # Posiciones de cada valor de relleno dentro del cuerpo
+        found = []
+        for key, placeholder in placeholders.items():
+            start = 0
+            while (pos := body.find(placeholder, start)) != -1:
+                found.append((pos, len(placeholder), key))
+                start = pos + len(placeholder)
+        found.sort()
+
+        self.chunks = []
+        self.keys = []
+        self.positions = []
+        last = 0
+        for pos, length, key in found:
+            self.chunks.append(body[last:pos])
+            self.keys.append(key)
+            self.positions.append(pos)
+            last = pos + length
+        self.chunks.append(body[last:])
+        self.lengths = {key: len(placeholder) for key, placeholder in placeholders.items()}
+
+    def render(self, values):
+        """Retorna el PDF final con 'values' (clave -> bytes ya codificados)."""
+        parts = [self.chunks[0]]
+        shifts = []  # (posición original, corrimiento acumulado a partir de ahí)
+        delta = 0
+        for key, position, chunk in zip(self.keys, self.positions, self.chunks[1:]):
+            value = values[key]
+            parts.append(value)
+            parts.append(chunk)
+            delta += len(value) - self.lengths[key]
+            shifts.append((position, delta))
+
+        def shifted(offset):
+            moved = 0
+            for position, accumulated in shifts:
+                if position >= offset:
+                    break
+                moved = accumulated
+            return offset + moved
+
+        body = b"".join(parts)
+        xref = [f"xref\n0 {len(self.xref)}\n"]
+        for offset, generation, kind in self.xref:
+            xref.append(_PDF_XREF_ENTRY.format(shifted(offset) if kind == 'n' else offset, generation, kind))
+        return b"".join((
+            body,
+            "".join(xref).encode('ascii'),
+            self.trailer,
+            f"startxref\n{len(body)}\n%%EOF\n".encode('ascii'),
+        ))
@@ -1,6 +1,9 @@
+import io
 import zipfile
+from functools import lru_cache
 from xml.sax.saxutils import escape
 from .common import register_token, random_creation_date, random_modification_date
+from .templates import TEMPLATE_CACHE_SIZE, PLACEHOLDER_URL, PLACEHOLDER_CREATED, PLACEHOLDER_MODIFIED, ZipTemplate
 
 
 # --- TEMPLATES XML ESTÁTICOS ---
@@ -71,36 +74,32 @@ CORE_PROPS_TEMPLATE = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
   <dcterms:modified xsi:type="dcterms:W3CDTF">{modified}</dcterms:modified>
 </cp:coreProperties>"""
 
+# Miembros del xlsx que cambian por token (URL de la imagen y fechas)
+PATCHED_MEMBERS = ('xl/drawings/_rels/drawing1.xml.rels', 'docProps/core.xml')
 
-def generate_xlsx_honeytoken(server_url, output_file, description, title=None, author=None, content=None):
-    token_data = register_token(
-        server_url,
-        token_type="xlsx",
-        description=description
-    )
-    
-    tracking_url = token_data['tracking_url_image']
 
-    # Datos dinámicos
-    ts_created = random_creation_date()
-    ts_modified = random_modification_date(ts_created)
-    
+def build_xlsx_template(title, author, content):
+    """
+    Arma el libro para (título, autor, contenido) con valores de
+    relleno en la URL y las fechas, que después se parchean por token.
+    """
     clean_title = escape(title or "")
     clean_author = escape(author or "")
     clean_content = escape(content or "")
     
     worksheet_final = WORKSHEET_TEMPLATE.format(clean_content)
-    drawing_rels_final = DRAWING_RELS_TEMPLATE.format(tracking_url)
+    drawing_rels_final = DRAWING_RELS_TEMPLATE.format(PLACEHOLDER_URL)
     
     core_props_final = CORE_PROPS_TEMPLATE.format(
         title=clean_title, 
         author=clean_author, 
-        created=ts_created,
-        modified=ts_modified
+        created=PLACEHOLDER_CREATED,
+        modified=PLACEHOLDER_MODIFIED
     )
 
     # Construcción
-    with zipfile.ZipFile(output_file, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as z:
         # Templates estáticos
         z.writestr('[Content_Types].xml', CONTENT_TYPES)
         z.writestr('_rels/.rels', RELS_GLOBAL)
@@ -114,4 +113,40 @@ def generate_xlsx_honeytoken(server_url, output_file, description, title=None, a
         z.writestr('xl/worksheets/sheet1.xml', worksheet_final)
         z.writestr('xl/drawings/drawing1.xml', DRAWING)
         z.writestr('xl/drawings/_rels/drawing1.xml.rels', drawing_rels_final)
-        z.writestr('docProps/core.xml', core_props_final)   
\ No newline at end of file
+        z.writestr('docProps/core.xml', core_props_final)
+    return ZipTemplate(buffer.getvalue(), PATCHED_MEMBERS)
+
+
+# Plantillas ya armadas en este proceso
+get_xlsx_template = lru_cache(maxsize=TEMPLATE_CACHE_SIZE)(build_xlsx_template)
+
+
+def patch_xlsx_template(template, token_data):
+    """Retorna los bytes del xlsx para 'token_data' parcheando la plantilla."""
+    tracking_url = token_data['tracking_url_image']
+
+    # Datos dinámicos
+    ts_created = random_creation_date()
+    ts_modified = random_modification_date(ts_created)
+
+    return template.render({
+        PLACEHOLDER_URL.encode(): tracking_url.encode('utf-8'),
+        PLACEHOLDER_CREATED.encode(): ts_created.encode(),
+        PLACEHOLDER_MODIFIED.encode(): ts_modified.encode(),
+    })
+
+
+def generate_xlsx_honeytoken(server_url, output_file, description, title=None, author=None, content=None, token_data=None):
+    if token_data is None:
+        token_data = register_token(
+            server_url,
+            token_type="xlsx",
+            description=description
+        )
+
+
+    # Parcheamos la plantilla ya armada
+    xlsx_bytes = patch_xlsx_template(get_xlsx_template(title, author, content), token_data)
+
+    with open(output_file, "wb") as f:
+        f.write(xlsx_bytes)
@@ -0,0 +1,6 @@
+# Este archivo expone el pipeline de logs estructurados y el muestreo de hits
+# para que puedan ser importados directamente desde 'logs'
+
+from .pipeline import (ConsoleFormatter, JsonFormatter, LogPipeline, StdoutHandler, build_file_handler,
+                       configure_logging)
+from .sampling import HitLogSampler
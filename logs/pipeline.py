@@ -0,0 +1,196 @@
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Una línea JSON por evento: ts, level, logger, message y los campos
+    estructurados que vienen en extra={'fields': {...}}.
+    """
+
+    def __init__(self, tz=None):
+        super().__init__()
+        self.tz = tz
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, self.tz).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Formato de consola de siempre: [YYYY-MM-DD HH:MM:SS] Mensaje."""
+
+    def __init__(self, tz=None):
+        super().__init__()
+        self.tz = tz
+
+    def format(self, record):
+        timestamp = datetime.fromtimestamp(record.created, self.tz).strftime("%Y-%m-%d %H:%M:%S")
+        message = f"[{timestamp}] {record.getMessage()}"
+        if record.exc_info:
+            message += '\n' + self.formatException(record.exc_info)
+        return message
+
+
+class StdoutHandler(logging.StreamHandler):
+    """StreamHandler que escribe en el sys.stdout actual (aunque se haya redirigido después)."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _PipelineHandler(logging.handlers.QueueHandler):
+    """
+    Encola el evento sin esperar: si la cola está llena se descarta y se
+    cuenta. Con el pipeline detenido lo escribe directamente.
+    """
+
+    def __init__(self, pipeline):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+
+    def prepare(self, record):
+        # Misma memoria, no hace falta que sea serializable: el mensaje se
+        # arma acá (los args podrían cambiar) y la excepción la formatea el listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.pipeline.count_dropped()
+
+    def emit(self, record):
+        if self.pipeline.running:
+            super().emit(record)
+        else:
+            self.pipeline.write(record)
+
+
+class _Listener(logging.handlers.QueueListener):
+    """QueueListener que espera lugar para la marca de fin: con la cola llena put_nowait fallaría."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """
+    Los eventos de log pasan por una cola acotada y un hilo (QueueListener)
+    los escribe en los 'handlers' (consola, archivo con rotación). Así el
+    hilo del request nunca espera a la terminal ni al disco.
+
+    El hilo no sobrevive a un fork: start vuelve a crearlo (con una cola
+    nueva) si se llama desde otro proceso, por eso cada worker de gunicorn
+    lo arranca al iniciar.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        self.handlers = handlers
+        self.queue_size = queue_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handler = _PipelineHandler(self)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._listener is not None and self._pid == os.getpid()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Proceso hijo: la cola del padre pudo quedar con el lock tomado
+                self.queue = queue.Queue(maxsize=self.queue_size)
+                self.handler.queue = self.queue
+            self._listener = _Listener(self.queue, *self.handlers, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """Escribe lo pendiente y detiene el hilo; lo que llegue después se escribe directo."""
+        with self._lock:
+            if not self.running:
+                return
+            listener, self._listener = self._listener, None
+        listener.stop()
+        for handler in self.handlers:
+            handler.flush()
+
+    def write(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def count_dropped(self):
+        with self._lock:
+            self.dropped += 1
+
+    def stats(self):
+        return {'queued': self.queue.qsize(), 'queue_size': self.queue_size, 'dropped': self.dropped,
+                'running': self.running}
+
+
+def build_file_handler(path, max_bytes=0, rotate_when=None, backup_count=5):
+    """
+    Archivo de log con rotación por tiempo ('rotate_when', ej: 'midnight'
+    o 'H') o por tamaño ('max_bytes'); sin ninguno de los dos no rota.
+    """
+    if rotate_when:
+        return logging.handlers.TimedRotatingFileHandler(path, when=rotate_when, backupCount=backup_count,
+                                                         encoding='utf-8', delay=True)
+    return logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                encoding='utf-8', delay=True)
+
+
+def configure_logging(level='INFO', log_format='text', log_file=None, max_bytes=0, rotate_when=None,
+                      backup_count=5, queue_size=10000, tz=None):
+    """
+    Manda todos los logs (los del servidor y los de storage, alerts, etc.)
+    por un LogPipeline ya iniciado: a consola en texto o JSON según
+    'log_format' y, con 'log_file', a un archivo JSON Lines con rotación.
+    """
+    console = StdoutHandler()
+    console.setFormatter(JsonFormatter(tz) if log_format == 'json' else ConsoleFormatter(tz))
+    handlers = [console]
+    if log_file:
+        file_handler = build_file_handler(log_file, max_bytes, rotate_when, backup_count)
+        file_handler.setFormatter(JsonFormatter(tz))
+        handlers.append(file_handler)
+
+    pipeline = LogPipeline(handlers, queue_size)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, _PipelineHandler):
+            root.removeHandler(handler)
+    root.addHandler(pipeline.handler)
+    root.setLevel(level)
+    pipeline.start()
+    return pipeline
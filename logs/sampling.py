@@ -0,0 +1,54 @@
+import threading
+import time
+
+
+class HitLogSampler:
+    """
+    Muestreo de los logs de hits por token, para que un token con mucho
+    tráfico no inunde la consola ni el archivo de log.
+
+    En cada ventana de 'window' segundos se registran los primeros
+    'threshold' hits de cada token; a partir de ahí solo uno de cada
+    'rate'. sample retorna cuántos hits representa el log (1, o 'rate' si
+    es una muestra) o 0 si no hay que registrarlo. Los hits se guardan
+    y alertan igual: solo se muestrea el log.
+    """
+
+    def __init__(self, threshold, rate, window=60.0, max_tokens=10000):
+        self.threshold = threshold
+        self.rate = max(1, rate)
+        self.window = window
+        self.max_tokens = max_tokens
+        self.sampled_out = 0
+        self._windows = {}  # token -> [inicio de la ventana, hits en la ventana]
+        self._lock = threading.Lock()
+
+    def sample(self, token):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._windows.get(token)
+            if entry is None or now - entry[0] >= self.window:
+                if entry is None and len(self._windows) >= self.max_tokens:
+                    self._evict(now)
+                entry = self._windows[token] = [now, 0]
+            entry[1] += 1
+            count = entry[1]
+            if count <= self.threshold:
+                return 1
+            if (count - self.threshold) % self.rate == 0:
+                return self.rate
+            self.sampled_out += 1
+            return 0
+
+    def _evict(self, now):
+        # Primero las ventanas vencidas; si no alcanza, se empieza de cero
+        expired = [token for token, (start, _) in self._windows.items() if now - start >= self.window]
+        for token in expired:
+            del self._windows[token]
+        if len(self._windows) >= self.max_tokens:
+            self._windows.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'threshold': self.threshold, 'rate': self.rate, 'window': self.window,
+                    'tokens': len(self._windows), 'sampled_out': self.sampled_out}
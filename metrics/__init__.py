@@ -0,0 +1,5 @@
+# Este archivo expone el registro de métricas y los collectors del proceso
+# para que puedan ser importados directamente desde 'metrics'
+
+from .process import process_metrics
+from .registry import LATENCY_BUCKETS, Counter, Histogram, MetricsRegistry, format_family
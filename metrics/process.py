@@ -0,0 +1,37 @@
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROCESS_START = time.time()
+
+
+def _rss_bytes():
+    # /proc da la memoria actual; getrusage solo el pico (en KB en Linux)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+
+def process_metrics():
+    """Memoria, CPU, hilos y arranque del proceso (collector de MetricsRegistry)."""
+    times = os.times()
+    return [
+        ('process_resident_memory_bytes', 'gauge', "Memoria residente del proceso.",
+         [('', {}, _rss_bytes())]),
+        ('process_cpu_seconds_total', 'counter', "Tiempo de CPU (usuario + sistema) del proceso.",
+         [('', {}, times.user + times.system)]),
+        ('process_threads', 'gauge', "Hilos del proceso.",
+         [('', {}, threading.active_count())]),
+        ('process_start_time_seconds', 'gauge', "Arranque del proceso (epoch).",
+         [('', {}, PROCESS_START)]),
+    ]
@@ -0,0 +1,148 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Buckets (segundos) pensados para el tracking, que responde en menos de 1 ms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def format_family(name, kind, help_text, samples):
+    """
+    Líneas del formato de texto de Prometheus para una métrica. 'samples'
+    es una lista de (sufijo, labels, valor), ej: ('_count', {'route': '/'}, 3).
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for suffix, labels, value in samples:
+        lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return lines
+
+
+class Counter:
+    """Contador por combinación de labels. inc recibe los valores en el orden de 'labelnames'."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [('', dict(zip(self.labelnames, key)), value) for key, value in sorted(values)]
+
+
+class Histogram:
+    """
+    Histograma con buckets fijos por combinación de labels. observe cuesta
+    una búsqueda binaria y un lock; los acumulados se arman recién al
+    exportar.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [conteo por bucket (+Inf al final), suma]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        samples = []
+        for key, counts, total in sorted(series):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(('_bucket', {**labels, 'le': _format_value(float(bound))}, cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Métricas del proceso en el formato de texto de Prometheus.
+
+    Los contadores e histogramas se actualizan en el camino del request.
+    Lo que ya cuentan otros componentes (colas, storage, memoria) se lee
+    recién al exportar con los 'collectors': funciones que retornan una
+    lista de (nombre, tipo, ayuda, samples) como en format_family.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(format_family(metric.name, metric.kind, metric.help_text, metric.samples()))
+        for collect in self._collectors:
+            for name, kind, help_text, samples in collect():
+                lines.extend(format_family(name, kind, help_text, samples))
+        return '\n'.join(lines) + '\n'
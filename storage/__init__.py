@@ -0,0 +1,30 @@
+# Este archivo expone las piezas de persistencia del servidor
+# para que puedan ser importadas directamente desde 'storage'
+
+from .base import TOKEN_SORT_FIELDS, Storage
+from .bloom import BloomFilter
+from .broker import HitBroker, Subscription
+from .export import EXPORT_FORMATS, HIT_EXPORT_FIELDS, TOKEN_EXPORT_FIELDS, encode_records, gzip_chunks
+from .hits import CompactHit
+from .hll import HyperLogLog
+from .ingest import HitIngestQueue
+from .journal import HitJournal
+from .json_backend import JsonStorage
+from .retention import HitArchiver
+from .sqlite_backend import SqliteStorage
+from .stats import HitStats
+from .throttle import HitDeduplicator, TokenBucket
+
+STORAGE_BACKENDS = ['json', 'sqlite']
+
+
+def create_storage(backend, db_file=None, **options):
+    """
+    Crea el backend de persistencia pedido.
+    'options' se pasa tal cual al constructor (ej: compact_every para json).
+    """
+    if backend == 'json':
+        return JsonStorage(db_file or "tokensnare_db.json", **options)
+    elif backend == 'sqlite':
+        return SqliteStorage(db_file or "tokensnare_db.sqlite3", **options)
+    raise ValueError(f"Backend de storage no soportado: {backend}. Opciones: {', '.join(STORAGE_BACKENDS)}")
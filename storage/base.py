@@ -0,0 +1,198 @@
+# Campos por los que se puede ordenar en search_tokens
+TOKEN_SORT_FIELDS = ('created_at', 'last_hit', 'hits', 'type', 'description', 'token')
+
+
+class Storage:
+    """
+    Interfaz común de los backends de persistencia del servidor.
+
+    Los tokens y los hits se manejan como diccionarios con el mismo formato
+    que usa la API:
+        token: {'token', 'type', 'description', 'created_at', 'hits', 'last_hit'}
+        hit:   {'id', 'token', 'timestamp', 'ip', 'user_agent', 'headers'}
+    El 'id' de cada hit es creciente y lo asigna el backend en add_hit; se usa
+    como cursor de paginación. Los hits que agruparon repeticiones (ver
+    add_hit_repeats) tienen además 'repeats' y 'last_seen'.
+    Los tokens que devuelven los métodos de lectura son copias, el llamador
+    puede modificarlos.
+    """
+
+    def load(self):
+        """Abre el backend y deja la DB lista para usarse."""
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def release_thread(self):
+        """
+        Libera lo que el backend tenga abierto para el hilo actual (si lo
+        necesita). El servidor lo llama al terminar cada request.
+        """
+
+    # --- Tokens ---
+
+    def has_token(self, token_id):
+        raise NotImplementedError
+
+    def get_token(self, token_id):
+        """Retorna el registro del token o None si no existe."""
+        raise NotImplementedError
+
+    def list_tokens(self):
+        raise NotImplementedError
+
+    def count_tokens(self):
+        raise NotImplementedError
+
+    def query_tokens(self, after=None, limit=None, token_type=None):
+        """
+        Generador de tokens ordenados por ID, empezando después del
+        token 'after' (exclusivo). Opcionalmente filtra por tipo.
+        """
+        raise NotImplementedError
+
+    def search_tokens(self, search=None, token_type=None, min_hits=None, sort='created_at', descending=True,
+                      offset=0, limit=50):
+        """
+        Página de tokens para el panel de administración. Filtra por texto
+        (contenido en la descripción o el ID, sin distinguir mayúsculas),
+        tipo y cantidad mínima de hits, y ordena por uno de
+        TOKEN_SORT_FIELDS (a igual valor, por ID). Retorna (tokens, total
+        de tokens que cumplen los filtros).
+        """
+        raise NotImplementedError
+
+    def save_token(self, token_record):
+        """Da de alta o actualiza un token."""
+        raise NotImplementedError
+
+    def save_tokens(self, token_records):
+        """Da de alta o actualiza varios tokens en una sola escritura."""
+        for token_record in token_records:
+            self.save_token(token_record)
+
+    def delete_token(self, token_id):
+        """Borra el token y sus hits. Retorna False si no existía."""
+        raise NotImplementedError
+
+    def delete_all(self):
+        raise NotImplementedError
+
+    # --- Hits ---
+
+    def add_hit(self, hit_record):
+        """
+        Registra un hit y actualiza el contador y el último hit del token.
+        Retorna False (sin persistir nada) si el token no existe.
+        """
+        raise NotImplementedError
+
+    def add_hits(self, hit_records):
+        """
+        Registra un lote de hits en una sola escritura.
+        Retorna la lista de los hits aceptados (los de tokens existentes).
+        """
+        return [hit_record for hit_record in hit_records if self.add_hit(hit_record)]
+
+    def add_hit_repeats(self, repeats):
+        """
+        Suma repeticiones a hits ya guardados, en una sola escritura. También
+        suman en 'hits' y 'last_hit' del token, como cualquier acceso.
+        'repeats' es una lista de (token, hit id, cantidad, último timestamp).
+        """
+        raise NotImplementedError
+
+    def get_hits(self, token_id):
+        """Hits de un token en orden de llegada."""
+        raise NotImplementedError
+
+    def query_hits(self, token_id, after=None, limit=None, since=None, until=None, ip=None, user_agent=None):
+        """
+        Generador de hits de un token ordenados por 'id', empezando después
+        del hit 'after' (exclusivo).
+        Filtros: rango de timestamps ISO [since, until], IP exacta y
+        user agent que contenga el texto dado.
+        """
+        raise NotImplementedError
+
+    def iter_hits(self, after=None, upto=None, since=None):
+        """
+        Recorre todos los hits en orden de 'id', opcionalmente solo los de
+        id en (after, upto] y timestamp >= 'since'. Los ids nuevos siempre
+        son mayores que los existentes, así que el último id leído sirve de
+        cursor para retomar.
+        """
+        raise NotImplementedError
+
+    def last_hit_id(self):
+        """Id del último hit guardado (0 si no hay)."""
+        raise NotImplementedError
+
+    def count_hits(self):
+        raise NotImplementedError
+
+    # --- Estadísticas ---
+
+    def get_hit_stats(self, token_id=None):
+        """
+        Agregados de los hits de un token (o de todos con token_id=None),
+        mantenidos con cada hit (ver HitStats.summary). None si el token no
+        tuvo hits. Incluyen los hits ya archivados; los globales también los
+        de tokens borrados (delete_all los reinicia).
+        """
+        raise NotImplementedError
+
+    def list_hit_stats(self):
+        """Diccionario token -> agregados serializados (la clave '' son los globales)."""
+        raise NotImplementedError
+
+    # --- Retención ---
+
+    def iter_expired_hits(self, before=None, keep_per_token=None):
+        """
+        Recorre los hits vencidos según la política de retención: los de
+        timestamp anterior a 'before' y los que exceden los 'keep_per_token'
+        más recientes de su token. Lo usa HitArchiver.
+        """
+        raise NotImplementedError
+
+    def archive_hits(self, ids_by_token, rollups):
+        """
+        Borra los hits archivados ('ids_by_token': token -> lista de ids) y
+        guarda los rollups actualizados de esos tokens, en una sola escritura.
+        El contador 'hits' del token no cambia: sigue contando los archivados.
+        """
+        raise NotImplementedError
+
+    def get_rollup(self, token_id):
+        """Rollup de los hits archivados del token o None si no tiene."""
+        raise NotImplementedError
+
+    def list_rollups(self):
+        """Diccionario token -> rollup."""
+        raise NotImplementedError
+
+    def compact(self):
+        """Libera el espacio de los hits archivados (si el backend lo necesita)."""
+
+    # --- Métricas ---
+
+    def stats(self):
+        """
+        Estado del storage para /metrics: 'size_bytes' (espacio en disco) y,
+        en los backends con snapshot, la cantidad, duración y bytes de los
+        snapshots escritos.
+        """
+        raise NotImplementedError
+
+    # --- Migración ---
+
+    def bulk_import(self, tokens, hits, rollups=None, stats=None):
+        """
+        Importa tokens, hits, rollups y agregados (ver list_hit_stats) tal
+        cual vienen (sin recalcular contadores). Sin 'stats' los agregados
+        se calculan de los hits importados. Lo usa tokensnare_migrate.py
+        para pasar de un backend a otro.
+        """
+        raise NotImplementedError
@@ -0,0 +1,114 @@
+import threading
+from collections import deque
+
+
+class Subscription:
+    """
+    Suscripción a los hits en vivo con un buffer acotado propio.
+
+    Si el consumidor no lee a tiempo y el buffer se llena, se descartan los
+    eventos más viejos y se cuentan en 'dropped': el publicador nunca espera
+    a un suscriptor lento. Con 'token' solo se reciben los hits de ese token.
+    'notify' (opcional) se llama en cada publicación, para despertar
+    consumidores que no pueden bloquearse en get (ej: un event loop).
+    """
+
+    def __init__(self, buffer_size, token=None, notify=None):
+        self.token = token
+        self.notify = notify
+        self.closed = False
+        self.dropped = 0
+        self._pending_dropped = 0
+        self._events = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+
+    def push(self, events):
+        if self.token is not None:
+            events = [event for event in events if event['token'] == self.token]
+            if not events:
+                return
+        with self._cond:
+            overflow = len(self._events) + len(events) - self._events.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+                self._pending_dropped += overflow
+            self._events.extend(events)
+            self._cond.notify()
+        if self.notify is not None:
+            self.notify()
+
+    def get(self, timeout=None):
+        """
+        Espera hasta 'timeout' segundos y retorna (eventos pendientes,
+        cantidad descartada desde la última lectura).
+        """
+        with self._cond:
+            if not self._events and not self.closed:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            dropped, self._pending_dropped = self._pending_dropped, 0
+        return events, dropped
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self.notify is not None:
+            self.notify()
+
+
+class HitBroker:
+    """
+    Fan-out en proceso de los hits nuevos hacia los suscriptores en vivo
+    (ver /api/stream). publish solo copia los eventos a los buffers de cada
+    suscriptor, así que no frena la ingesta aunque haya consumidores lentos.
+    """
+
+    def __init__(self, buffer_size=1000, max_subscribers=100):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, token=None, notify=None):
+        """Retorna una Subscription nueva o None si se alcanzó max_subscribers."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscription = Subscription(self.buffer_size, token, notify)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+        subscription.close()
+
+    def publish(self, events):
+        if not events:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += len(events)
+        for subscription in subscribers:
+            subscription.push(events)
+
+    def close(self):
+        """Cierra todas las suscripciones (al apagar el servidor)."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        for subscription in subscribers:
+            subscription.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'max_subscribers': self.max_subscribers,
+                'buffer_size': self.buffer_size,
+                'published': self.published,
+                'dropped': sum(subscription.dropped for subscription in self._subscribers),
+            }
@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+import zlib
+
+EXPORT_FORMATS = ['ndjson', 'csv']
+
+HIT_EXPORT_FIELDS = ['id', 'token', 'timestamp', 'ip', 'user_agent', 'repeats', 'last_seen', 'headers']
+TOKEN_EXPORT_FIELDS = ['token', 'type', 'description', 'created_at', 'hits', 'last_hit']
+
+# Tamaño aproximado de cada bloque que se entrega al cliente
+CHUNK_SIZE = 64 * 1024
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return '' if value is None else value
+
+
+def encode_records(records, export_format, fields):
+    """
+    Serializa los registros a medida que se leen y los entrega en bloques
+    de ~CHUNK_SIZE caracteres, sin armar la salida completa en memoria.
+    En CSV la primera línea es el encabezado con 'fields' y los valores
+    compuestos (headers) van como JSON.
+    """
+    buffer = io.StringIO()
+    if export_format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        write = lambda record: writer.writerow([_csv_value(record.get(field)) for field in fields])
+    else:
+        write = lambda record: buffer.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    for record in records:
+        write(record)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks, level=6):
+    """Comprime al vuelo (formato gzip) los bloques de texto de encode_records."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
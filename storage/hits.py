@@ -0,0 +1,85 @@
+import json
+import sys
+import zlib
+
+
+def compress_headers(headers):
+    """Headers (dict) -> blob JSON comprimido con zlib."""
+    return zlib.compress(json.dumps(headers, separators=(',', ':')).encode('utf-8'))
+
+
+def decompress_headers(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class CompactHit:
+    """
+    Representación compacta de un hit para los backends en memoria.
+
+    Usa __slots__ en lugar de un dict por hit, internaliza los strings que
+    se repiten entre hits (token, IP, user-agent, nombres y valores de
+    headers) y guarda los headers como una tupla de pares o, con
+    'compress', como un blob zlib. Es inmutable: para cambiar un hit se
+    arma uno nuevo (ver with_repeats), así los snapshots que se escriben
+    fuera del lock no ven cambios a medias.
+    """
+
+    __slots__ = ('id', 'token', 'timestamp', 'ip', 'user_agent', 'headers_data', 'repeats', 'last_seen')
+
+    def __init__(self, hit_id, token, timestamp, ip, user_agent, headers_data, repeats=0, last_seen=None):
+        self.id = hit_id
+        self.token = token
+        self.timestamp = timestamp
+        self.ip = ip
+        self.user_agent = user_agent
+        self.headers_data = headers_data
+        self.repeats = repeats
+        self.last_seen = last_seen
+
+    @classmethod
+    def from_dict(cls, hit_record, compress=False):
+        headers = hit_record.get('headers') or {}
+        if compress:
+            headers_data = compress_headers(headers)
+        else:
+            headers_data = tuple((_intern(name), _intern(value)) for name, value in headers.items())
+        return cls(
+            hit_record['id'],
+            _intern(hit_record['token']),
+            hit_record['timestamp'],
+            _intern(hit_record.get('ip')),
+            _intern(hit_record.get('user_agent')),
+            headers_data,
+            hit_record.get('repeats', 0),
+            hit_record.get('last_seen'),
+        )
+
+    @property
+    def headers(self):
+        if isinstance(self.headers_data, bytes):
+            return decompress_headers(self.headers_data)
+        return dict(self.headers_data)
+
+    def to_dict(self):
+        """El hit con el formato de la API (ver Storage)."""
+        hit_record = {
+            'id': self.id,
+            'token': self.token,
+            'timestamp': self.timestamp,
+            'ip': self.ip,
+            'user_agent': self.user_agent,
+            'headers': self.headers,
+        }
+        if self.repeats:
+            hit_record['repeats'] = self.repeats
+            hit_record['last_seen'] = self.last_seen
+        return hit_record
+
+    def with_repeats(self, count, last_seen):
+        """Copia del hit sumando 'count' repeticiones."""
+        return CompactHit(self.id, self.token, self.timestamp, self.ip, self.user_agent,
+                          self.headers_data, self.repeats + count, last_seen)
@@ -0,0 +1,46 @@
+import base64
+import hashlib
+import math
+
+
+class HyperLogLog:
+    """
+    Contador aproximado de elementos distintos en memoria fija
+    (2^p registros de un byte, error típico ~1.04/sqrt(2^p)).
+    Se puede serializar (to_string) y combinar con otro (merge).
+    """
+
+    def __init__(self, p=10, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+    def add(self, value):
+        x = int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+        index = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError("No se pueden combinar HyperLogLog de distinta precisión")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        # Corrección para cardinalidades chicas (linear counting)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return round(estimate)
+
+    def to_string(self):
+        return base64.b64encode(bytes(self.registers)).decode('ascii')
+
+    @classmethod
+    def from_string(cls, value):
+        registers = base64.b64decode(value)
+        return cls(len(registers).bit_length() - 1, registers)
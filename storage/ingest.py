@@ -0,0 +1,126 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Marca de fin que se encola al detener el escritor
+_STOP = object()
+
+
+class HitIngestQueue:
+    """
+    Cola acotada de hits con un hilo escritor que los persiste por lotes.
+
+    El request de tracking solo encola el hit; el escritor junta hasta
+    'batch_size' hits o espera 'flush_interval' segundos y llama a
+    'write_batch(lote)'. Si la cola está llena se espera hasta
+    'put_timeout' segundos y después el hit se descarta (y se cuenta).
+    Al detenerse se procesa todo lo que quedó encolado.
+    """
+
+    def __init__(self, write_batch, max_size=10000, batch_size=500, flush_interval=0.2, put_timeout=0.05):
+        self.write_batch = write_batch
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stopped = False
+        self.accepted = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name="hit-ingest", daemon=True)
+                self._thread.start()
+
+    def submit(self, hit_record, timeout=None):
+        """
+        Encola un hit. Retorna False si se descartó por falta de lugar.
+        'timeout' reemplaza a 'put_timeout' (0 no espera nunca, útil desde
+        un event loop). Con la cola detenida el hit se escribe en el momento.
+        """
+        if self._stopped:
+            self._write([hit_record])
+            return True
+        if self._thread is None:
+            self.start()
+        timeout = self.put_timeout if timeout is None else timeout
+        try:
+            if timeout > 0:
+                self._queue.put(hit_record, timeout=timeout)
+            else:
+                self._queue.put_nowait(hit_record)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.accepted += 1
+        return True
+
+    def stop(self, timeout=None):
+        """Deja de aceptar hits en la cola y espera a que se escriban los pendientes."""
+        with self._start_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'max_size': self.max_size,
+                'accepted': self.accepted,
+                'dropped': self.dropped,
+                'written': self.written,
+                'batches': self.batches,
+                'errors': self.errors,
+            }
+
+    def _write(self, batch):
+        try:
+            self.write_batch(batch)
+        except Exception:
+            logger.exception("Error persistiendo un lote de %d hits", len(batch))
+            with self._stats_lock:
+                self.errors += 1
+            return
+        with self._stats_lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stopping:
+                return
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+
+class HitJournal:
+    """
+    Journal append-only (JSON Lines) de las operaciones sobre la base de datos.
+
+    Cada línea es una operación numerada:
+        {"seq": 12, "op": "hit", "data": {...}}
+
+    Al compactar, el journal activo se rota a un segmento '<journal>.<seq>'
+    y se sigue escribiendo en un archivo nuevo. Los segmentos se borran recién
+    cuando el snapshot que los contiene quedó en disco, y el replay descarta
+    las entradas con seq <= al del snapshot, así que un corte en cualquier
+    punto de la compactación no duplica ni pierde hits.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = Path(path)
+        self.fsync = fsync
+        self.seq = 0
+        self.pending = 0  # Entradas escritas desde la última rotación
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _segments(self):
+        """Segmentos rotados, ordenados por número de secuencia."""
+        segments = []
+        for candidate in self.path.parent.glob(f"{self.path.name}.*"):
+            suffix = candidate.name[len(self.path.name) + 1:]
+            if suffix.isdigit():
+                segments.append((int(suffix), candidate))
+        return [path for _, path in sorted(segments)]
+
+    def replay(self, after_seq=0):
+        """
+        Recorre los segmentos y el journal activo devolviendo (op, data)
+        para cada entrada posterior a 'after_seq'.
+        Una línea incompleta (corte durante la escritura) se ignora, y si
+        quedó al final del journal activo se recorta, para que la próxima
+        escritura no se pegue a ella.
+        """
+        self.seq = max(self.seq, after_seq)
+        for journal_path in self._segments() + [self.path]:
+            if not journal_path.exists():
+                continue
+            complete = 0  # Fin de la última línea terminada en salto de línea
+            tail_valid = True
+            with open(journal_path, 'rb') as f:
+                for line in f:
+                    if line.endswith(b'\n'):
+                        complete += len(line)
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        tail_valid = False
+                        continue
+                    tail_valid = True
+                    seq = entry.get('seq', 0)
+                    if seq <= after_seq:
+                        continue
+                    self.seq = max(self.seq, seq)
+                    yield entry['op'], entry['data']
+                unterminated = f.tell() > complete
+            if unterminated and journal_path == self.path:
+                self._repair_tail(complete, tail_valid)
+
+    def _repair_tail(self, complete, tail_valid):
+        """
+        La última línea del journal activo quedó sin salto de línea: si es
+        una entrada válida (ya aplicada) se la termina, si no se la recorta.
+        """
+        with self._lock:
+            if self._file is not None:
+                return
+            if tail_valid:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write('\n')
+            else:
+                os.truncate(self.path, complete)
+
+    def open(self):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+
+    def append(self, op, data):
+        """Agrega una operación al journal y retorna su número de secuencia."""
+        return self.append_many(op, [data])
+
+    def append_many(self, op, items):
+        """
+        Agrega varias operaciones del mismo tipo con una sola escritura
+        (y un solo fsync). Retorna el seq de la última.
+        """
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            lines = []
+            for data in items:
+                self.seq += 1
+                lines.append(json.dumps({'seq': self.seq, 'op': op, 'data': data}, separators=(',', ':')) + '\n')
+            if not lines:
+                return self.seq
+            self._file.write(''.join(lines))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.pending += len(lines)
+            return self.seq
+
+    def rotate(self):
+        """
+        Cierra el journal activo, lo renombra como segmento y abre uno nuevo.
+        Retorna el último seq incluido en el segmento.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self.path.exists():
+                os.replace(self.path, self.path.with_name(f"{self.path.name}.{self.seq}"))
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self.pending = 0
+            return self.seq
+
+    def discard_segments(self, upto_seq):
+        """Borra los segmentos ya cubiertos por un snapshot."""
+        for segment in self._segments():
+            if int(segment.name.rsplit('.', 1)[1]) <= upto_seq:
+                segment.unlink(missing_ok=True)
+
+    def size(self):
+        """Bytes en disco del journal activo y los segmentos."""
+        size = 0
+        for path in self._segments() + [self.path]:
+            try:
+                size += path.stat().st_size
+            except FileNotFoundError:
+                pass
+        return size
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
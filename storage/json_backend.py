@@ -0,0 +1,487 @@
+import bisect
+import copy
+import heapq
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from .base import TOKEN_SORT_FIELDS, Storage
+from .hits import CompactHit
+from .journal import HitJournal
+from .stats import GLOBAL_STATS_KEY, HitStats, build_hit_stats, new_hit_stats
+
+
+class JsonStorage(Storage):
+    """
+    Backend legacy: todo en memoria, con snapshot en un archivo JSON
+    y un journal append-only para los hits y las altas y bajas de tokens.
+
+    Los hits se guardan agrupados por token, así el detalle y el borrado
+    de un token cuestan O(hits de ese token) y no O(todos los hits). En
+    memoria cada hit es un CompactHit (con 'compress_headers' los headers
+    quedan comprimidos); hacia afuera se devuelven dicts.
+
+    Todo acceso al estado en memoria pasa por 'self.lock'. Como el estado
+    vive en el proceso, este backend no se puede compartir entre workers.
+    """
+
+    def __init__(self, db_file, compact_every=10000, fsync=False, compress_headers=False):
+        self.db_file = Path(db_file)
+        self.compress_headers = compress_headers
+        self.journal = HitJournal(self.db_file.with_suffix('.journal'), fsync=fsync)
+        # Cada cuántas entradas del journal se compacta en un snapshot
+        self.compact_every = compact_every
+        self.tokens = {}
+        self.hits_by_token = {}  # token -> lista de CompactHit en orden de llegada
+        self.rollups = {}  # token -> rollup de los hits archivados
+        self.hit_stats = {}  # token -> HitStats, la clave '' son los globales
+        self.hit_count = 0
+        self.next_hit_id = 1
+        self._sorted_token_ids = None  # Cache para paginar tokens por ID
+        self.lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+        self._compaction_running = threading.Event()
+        # Costo de los snapshots (ver stats)
+        self.saves = 0
+        self.save_seconds = 0.0
+        self.save_bytes = 0
+        self.last_save_seconds = None
+        self.last_save_bytes = None
+
+    def _index_hit(self, hit_record):
+        # Los hits de DBs anteriores no tienen id, se numeran al cargarlos
+        if 'id' not in hit_record:
+            hit_record['id'] = self.next_hit_id
+        self.next_hit_id = max(self.next_hit_id, hit_record['id'] + 1)
+        hit = CompactHit.from_dict(hit_record, self.compress_headers)
+        self.hits_by_token.setdefault(hit.token, []).append(hit)
+        self.hit_count += 1
+
+    def _apply_hit(self, hit_record):
+        """Aplica un hit en memoria (usado por add_hit y por el replay)."""
+        token = hit_record['token']
+        if token not in self.tokens:
+            return False
+        self._index_hit(hit_record)
+        self.tokens[token]['hits'] += 1
+        self.tokens[token]['last_hit'] = hit_record['timestamp']
+        self._stats_for(token).add(hit_record)
+        self._stats_for(GLOBAL_STATS_KEY).add(hit_record)
+        return True
+
+    def _stats_for(self, token_id):
+        stats = self.hit_stats.get(token_id)
+        if stats is None:
+            stats = self.hit_stats[token_id] = new_hit_stats(token_id)
+        return stats
+
+    def _apply_repeat(self, repeat):
+        """Suma repeticiones a un hit (usado por add_hit_repeats y por el replay)."""
+        token = repeat['token']
+        if token not in self.tokens:
+            return
+        # Cada repetición es un acceso más del token, aunque no se guarde como hit aparte
+        token_record = self.tokens[token]
+        token_record['hits'] += repeat['count']
+        if not token_record['last_hit'] or repeat['last_seen'] > token_record['last_hit']:
+            token_record['last_hit'] = repeat['last_seen']
+        # Los agregados cuentan la repetición aunque el hit ya esté archivado
+        self._stats_for(token).add_repeats(repeat['count'], repeat['last_seen'])
+        self._stats_for(GLOBAL_STATS_KEY).add_repeats(repeat['count'], repeat['last_seen'])
+        hits = self.hits_by_token.get(token)
+        if not hits:
+            return
+        index = bisect.bisect_left(hits, repeat['id'], key=lambda hit: hit.id)
+        if index == len(hits) or hits[index].id != repeat['id']:
+            return
+        # Se reemplaza el hit en lugar de modificarlo: los snapshots en curso
+        # pueden tener referencias al anterior
+        hits[index] = hits[index].with_repeats(repeat['count'], repeat['last_seen'])
+
+    def _apply_archive(self, archive):
+        """Saca hits archivados (usado por archive_hits y por el replay)."""
+        for token, hit_ids in archive['ids'].items():
+            hits = self.hits_by_token.get(token)
+            if hits:
+                hit_ids = set(hit_ids)
+                kept = [hit for hit in hits if hit.id not in hit_ids]
+                self.hit_count -= len(hits) - len(kept)
+                self.hits_by_token[token] = kept
+        for token, rollup in archive['rollups'].items():
+            if token in self.tokens:
+                self.rollups[token] = rollup
+
+    def _apply_delete(self, token_id):
+        """Borra un token y sus hits (usado por delete_token y por el replay)."""
+        if token_id not in self.tokens:
+            return False
+        del self.tokens[token_id]
+        self._sorted_token_ids = None
+        self.hit_count -= len(self.hits_by_token.pop(token_id, ()))
+        self.rollups.pop(token_id, None)
+        self.hit_stats.pop(token_id, None)
+        return True
+
+    def _apply_delete_all(self):
+        """Vacía la DB (usado por delete_all y por el replay)."""
+        self.tokens.clear()
+        self._sorted_token_ids = None
+        self.hits_by_token.clear()
+        self.rollups.clear()
+        self.hit_stats.clear()
+        self.hit_count = 0
+
+    def load(self):
+        """
+        Carga el último snapshot y reaplica las operaciones del journal
+        posteriores a él.
+        """
+        snapshot_seq = 0
+        if self.db_file.exists():
+            with open(self.db_file, 'r') as f:
+                data = json.load(f)
+                self.tokens = data.get('tokens', {})
+                self.rollups = data.get('rollups', {})
+                for hit_record in data.get('hits', []):
+                    self._index_hit(hit_record)
+                snapshot_seq = data.get('journal_seq', 0)
+                # Los ids de hits borrados no se reutilizan (el cursor de export depende de eso)
+                self.next_hit_id = max(self.next_hit_id, data.get('next_hit_id', 1))
+            if 'stats' in data:
+                self.hit_stats = {token_id: HitStats.from_dict(stats) for token_id, stats in data['stats'].items()}
+            else:
+                # Snapshot anterior a los agregados: se calculan de los hits guardados
+                self.hit_stats = build_hit_stats(self._iter_hit_dicts())
+
+        for op, data in self.journal.replay(after_seq=snapshot_seq):
+            if op == 'token':
+                self.tokens[data['token']] = data
+            elif op == 'hit':
+                self._apply_hit(data)
+            elif op == 'repeat':
+                self._apply_repeat(data)
+            elif op == 'archive':
+                self._apply_archive(data)
+            elif op == 'delete':
+                self._apply_delete(data['token'])
+            elif op == 'delete_all':
+                self._apply_delete_all()
+
+        self._sorted_token_ids = None
+        self.journal.open()
+
+    def close(self):
+        self.journal.close()
+
+    def save(self):
+        """
+        Escribe un snapshot completo de la DB y descarta el journal ya incluido.
+        El snapshot se escribe en un temporal y se reemplaza de forma atómica.
+        """
+        with self._snapshot_lock:
+            started = time.perf_counter()
+            with self.lock:
+                snapshot_seq = self.journal.rotate()
+                tokens_snapshot = {token_id: record.copy() for token_id, record in self.tokens.items()}
+                rollups_snapshot = dict(self.rollups)
+                stats_snapshot = {token_id: stats.to_dict() for token_id, stats in self.hit_stats.items()}
+                hits_snapshot = [list(hits) for hits in self.hits_by_token.values()]
+                next_hit_id = self.next_hit_id
+
+            # Los hits se serializan de a uno para no armar la lista completa de dicts
+            tmp_file = self.db_file.with_name(self.db_file.name + ".tmp")
+            with open(tmp_file, 'w') as f:
+                f.write('{"tokens":')
+                json.dump(tokens_snapshot, f, separators=(',', ':'))
+                f.write(',"rollups":')
+                json.dump(rollups_snapshot, f, separators=(',', ':'))
+                f.write(',"stats":')
+                json.dump(stats_snapshot, f, separators=(',', ':'))
+                f.write(f',"journal_seq":{snapshot_seq},"next_hit_id":{next_hit_id},"hits":[')
+                first = True
+                for hits in hits_snapshot:
+                    for hit in hits:
+                        f.write(('' if first else ',') + json.dumps(hit.to_dict(), separators=(',', ':')))
+                        first = False
+                f.write(']}')
+                f.flush()
+                os.fsync(f.fileno())
+                written = f.tell()
+            os.replace(tmp_file, self.db_file)
+
+            self.journal.discard_segments(snapshot_seq)
+            elapsed = time.perf_counter() - started
+            self.saves += 1
+            self.save_seconds += elapsed
+            self.save_bytes += written
+            self.last_save_seconds = elapsed
+            self.last_save_bytes = written
+
+    def _compact_in_background(self):
+        try:
+            self.save()
+        finally:
+            self._compaction_running.clear()
+
+    def _maybe_compact(self):
+        """
+        Cuando el journal supera el umbral se compacta en un hilo aparte
+        para que el request no pague el snapshot.
+        """
+        if self.journal.pending >= self.compact_every and not self._compaction_running.is_set():
+            self._compaction_running.set()
+            threading.Thread(target=self._compact_in_background, daemon=True).start()
+
+    # --- Tokens ---
+
+    def has_token(self, token_id):
+        with self.lock:
+            return token_id in self.tokens
+
+    def get_token(self, token_id):
+        with self.lock:
+            record = self.tokens.get(token_id)
+            return record.copy() if record else None
+
+    def list_tokens(self):
+        with self.lock:
+            return [record.copy() for record in self.tokens.values()]
+
+    def count_tokens(self):
+        return len(self.tokens)
+
+    def query_tokens(self, after=None, limit=None, token_type=None):
+        with self.lock:
+            if self._sorted_token_ids is None:
+                self._sorted_token_ids = sorted(self.tokens)
+            token_ids = self._sorted_token_ids
+
+        start = bisect.bisect_right(token_ids, after) if after is not None else 0
+        returned = 0
+        for token_id in token_ids[start:] if start else token_ids:
+            if limit is not None and returned >= limit:
+                return
+            record = self.get_token(token_id)
+            if record is None or (token_type and record['type'] != token_type):
+                continue
+            returned += 1
+            yield record
+
+    def search_tokens(self, search=None, token_type=None, min_hits=None, sort='created_at', descending=True,
+                      offset=0, limit=50):
+        if sort not in TOKEN_SORT_FIELDS:
+            raise ValueError(f"Campo de orden no soportado: {sort}")
+        search = search.lower() if search else None
+
+        def sort_key(record):
+            # Los valores vacíos (ej: tokens sin hits) van primero de menor a mayor, como en SQLite
+            value = record[sort]
+            return (value is not None, value if value is not None else 0, record['token'])
+
+        with self.lock:
+            matches = [
+                record for record in self.tokens.values()
+                if (not token_type or record['type'] == token_type)
+                and (not min_hits or record['hits'] >= min_hits)
+                and (not search or search in record['token'] or search in (record['description'] or '').lower())
+            ]
+            matches.sort(key=sort_key, reverse=descending)
+            return [record.copy() for record in matches[offset:offset + limit]], len(matches)
+
+    def _merge_token(self, token_record):
+        record = self.tokens.get(token_record['token'])
+        if record is None:
+            record = self.tokens[token_record['token']] = token_record.copy()
+            self._sorted_token_ids = None
+        else:
+            # Los contadores solo los actualiza add_hit
+            record.update({key: value for key, value in token_record.items()
+                           if key not in ('hits', 'last_hit')})
+        return record
+
+    def save_token(self, token_record):
+        self.save_tokens([token_record])
+
+    def save_tokens(self, token_records):
+        with self.lock:
+            records = [self._merge_token(token_record) for token_record in token_records]
+            self.journal.append_many('token', records)
+        self._maybe_compact()
+
+    # Los borrados van al journal como las altas: el espacio de los hits
+    # borrados se recupera en el próximo snapshot
+
+    def delete_token(self, token_id):
+        with self.lock:
+            if not self._apply_delete(token_id):
+                return False
+            self.journal.append('delete', {'token': token_id})
+        self._maybe_compact()
+        return True
+
+    def delete_all(self):
+        with self.lock:
+            self._apply_delete_all()
+            self.journal.append('delete_all', {})
+        self._maybe_compact()
+
+    # --- Hits ---
+
+    def add_hit(self, hit_record):
+        return bool(self.add_hits([hit_record]))
+
+    def add_hits(self, hit_records):
+        accepted = []
+        with self.lock:
+            for hit_record in hit_records:
+                if hit_record['token'] not in self.tokens:
+                    continue
+                hit_record['id'] = self.next_hit_id
+                self._apply_hit(hit_record)
+                accepted.append(hit_record)
+            self.journal.append_many('hit', accepted)
+        self._maybe_compact()
+        return accepted
+
+    def add_hit_repeats(self, repeats):
+        entries = [
+            {'token': token, 'id': hit_id, 'count': count, 'last_seen': last_seen}
+            for token, hit_id, count, last_seen in repeats
+        ]
+        if not entries:
+            return
+        with self.lock:
+            for entry in entries:
+                self._apply_repeat(entry)
+            self.journal.append_many('repeat', entries)
+        self._maybe_compact()
+
+    def get_hits(self, token_id):
+        with self.lock:
+            hits = list(self.hits_by_token.get(token_id, ()))
+        return [hit.to_dict() for hit in hits]
+
+    def query_hits(self, token_id, after=None, limit=None, since=None, until=None, ip=None, user_agent=None):
+        with self.lock:
+            hits = self.hits_by_token.get(token_id, [])
+            start = bisect.bisect_right(hits, after, key=lambda hit: hit.id) if after is not None else 0
+            hits = hits[start:]
+
+        returned = 0
+        for hit in hits:
+            if limit is not None and returned >= limit:
+                return
+            if since and hit.timestamp < since:
+                continue
+            if until and hit.timestamp > until:
+                continue
+            if ip and hit.ip != ip:
+                continue
+            if user_agent and user_agent not in (hit.user_agent or ''):
+                continue
+            returned += 1
+            yield hit.to_dict()
+
+    def iter_hits(self, after=None, upto=None, since=None):
+        # Cada lista ya está ordenada, se intercalan por id
+        with self.lock:
+            hit_lists = []
+            for hits in self.hits_by_token.values():
+                start = bisect.bisect_right(hits, after, key=lambda hit: hit.id) if after is not None else 0
+                if start < len(hits):
+                    hit_lists.append(hits[start:])
+        for hit in heapq.merge(*hit_lists, key=lambda hit: hit.id):
+            if upto is not None and hit.id > upto:
+                return
+            if since and hit.timestamp < since:
+                continue
+            yield hit.to_dict()
+
+    def _iter_hit_dicts(self):
+        for hits in self.hits_by_token.values():
+            for hit in hits:
+                yield hit.to_dict()
+
+    def last_hit_id(self):
+        return self.next_hit_id - 1
+
+    def count_hits(self):
+        return self.hit_count
+
+    # --- Estadísticas ---
+
+    def get_hit_stats(self, token_id=None):
+        with self.lock:
+            stats = self.hit_stats.get(GLOBAL_STATS_KEY if token_id is None else token_id)
+            return stats.summary() if stats and stats.hits else None
+
+    def list_hit_stats(self):
+        with self.lock:
+            return {token_id: stats.to_dict() for token_id, stats in self.hit_stats.items()}
+
+    # --- Retención ---
+
+    def iter_expired_hits(self, before=None, keep_per_token=None):
+        expired = []
+        with self.lock:
+            for hits in self.hits_by_token.values():
+                # Las listas están ordenadas por id: los excedentes son los primeros
+                excess = len(hits) - keep_per_token if keep_per_token else 0
+                for index, hit in enumerate(hits):
+                    if index < excess or (before is not None and hit.timestamp < before):
+                        expired.append(hit)
+        for hit in expired:
+            yield hit.to_dict()
+
+    def archive_hits(self, ids_by_token, rollups):
+        archive = {'ids': ids_by_token, 'rollups': rollups}
+        with self.lock:
+            self._apply_archive(archive)
+            self.journal.append('archive', archive)
+        self._maybe_compact()
+
+    def get_rollup(self, token_id):
+        with self.lock:
+            rollup = self.rollups.get(token_id)
+            return copy.deepcopy(rollup) if rollup else None
+
+    def list_rollups(self):
+        with self.lock:
+            return copy.deepcopy(self.rollups)
+
+    def compact(self):
+        # El snapshot se reescribe sin los hits archivados
+        self.save()
+
+    # --- Métricas ---
+
+    def stats(self):
+        size = self.journal.size()
+        if self.db_file.exists():
+            size += self.db_file.stat().st_size
+        return {
+            'size_bytes': size,
+            'saves': self.saves,
+            'save_seconds': self.save_seconds,
+            'save_bytes': self.save_bytes,
+            'last_save_seconds': self.last_save_seconds,
+            'last_save_bytes': self.last_save_bytes,
+        }
+
+    # --- Migración ---
+
+    def bulk_import(self, tokens, hits, rollups=None, stats=None):
+        with self.lock:
+            for token_record in tokens:
+                self.tokens[token_record['token']] = dict(token_record)
+            for hit_record in hits:
+                self._index_hit(hit_record)
+            self.rollups.update(rollups or {})
+            if stats is not None:
+                self.hit_stats = {token_id: HitStats.from_dict(data) for token_id, data in stats.items()}
+            else:
+                self.hit_stats = build_hit_stats(self._iter_hit_dicts())
+            self._sorted_token_ids = None
+        self.save()
@@ -0,0 +1,133 @@
+import gzip
+import json
+import logging
+from itertools import islice
+from pathlib import Path
+
+from .hll import HyperLogLog
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def new_rollup():
+    return {
+        'archived_hits': 0,
+        'first_seen': None,
+        'last_seen': None,
+        'days': {},
+        'distinct_ips': 0,
+        'ips_hll': None,
+    }
+
+
+def rollup_ips(rollup):
+    """HyperLogLog con las IPs ya contadas en el rollup."""
+    return HyperLogLog.from_string(rollup['ips_hll']) if rollup['ips_hll'] else HyperLogLog()
+
+
+def add_to_rollup(rollup, hit_record, ips):
+    """
+    Suma un hit archivado al rollup de su token (contando sus repeticiones).
+    La IP se agrega a 'ips' (ver rollup_ips); al terminar hay que llamar a
+    finish_rollup para guardarlo en el rollup.
+    """
+    count = 1 + hit_record.get('repeats', 0)
+    timestamp = hit_record['timestamp']
+    last_seen = hit_record.get('last_seen') or timestamp
+    day = timestamp[:10]
+
+    rollup['archived_hits'] += count
+    rollup['days'][day] = rollup['days'].get(day, 0) + count
+    if rollup['first_seen'] is None or timestamp < rollup['first_seen']:
+        rollup['first_seen'] = timestamp
+    if rollup['last_seen'] is None or last_seen > rollup['last_seen']:
+        rollup['last_seen'] = last_seen
+    ips.add(hit_record.get('ip'))
+
+
+def finish_rollup(rollup, ips):
+    rollup['ips_hll'] = ips.to_string()
+    rollup['distinct_ips'] = ips.count()
+
+
+def public_rollup(rollup):
+    """El rollup como se expone en la API (sin el estado interno del HyperLogLog)."""
+    return {key: value for key, value in rollup.items() if key != 'ips_hll'}
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class HitArchiver:
+    """
+    Aplica la política de retención: los hits más viejos que 'before' o
+    que exceden los 'keep_per_token' más recientes de su token se mueven a
+    archivos diarios '<archive_dir>/hits-YYYY-MM-DD.ndjson.gz' y en el
+    storage quedan solo los rollups por token (hits por día, IPs distintas,
+    primer y último hit).
+
+    Los hits se escriben al archivo antes de borrarlos del storage: un corte
+    en el medio puede duplicar hits en el archivo, pero no perderlos. Un
+    lock de archivo evita que dos procesos archiven a la vez.
+    """
+
+    def __init__(self, storage, archive_dir, batch_size=10000):
+        self.storage = storage
+        self.archive_dir = Path(archive_dir)
+        self.batch_size = batch_size
+
+    def _write_archive(self, hits):
+        by_day = {}
+        for hit_record in hits:
+            by_day.setdefault(hit_record['timestamp'][:10], []).append(hit_record)
+        for day, day_hits in by_day.items():
+            # gzip admite agregar miembros al final; el archivo se lee como uno solo
+            with gzip.open(self.archive_dir / f"hits-{day}.ndjson.gz", 'at', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(hit_record, ensure_ascii=False) + '\n' for hit_record in day_hits))
+
+    def _archive_batch(self, hits):
+        self._write_archive(hits)
+        ids_by_token = {}
+        rollups = {}
+        ips_by_token = {}
+        for hit_record in hits:
+            token = hit_record['token']
+            ids_by_token.setdefault(token, []).append(hit_record['id'])
+            if token not in rollups:
+                rollups[token] = self.storage.get_rollup(token) or new_rollup()
+                ips_by_token[token] = rollup_ips(rollups[token])
+            add_to_rollup(rollups[token], hit_record, ips_by_token[token])
+        for token, rollup in rollups.items():
+            finish_rollup(rollup, ips_by_token[token])
+        self.storage.archive_hits(ids_by_token, rollups)
+
+    def run(self, before=None, keep_per_token=None):
+        """Archiva los hits vencidos. Retorna cuántos se archivaron."""
+        if before is None and not keep_per_token:
+            return 0
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+
+        with open(self.archive_dir / ".lock", 'w') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    logger.info("Otro proceso está archivando hits, se saltea esta pasada")
+                    return 0
+
+            archived = 0
+            expired = self.storage.iter_expired_hits(before=before, keep_per_token=keep_per_token)
+            for hits in _chunks(expired, self.batch_size):
+                self._archive_batch(hits)
+                archived += len(hits)
+            if archived:
+                self.storage.compact()
+            return archived
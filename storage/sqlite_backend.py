@@ -0,0 +1,564 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .base import TOKEN_SORT_FIELDS, Storage
+from .bloom import BloomFilter
+from .hits import compress_headers, decompress_headers
+from .stats import GLOBAL_STATS_KEY, HitStats, build_hit_stats, new_hit_stats
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    token       TEXT PRIMARY KEY,
+    type        TEXT NOT NULL,
+    description TEXT,
+    created_at  TEXT,
+    hits        INTEGER NOT NULL DEFAULT 0,
+    last_hit    TEXT
+);
+CREATE TABLE IF NOT EXISTS hits (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    token       TEXT NOT NULL,
+    timestamp   TEXT NOT NULL,
+    ip          TEXT,
+    user_agent  TEXT,
+    headers     TEXT,
+    repeats     INTEGER NOT NULL DEFAULT 0,
+    last_seen   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tokens_created_at ON tokens(created_at);
+CREATE INDEX IF NOT EXISTS idx_hits_token ON hits(token, id);
+CREATE INDEX IF NOT EXISTS idx_hits_timestamp ON hits(timestamp);
+CREATE INDEX IF NOT EXISTS idx_hits_ip ON hits(ip);
+CREATE TABLE IF NOT EXISTS token_log (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    token       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    token       TEXT PRIMARY KEY,
+    data        TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hit_stats (
+    token       TEXT PRIMARY KEY,
+    data        TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS trg_tokens_log AFTER INSERT ON tokens
+BEGIN
+    INSERT INTO token_log (token) VALUES (NEW.token);
+END;
+"""
+
+TOKEN_COLUMNS = ('token', 'type', 'description', 'created_at', 'hits', 'last_hit')
+
+# Columnas agregadas después de la primera versión del esquema
+HIT_MIGRATIONS = {
+    'repeats': "ALTER TABLE hits ADD COLUMN repeats INTEGER NOT NULL DEFAULT 0",
+    'last_seen': "ALTER TABLE hits ADD COLUMN last_seen TEXT",
+}
+
+# Máximo de parámetros por consulta al leer agregados con IN (...)
+STATS_QUERY_CHUNK = 500
+
+
+def _token_from_row(row):
+    return {column: row[column] for column in TOKEN_COLUMNS}
+
+
+def _headers_from_column(value):
+    # Con compress_headers la columna guarda un blob zlib en lugar de JSON
+    if not value:
+        return {}
+    if isinstance(value, bytes):
+        return decompress_headers(value)
+    return json.loads(value)
+
+
+def _hit_from_row(row):
+    hit = {
+        'id': row['id'],
+        'token': row['token'],
+        'timestamp': row['timestamp'],
+        'ip': row['ip'],
+        'user_agent': row['user_agent'],
+        'headers': _headers_from_column(row['headers'])
+    }
+    if row['repeats']:
+        hit['repeats'] = row['repeats']
+        hit['last_seen'] = row['last_seen']
+    return hit
+
+
+class SqliteStorage(Storage):
+    """
+    Backend SQLite en modo WAL. No carga el historial en memoria: cada
+    consulta va a la DB usando los índices por token, timestamp e IP.
+    Cada hilo usa su propia conexión; se cierra con release_thread o,
+    si el hilo terminó sin llamarlo, al abrir la próxima conexión.
+
+    Con 'token_filter_capacity' > 0 se mantiene un filtro de Bloom con los
+    tokens, así has_token descarta los tokens inexistentes sin consultar la
+    DB. Los tokens nuevos (también los creados por otros procesos) se leen
+    de la tabla token_log, como mucho cada 'token_filter_refresh' segundos.
+
+    Con 'compress_headers' los headers de los hits nuevos se guardan como
+    un blob zlib (se leen igual los guardados como JSON).
+    """
+
+    def __init__(self, db_file, token_filter_capacity=0, token_filter_refresh=1.0, compress_headers=False):
+        self.db_file = Path(db_file)
+        self.compress_headers = compress_headers
+        self._local = threading.local()
+        self._connections = {}  # hilo -> conexión
+        self._connections_lock = threading.Lock()
+        self.token_filter_capacity = token_filter_capacity
+        self.token_filter_refresh = token_filter_refresh
+        self._token_filter = None
+        self._token_filter_seq = 0
+        self._token_filter_synced = 0.0
+        self._token_filter_lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                # Con un hilo por request, los hilos terminados dejan su conexión abierta
+                for thread in [thread for thread in self._connections if not thread.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def release_thread(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._connections_lock:
+            self._connections.pop(threading.current_thread(), None)
+        conn.close()
+
+    def load(self):
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(hits)")}
+        for column, statement in HIT_MIGRATIONS.items():
+            if column not in columns:
+                conn.execute(statement)
+        conn.commit()
+        self._build_missing_stats()
+        if self.token_filter_capacity > 0:
+            self._reset_token_filter()
+
+    def _build_missing_stats(self):
+        """DBs anteriores a los agregados: se calculan una vez de los hits guardados."""
+        conn = self._conn()
+        with conn:
+            # IMMEDIATE: si arrancan varios workers juntos, solo uno los calcula
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM hit_stats LIMIT 1").fetchone():
+                return
+            if not conn.execute("SELECT 1 FROM hits LIMIT 1").fetchone():
+                return
+            self._rebuild_stats(conn)
+
+    def _rebuild_stats(self, conn):
+        conn.execute("DELETE FROM hit_stats")
+        rows = conn.execute("SELECT * FROM hits ORDER BY id")
+        self._save_stats(conn, build_hit_stats(_hit_from_row(row) for row in rows))
+
+    def _save_stats(self, conn, stats):
+        conn.executemany(
+            "INSERT INTO hit_stats (token, data) VALUES (?, ?) ON CONFLICT(token) DO UPDATE SET data = excluded.data",
+            ((token_id, json.dumps(token_stats.to_dict(), separators=(',', ':'))) for token_id, token_stats in stats.items())
+        )
+
+    def _update_stats(self, conn, hits=(), repeats=()):
+        """
+        Suma hits y repeticiones a los agregados, dentro de la transacción
+        que los guarda (ya tiene el lock de escritura, así que otro proceso
+        no puede pisar la lectura y escritura de las filas).
+        """
+        token_ids = list({hit_record['token'] for hit_record in hits} | {repeat[0] for repeat in repeats}
+                         | {GLOBAL_STATS_KEY})
+        stats = {}
+        for start in range(0, len(token_ids), STATS_QUERY_CHUNK):
+            chunk = token_ids[start:start + STATS_QUERY_CHUNK]
+            rows = conn.execute(
+                f"SELECT token, data FROM hit_stats WHERE token IN ({','.join('?' * len(chunk))})", chunk
+            )
+            for row in rows:
+                stats[row['token']] = HitStats.from_dict(json.loads(row['data']))
+        if GLOBAL_STATS_KEY not in stats:
+            stats[GLOBAL_STATS_KEY] = new_hit_stats(GLOBAL_STATS_KEY)
+
+        for hit_record in hits:
+            token_id = hit_record['token']
+            if token_id not in stats:
+                stats[token_id] = new_hit_stats(token_id)
+            stats[token_id].add(hit_record)
+            stats[GLOBAL_STATS_KEY].add(hit_record)
+        for token_id, hit_id, count, last_seen in repeats:
+            # Sin fila el token no existe (o nunca tuvo hits): no hay qué sumar.
+            # Se cuentan aunque el hit ya esté archivado
+            if token_id in stats and token_id != GLOBAL_STATS_KEY:
+                stats[token_id].add_repeats(count, last_seen)
+                stats[GLOBAL_STATS_KEY].add_repeats(count, last_seen)
+        self._save_stats(conn, stats)
+
+    def _reset_token_filter(self):
+        """Arma el filtro con todos los tokens y la posición actual de token_log."""
+        conn = self._conn()
+        token_filter = BloomFilter(self.token_filter_capacity)
+        with self._token_filter_lock:
+            # Ambas lecturas en la misma transacción ven el mismo estado
+            with conn:
+                conn.execute("BEGIN")
+                for (token_id,) in conn.execute("SELECT token FROM tokens"):
+                    token_filter.add(token_id)
+                seq = conn.execute("SELECT COALESCE(MAX(id), 0) FROM token_log").fetchone()[0]
+            self._token_filter = token_filter
+            self._token_filter_seq = seq
+            self._token_filter_synced = time.monotonic()
+
+    def _sync_token_filter(self):
+        """Agrega al filtro los tokens creados desde la última lectura."""
+        conn = self._conn()
+        with self._token_filter_lock:
+            rows = conn.execute(
+                "SELECT id, token FROM token_log WHERE id > ? ORDER BY id", (self._token_filter_seq,)
+            ).fetchall()
+            for seq, token_id in rows:
+                self._token_filter.add(token_id)
+                self._token_filter_seq = seq
+            self._token_filter_synced = time.monotonic()
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    # --- Tokens ---
+
+    def has_token(self, token_id):
+        if self._token_filter is not None and token_id not in self._token_filter:
+            if time.monotonic() - self._token_filter_synced < self.token_filter_refresh:
+                return False
+            self._sync_token_filter()
+            if token_id not in self._token_filter:
+                return False
+        row = self._conn().execute("SELECT 1 FROM tokens WHERE token = ?", (token_id,)).fetchone()
+        return row is not None
+
+    def get_token(self, token_id):
+        row = self._conn().execute("SELECT * FROM tokens WHERE token = ?", (token_id,)).fetchone()
+        return _token_from_row(row) if row else None
+
+    def list_tokens(self):
+        rows = self._conn().execute("SELECT * FROM tokens ORDER BY created_at")
+        return [_token_from_row(row) for row in rows]
+
+    def count_tokens(self):
+        return self._conn().execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+
+    def query_tokens(self, after=None, limit=None, token_type=None):
+        clauses, params = [], []
+        if after is not None:
+            clauses.append("token > ?")
+            params.append(after)
+        if token_type:
+            clauses.append("type = ?")
+            params.append(token_type)
+        sql = "SELECT * FROM tokens"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY token"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        for row in self._conn().execute(sql, params):
+            yield _token_from_row(row)
+
+    def search_tokens(self, search=None, token_type=None, min_hits=None, sort='created_at', descending=True,
+                      offset=0, limit=50):
+        if sort not in TOKEN_SORT_FIELDS:
+            raise ValueError(f"Campo de orden no soportado: {sort}")
+        clauses, params = [], []
+        if search:
+            clauses.append("(instr(token, ?) > 0 OR instr(lower(description), ?) > 0)")
+            params.extend([search.lower(), search.lower()])
+        if token_type:
+            clauses.append("type = ?")
+            params.append(token_type)
+        if min_hits:
+            clauses.append("hits >= ?")
+            params.append(min_hits)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        direction = "DESC" if descending else "ASC"
+
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM tokens{where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM tokens{where} ORDER BY {sort} {direction}, token {direction} LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        )
+        return [_token_from_row(row) for row in rows], total
+
+    def save_token(self, token_record):
+        self.save_tokens([token_record])
+
+    def save_tokens(self, token_records):
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO tokens (token, type, description, created_at, hits, last_hit) "
+                "VALUES (:token, :type, :description, :created_at, :hits, :last_hit) "
+                "ON CONFLICT(token) DO UPDATE SET type = excluded.type, description = excluded.description",
+                ({column: token_record.get(column) for column in TOKEN_COLUMNS} for token_record in token_records)
+            )
+        if self._token_filter is not None:
+            with self._token_filter_lock:
+                for token_record in token_records:
+                    self._token_filter.add(token_record['token'])
+
+    def delete_token(self, token_id):
+        conn = self._conn()
+        with conn:
+            deleted = conn.execute("DELETE FROM tokens WHERE token = ?", (token_id,)).rowcount
+            if deleted:
+                conn.execute("DELETE FROM hits WHERE token = ?", (token_id,))
+                conn.execute("DELETE FROM rollups WHERE token = ?", (token_id,))
+                conn.execute("DELETE FROM hit_stats WHERE token = ?", (token_id,))
+        return bool(deleted)
+
+    def delete_all(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM hits")
+            conn.execute("DELETE FROM rollups")
+            conn.execute("DELETE FROM hit_stats")
+            conn.execute("DELETE FROM tokens")
+            conn.execute("DELETE FROM token_log")
+        if self._token_filter is not None:
+            self._reset_token_filter()
+
+    # --- Hits ---
+
+    def add_hit(self, hit_record):
+        return bool(self.add_hits([hit_record]))
+
+    def _headers_column(self, headers):
+        if self.compress_headers:
+            return compress_headers(headers or {})
+        return json.dumps(headers or {})
+
+    def add_hits(self, hit_records):
+        accepted = []
+        conn = self._conn()
+        with conn:
+            for hit_record in hit_records:
+                updated = conn.execute(
+                    "UPDATE tokens SET hits = hits + 1, last_hit = ? WHERE token = ?",
+                    (hit_record['timestamp'], hit_record['token'])
+                ).rowcount
+                if not updated:
+                    continue
+                hit_record['id'] = conn.execute(
+                    "INSERT INTO hits (token, timestamp, ip, user_agent, headers) VALUES (?, ?, ?, ?, ?)",
+                    (hit_record['token'], hit_record['timestamp'], hit_record['ip'],
+                     hit_record['user_agent'], self._headers_column(hit_record.get('headers')))
+                ).lastrowid
+                accepted.append(hit_record)
+            if accepted:
+                self._update_stats(conn, hits=accepted)
+        return accepted
+
+    def add_hit_repeats(self, repeats):
+        if not repeats:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "UPDATE hits SET repeats = repeats + ?, last_seen = ? WHERE id = ? AND token = ?",
+                ((count, last_seen, hit_id, token) for token, hit_id, count, last_seen in repeats)
+            )
+            # Cada repetición es un acceso más del token, aunque no se guarde como hit aparte
+            conn.executemany(
+                "UPDATE tokens SET hits = hits + ?, last_hit = MAX(COALESCE(last_hit, ''), ?) WHERE token = ?",
+                ((count, last_seen, token) for token, hit_id, count, last_seen in repeats)
+            )
+            self._update_stats(conn, repeats=repeats)
+
+    def get_hits(self, token_id):
+        rows = self._conn().execute("SELECT * FROM hits WHERE token = ? ORDER BY id", (token_id,))
+        return [_hit_from_row(row) for row in rows]
+
+    def query_hits(self, token_id, after=None, limit=None, since=None, until=None, ip=None, user_agent=None):
+        clauses, params = ["token = ?"], [token_id]
+        if after is not None:
+            clauses.append("id > ?")
+            params.append(after)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp <= ?")
+            params.append(until)
+        if ip:
+            clauses.append("ip = ?")
+            params.append(ip)
+        if user_agent:
+            clauses.append("instr(user_agent, ?) > 0")
+            params.append(user_agent)
+        sql = f"SELECT * FROM hits WHERE {' AND '.join(clauses)} ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        for row in self._conn().execute(sql, params):
+            yield _hit_from_row(row)
+
+    def iter_hits(self, after=None, upto=None, since=None, page_size=1000):
+        # Se lee de a páginas para no mantener abierta una transacción de
+        # lectura mientras el llamador consume (ej: un export lento)
+        clauses, params = ["id > ?"], [after or 0]
+        if upto is not None:
+            clauses.append("id <= ?")
+            params.append(upto)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        sql = f"SELECT * FROM hits WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?"
+        conn = self._conn()
+        while True:
+            rows = conn.execute(sql, params + [page_size]).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _hit_from_row(row)
+            params[0] = rows[-1]['id']
+
+    def last_hit_id(self):
+        # Con AUTOINCREMENT los ids no se reutilizan aunque se borren hits
+        row = self._conn().execute("SELECT seq FROM sqlite_sequence WHERE name = 'hits'").fetchone()
+        return row[0] if row else 0
+
+    def count_hits(self):
+        return self._conn().execute("SELECT COUNT(*) FROM hits").fetchone()[0]
+
+    # --- Retención ---
+
+    def iter_expired_hits(self, before=None, keep_per_token=None, page_size=1000):
+        # Se lee de a páginas completas: el archivador borra hits entre página y página
+        conn = self._conn()
+        if before is not None:
+            last_id = 0
+            while True:
+                rows = conn.execute(
+                    "SELECT * FROM hits WHERE timestamp < ? AND id > ? ORDER BY id LIMIT ?",
+                    (before, last_id, page_size)
+                ).fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    yield _hit_from_row(row)
+                last_id = rows[-1]['id']
+
+        if keep_per_token:
+            clauses, params = [], []
+            if before is not None:
+                # Los anteriores a 'before' ya se recorrieron arriba
+                clauses.append("timestamp >= ?")
+                params.append(before)
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            over_limit = conn.execute(
+                f"SELECT token, COUNT(*) AS total FROM hits{where} GROUP BY token HAVING total > ?",
+                params + [keep_per_token]
+            ).fetchall()
+            for token_id, total in over_limit:
+                rows = conn.execute(
+                    f"SELECT * FROM hits WHERE {' AND '.join(['token = ?'] + clauses)} ORDER BY id LIMIT ?",
+                    [token_id] + params + [total - keep_per_token]
+                ).fetchall()
+                for row in rows:
+                    yield _hit_from_row(row)
+
+    def archive_hits(self, ids_by_token, rollups):
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "DELETE FROM hits WHERE id = ? AND token = ?",
+                ((hit_id, token) for token, hit_ids in ids_by_token.items() for hit_id in hit_ids)
+            )
+            conn.executemany(
+                "INSERT INTO rollups (token, data) SELECT ?, ? WHERE EXISTS (SELECT 1 FROM tokens WHERE token = ?) "
+                "ON CONFLICT(token) DO UPDATE SET data = excluded.data",
+                ((token, json.dumps(rollup), token) for token, rollup in rollups.items())
+            )
+
+    def get_rollup(self, token_id):
+        row = self._conn().execute("SELECT data FROM rollups WHERE token = ?", (token_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def list_rollups(self):
+        rows = self._conn().execute("SELECT token, data FROM rollups")
+        return {row['token']: json.loads(row['data']) for row in rows}
+
+    # --- Estadísticas ---
+
+    def get_hit_stats(self, token_id=None):
+        row = self._conn().execute(
+            "SELECT data FROM hit_stats WHERE token = ?", (GLOBAL_STATS_KEY if token_id is None else token_id,)
+        ).fetchone()
+        if not row:
+            return None
+        stats = HitStats.from_dict(json.loads(row['data']))
+        return stats.summary() if stats.hits else None
+
+    def list_hit_stats(self):
+        rows = self._conn().execute("SELECT token, data FROM hit_stats")
+        return {row['token']: json.loads(row['data']) for row in rows}
+
+    # --- Métricas ---
+
+    def stats(self):
+        size = 0
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                size += self.db_file.with_name(self.db_file.name + suffix).stat().st_size
+            except FileNotFoundError:
+                pass
+        return {'size_bytes': size}
+
+    # --- Migración ---
+
+    def bulk_import(self, tokens, hits, rollups=None, stats=None):
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO tokens (token, type, description, created_at, hits, last_hit) "
+                "VALUES (:token, :type, :description, :created_at, :hits, :last_hit)",
+                ({column: record.get(column) for column in TOKEN_COLUMNS} for record in tokens)
+            )
+            conn.executemany(
+                "INSERT INTO hits (id, token, timestamp, ip, user_agent, headers, repeats, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((hit.get('id'), hit['token'], hit['timestamp'], hit.get('ip'), hit.get('user_agent'),
+                  self._headers_column(hit.get('headers')), hit.get('repeats', 0), hit.get('last_seen')) for hit in hits)
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO rollups (token, data) VALUES (?, ?)",
+                ((token, json.dumps(rollup)) for token, rollup in (rollups or {}).items())
+            )
+            if stats is not None:
+                self._save_stats(conn, {token_id: HitStats.from_dict(data) for token_id, data in stats.items()})
+            else:
+                self._rebuild_stats(conn)
+        if self._token_filter is not None:
+            self._sync_token_filter()
@@ -0,0 +1,137 @@
+from .hll import HyperLogLog
+
+# Ventanas de los histogramas (las más viejas se descartan) y user agents del top
+STATS_HOURS = 168
+STATS_DAYS = 90
+TOP_USER_AGENTS = 10
+# El top se calcula con Space-Saving sobre el doble de candidatos
+USER_AGENT_SLOTS = 2 * TOP_USER_AGENTS
+
+# Precisión del HyperLogLog de IPs: por token alcanza con 256 registros
+# (~6.5% de error); el global usa 4096 (~1.6%)
+TOKEN_HLL_PRECISION = 8
+GLOBAL_HLL_PRECISION = 12
+
+# Clave de los agregados globales (todos los tokens) en list_hit_stats
+GLOBAL_STATS_KEY = ''
+
+
+def _trim(buckets, keep):
+    if len(buckets) > keep:
+        for key in sorted(buckets)[:len(buckets) - keep]:
+            del buckets[key]
+
+
+class HitStats:
+    """
+    Agregados de los hits de un token (o de todos) que se actualizan con
+    cada hit, para responder estadísticas sin recorrer el historial:
+    contadores, primer y último hit, IPs distintas (HyperLogLog), hits por
+    hora y por día (últimas STATS_HOURS horas / STATS_DAYS días) y los user
+    agents más frecuentes (Space-Saving: los conteos del top son exactos
+    mientras haya menos de USER_AGENT_SLOTS user agents distintos y
+    aproximados por exceso después).
+
+    Las repeticiones de hits agrupados (ver Storage.add_hit_repeats) suman
+    en 'repeats' y en los histogramas, no en las IPs ni en los user agents.
+    """
+
+    __slots__ = ('hits', 'repeats', 'first_seen', 'last_seen', 'ips', 'hourly', 'daily', 'user_agents')
+
+    def __init__(self, precision=TOKEN_HLL_PRECISION):
+        self.hits = 0
+        self.repeats = 0
+        self.first_seen = None
+        self.last_seen = None
+        self.ips = HyperLogLog(precision)
+        self.hourly = {}
+        self.daily = {}
+        self.user_agents = {}
+
+    def _count_time(self, timestamp, count):
+        hour = timestamp[:13]
+        day = timestamp[:10]
+        self.hourly[hour] = self.hourly.get(hour, 0) + count
+        self.daily[day] = self.daily.get(day, 0) + count
+        _trim(self.hourly, STATS_HOURS)
+        _trim(self.daily, STATS_DAYS)
+        if self.first_seen is None or timestamp < self.first_seen:
+            self.first_seen = timestamp
+        if self.last_seen is None or timestamp > self.last_seen:
+            self.last_seen = timestamp
+
+    def add(self, hit_record):
+        self.hits += 1
+        self._count_time(hit_record['timestamp'], 1)
+        self.ips.add(hit_record.get('ip'))
+
+        user_agent = hit_record.get('user_agent') or ''
+        user_agents = self.user_agents
+        if user_agent in user_agents or len(user_agents) < USER_AGENT_SLOTS:
+            user_agents[user_agent] = user_agents.get(user_agent, 0) + 1
+        else:
+            # Space-Saving: el nuevo reemplaza al de menor conteo y hereda su conteo
+            evicted = min(user_agents, key=user_agents.get)
+            user_agents[user_agent] = user_agents.pop(evicted) + 1
+
+    def add_repeats(self, count, last_seen):
+        self.repeats += count
+        self._count_time(last_seen, count)
+
+    def to_dict(self):
+        # Copias: el snapshot se serializa fuera del lock
+        return {
+            'hits': self.hits,
+            'repeats': self.repeats,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'ips_hll': self.ips.to_string(),
+            'hourly': dict(self.hourly),
+            'daily': dict(self.daily),
+            'user_agents': dict(self.user_agents),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls.__new__(cls)
+        stats.hits = data['hits']
+        stats.repeats = data['repeats']
+        stats.first_seen = data['first_seen']
+        stats.last_seen = data['last_seen']
+        stats.ips = HyperLogLog.from_string(data['ips_hll'])
+        stats.hourly = data['hourly']
+        stats.daily = data['daily']
+        stats.user_agents = data['user_agents']
+        return stats
+
+    def summary(self):
+        """Las estadísticas con el formato de la API."""
+        top = sorted(self.user_agents.items(), key=lambda item: item[1], reverse=True)[:TOP_USER_AGENTS]
+        return {
+            'hits': self.hits,
+            'repeats': self.repeats,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'distinct_ips': self.ips.count() if self.hits else 0,
+            'hits_per_hour': dict(sorted(self.hourly.items())),
+            'hits_per_day': dict(sorted(self.daily.items())),
+            'top_user_agents': [{'user_agent': user_agent, 'hits': count} for user_agent, count in top],
+        }
+
+
+def new_hit_stats(token_id):
+    return HitStats(GLOBAL_HLL_PRECISION if token_id == GLOBAL_STATS_KEY else TOKEN_HLL_PRECISION)
+
+
+def build_hit_stats(hits):
+    """Calcula desde cero los agregados por token y globales de los hits dados."""
+    stats = {GLOBAL_STATS_KEY: new_hit_stats(GLOBAL_STATS_KEY)}
+    for hit_record in hits:
+        token_id = hit_record['token']
+        if token_id not in stats:
+            stats[token_id] = new_hit_stats(token_id)
+        for key in (token_id, GLOBAL_STATS_KEY):
+            stats[key].add(hit_record)
+            if hit_record.get('repeats'):
+                stats[key].add_repeats(hit_record['repeats'], hit_record['last_seen'])
+    return stats
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class HitDeduplicator:
+    """
+    Ventana de deduplicación de hits por (token, IP, user-agent).
+
+    El primer hit de cada clave se guarda completo; los que llegan con la
+    misma clave durante los 'window' segundos siguientes solo suman un
+    contador ('repeats') sobre ese hit. Las claves viven en un LRU acotado
+    a 'max_entries', ordenado por vencimiento.
+
+    Uso desde el escritor:
+        nuevos = dedup.filter(lote)          # descarta los repetidos
+        aceptados = db.add_hits(nuevos)
+        dedup.remember(aceptados)            # asocia cada clave a su hit id
+        db.add_hit_repeats(dedup.drain())    # vuelca los contadores
+    """
+
+    def __init__(self, window=60, max_entries=100000):
+        self.window = window
+        self.max_entries = max_entries
+        # clave -> [vence, hit id, repetidos sin volcar, último timestamp]
+        self._entries = OrderedDict()
+        self._dirty = set()
+        self._evicted = []
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    @staticmethod
+    def key(hit_record):
+        return (hit_record['token'], hit_record['ip'], hit_record['user_agent'])
+
+    def _expire(self, now):
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if entry[0] > now and len(entries) <= self.max_entries:
+                return
+            entries.popitem(last=False)
+            self._dirty.discard(key)
+            if entry[1] is not None and entry[2]:
+                self._evicted.append((key[0], entry[1], entry[2], entry[3]))
+
+    def filter(self, hit_records):
+        """Retorna los hits a guardar; los repetidos quedan contados en su clave."""
+        now = time.monotonic()
+        new_hits = []
+        with self._lock:
+            self._expire(now)
+            for hit_record in hit_records:
+                key = self.key(hit_record)
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    entry[2] += 1
+                    entry[3] = hit_record['timestamp']
+                    self._dirty.add(key)
+                    self.suppressed += 1
+                    continue
+                self._entries[key] = [now + self.window, None, 0, None]
+                self._entries.move_to_end(key)
+                new_hits.append(hit_record)
+            self._expire(now)
+        return new_hits
+
+    def remember(self, hit_records):
+        """Asocia las claves a los ids que el storage asignó a sus hits."""
+        with self._lock:
+            for hit_record in hit_records:
+                entry = self._entries.get(self.key(hit_record))
+                if entry is not None and entry[1] is None:
+                    entry[1] = hit_record['id']
+
+    def drain(self):
+        """
+        Retorna y resetea los contadores pendientes como una lista de
+        (token, hit id, repetidos, último timestamp).
+        """
+        with self._lock:
+            repeats, self._evicted = self._evicted, []
+            for key in list(self._dirty):
+                entry = self._entries[key]
+                # Si el hit original todavía no tiene id se vuelca más adelante
+                if entry[1] is None:
+                    continue
+                repeats.append((key[0], entry[1], entry[2], entry[3]))
+                entry[2] = 0
+                self._dirty.discard(key)
+            return repeats
+
+    def stats(self):
+        with self._lock:
+            return {
+                'window': self.window,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'suppressed': self.suppressed,
+            }
+
+
+class TokenBucket:
+    """
+    Rate limiter de tipo token bucket: permite ráfagas de hasta 'burst'
+    eventos y en promedio 'rate' por segundo.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.allowed += 1
+                return True
+            self.limited += 1
+            return False
+
+    def stats(self):
+        with self._lock:
+            return {'rate': self.rate, 'burst': self.burst, 'allowed': self.allowed, 'limited': self.limited}
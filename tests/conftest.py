@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Los módulos del servidor se importan desde la raíz del repo (no es un paquete instalable)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+API_KEY = 'test-api-key'
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """
+    tokensnare_server con una DB json vacía en tmp_path y la API key de test.
+    Sin cola de ingesta: los hits se guardan en el mismo request, así
+    ninguno llega a la DB por defecto después del test.
+    """
+    import tokensnare_server
+
+    monkeypatch.setattr(tokensnare_server, 'API_KEY', API_KEY)
+    monkeypatch.setattr(tokensnare_server, 'ingest_queue', None)
+    monkeypatch.setattr(tokensnare_server, 'db', tokensnare_server.build_storage('json', str(tmp_path / 'db.json')))
+    tokensnare_server.load_database()
+    tokensnare_server.dashboard_cache.invalidate()
+    yield tokensnare_server
+    tokensnare_server.db.close()
+
+
+@pytest.fixture
+def api_headers():
+    return {'Authorization': f"Bearer {API_KEY}"}
@@ -0,0 +1,336 @@
+import json
+import socket
+import socketserver
+import threading
+import time
+from types import SimpleNamespace
+from email import message_from_bytes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from alerts import AlertDispatcher, AlertSink, DeadLetterFile, SinkWorker, SmtpSink, SyslogSink, WebhookSink
+
+
+def make_event(index=0, token='abc123'):
+    return {'id': index, 'token': token, 'type': 'pdf', 'description': 'informe', 'ip': '10.0.0.1',
+            'user_agent': 'test', 'timestamp': '2024-01-01T00:00:00-03:00'}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def read_dead_letter(path):
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+# --- Servidores locales que hacen de destino ---
+
+@pytest.fixture
+def webhook_server():
+    """Servidor HTTP local. 'statuses' fija las respuestas de los próximos POST (después, 200)."""
+    received = []
+    statuses = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            status = statuses.pop(0) if statuses else 200
+            if status == 200:
+                received.append(json.loads(body))
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/hook"
+    server.received = received
+    server.statuses = statuses
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class SmtpStubHandler(socketserver.StreamRequestHandler):
+    """Lo justo de SMTP para que smtplib entregue un mail: EHLO, MAIL, RCPT, DATA y QUIT."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 stub ESMTP')
+        envelope = {'from': None, 'to': []}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 stub')
+            elif verb == 'MAIL':
+                envelope['from'] = command.split(':', 1)[1].strip(' <>')
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(command.split(':', 1)[1].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b'.\r\n', b''):
+                        break
+                    data.append(data_line)
+                self.server.messages.append((envelope['from'], list(envelope['to']), b''.join(data)))
+                envelope = {'from': None, 'to': []}
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SmtpStubHandler)
+    server.daemon_threads = True
+    server.messages = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def udp_listener():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(5)
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def tcp_listener():
+    """Listener TCP que acumula todo lo recibido en 'data'."""
+    server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_sock.bind(('127.0.0.1', 0))
+    server_sock.listen()
+    received = bytearray()
+
+    def accept():
+        try:
+            conn, _ = server_sock.accept()
+        except OSError:
+            return
+        with conn:
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    return
+                received.extend(chunk)
+
+    thread = threading.Thread(target=accept, daemon=True)
+    thread.start()
+    yield SimpleNamespace(port=server_sock.getsockname()[1], data=received)
+    server_sock.close()
+
+
+class FlakySink(AlertSink):
+    """Falla las primeras 'failures' veces y después acepta."""
+
+    name = 'flaky'
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.batches = []
+        self.closed = False
+
+    def send(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("caído")
+        self.batches.append(list(events))
+
+    def close(self):
+        self.closed = True
+
+
+# --- Destinos ---
+
+def test_webhook_posts_batch(webhook_server):
+    sink = WebhookSink(webhook_server.url)
+    sink.send([make_event(1), make_event(2)])
+    sink.close()
+    assert webhook_server.received == [{'count': 2, 'alerts': [make_event(1), make_event(2)]}]
+
+
+def test_webhook_raises_on_error_status(webhook_server):
+    webhook_server.statuses.append(500)
+    sink = WebhookSink(webhook_server.url)
+    with pytest.raises(Exception):
+        sink.send([make_event()])
+    sink.close()
+
+
+def test_syslog_udp_sends_one_message_per_alert(udp_listener):
+    sink = SyslogSink(f"127.0.0.1:{udp_listener.getsockname()[1]}", 'udp')
+    sink.send([make_event(1), make_event(2)])
+    sink.close()
+    messages = [udp_listener.recvfrom(65536)[0].decode() for _ in range(2)]
+    for index, message in zip((1, 2), messages):
+        assert message.startswith(f"<{SyslogSink.PRIORITY}>1 ")
+        assert "ALERTA HIT | ID: abc123" in message
+        assert json.loads(message[message.index('{'):]) == make_event(index)
+
+
+def test_syslog_tcp_frames_alerts_by_newline(tcp_listener):
+    sink = SyslogSink(f"127.0.0.1:{tcp_listener.port}", 'tcp')
+    sink.send([make_event(1), make_event(2)])
+    sink.close()
+    assert wait_for(lambda: tcp_listener.data.count(b'\n') == 2)
+    lines = bytes(tcp_listener.data).decode().splitlines()
+    assert [json.loads(line[line.index('{'):])['id'] for line in lines] == [1, 2]
+
+
+@pytest.mark.parametrize('address, expected', [
+    ('syslog.local', ('syslog.local', 514)),
+    ('syslog.local:1514', ('syslog.local', 1514)),
+    (':1514', ('localhost', 1514)),
+    ('[::1]', ('::1', 514)),
+    ('[::1]:1514', ('::1', 1514)),
+    ('fe80::1', ('fe80::1', 514)),
+])
+def test_syslog_address_defaults_port(address, expected):
+    assert SyslogSink(address).address == expected
+
+
+def test_syslog_address_rejects_bad_port():
+    with pytest.raises(ValueError, match='Puerto inválido'):
+        SyslogSink('syslog.local:abc')
+
+
+def test_syslog_udp_without_port_uses_default(monkeypatch):
+    sent = []
+    monkeypatch.setattr(socket.socket, 'sendto', lambda sock, data, address: sent.append(address))
+    sink = SyslogSink('127.0.0.1')
+    sink.send([make_event()])
+    sink.close()
+    assert sent == [('127.0.0.1', 514)]
+
+
+def test_smtp_sends_one_mail_per_batch(smtp_server):
+    port = smtp_server.server_address[1]
+    sink = SmtpSink('127.0.0.1', port, 'tokensnare@test', ['soc@test', 'ops@test'])
+    sink.send([make_event(1), make_event(2)])
+    assert len(smtp_server.messages) == 1
+    sender, recipients, data = smtp_server.messages[0]
+    assert sender == 'tokensnare@test'
+    assert recipients == ['soc@test', 'ops@test']
+    message = message_from_bytes(data)
+    assert message['Subject'] == "TokenSnare: 2 alerta(s) de honeytokens"
+    assert message.get_payload(decode=True).decode().count("ALERTA HIT") == 2
+
+
+# --- Worker y dispatcher ---
+
+def test_worker_batches_burst(tmp_path):
+    sink = FlakySink(0)
+    worker = SinkWorker(sink, DeadLetterFile(tmp_path / 'dead.ndjson'), batch_size=3, batch_window=0.5)
+    worker.submit([make_event(index) for index in range(7)])
+    assert wait_for(lambda: worker.stats()['sent'] == 7)
+    worker.stop(timeout=5)
+    assert [len(batch) for batch in sink.batches] == [3, 3, 1]
+    assert worker.stats()['batches'] == 3
+    assert sink.closed
+
+
+def test_worker_retries_with_backoff(tmp_path):
+    sink = FlakySink(2)
+    worker = SinkWorker(sink, DeadLetterFile(tmp_path / 'dead.ndjson'), batch_window=0, max_retries=3, backoff=0.05)
+    started = time.monotonic()
+    worker.submit([make_event()])
+    assert wait_for(lambda: worker.stats()['sent'] == 1)
+    # Esperas de 0.05 y 0.1 segundos antes del tercer intento
+    assert time.monotonic() - started >= 0.15
+    worker.stop(timeout=5)
+    assert worker.stats()['retries'] == 2
+    assert not (tmp_path / 'dead.ndjson').exists()
+
+
+def test_worker_dead_letters_after_max_retries(tmp_path):
+    dead_letter = tmp_path / 'dead.ndjson'
+    worker = SinkWorker(FlakySink(100), DeadLetterFile(dead_letter), batch_window=0, max_retries=2, backoff=0.01)
+    worker.submit([make_event(1), make_event(2)])
+    assert wait_for(lambda: worker.stats()['dead_lettered'] == 2)
+    worker.stop(timeout=5)
+    entries = read_dead_letter(dead_letter)
+    assert len(entries) == 1
+    assert entries[0]['sink'] == 'flaky'
+    assert entries[0]['error'] == "ConnectionError: caído"
+    assert entries[0]['alerts'] == [make_event(1), make_event(2)]
+    assert worker.stats()['retries'] == 2
+
+
+def test_worker_dead_letters_when_queue_full(tmp_path):
+    dead_letter = tmp_path / 'dead.ndjson'
+    blocked = threading.Event()
+
+    class BlockingSink(FlakySink):
+        def send(self, events):
+            blocked.wait(5)
+            super().send(events)
+
+    worker = SinkWorker(BlockingSink(0), DeadLetterFile(dead_letter), queue_size=2, batch_size=1, batch_window=0)
+    worker.submit([make_event(0)])
+    assert wait_for(lambda: worker.stats()['queued'] == 0)
+    worker.submit([make_event(index) for index in range(1, 5)])
+    assert worker.stats()['dropped'] == 2
+    assert read_dead_letter(dead_letter)[0]['error'] == "cola llena"
+    blocked.set()
+    worker.stop(timeout=5)
+    assert worker.stats()['sent'] == 3
+
+
+def test_worker_stop_flushes_pending_and_skips_retries(tmp_path):
+    dead_letter = tmp_path / 'dead.ndjson'
+    sink = FlakySink(100)
+    worker = SinkWorker(sink, DeadLetterFile(dead_letter), batch_window=10, max_retries=5, backoff=10)
+    worker.submit([make_event(1)])
+    started = time.monotonic()
+    worker.stop(timeout=5)
+    # No espera la ventana de agrupado ni el backoff: el lote va directo al dead-letter
+    assert time.monotonic() - started < 5
+    assert not worker._thread.is_alive()
+    assert read_dead_letter(dead_letter)[0]['alerts'] == [make_event(1)]
+    assert sink.closed
+
+
+def test_dispatcher_isolates_sinks(tmp_path, webhook_server):
+    dead_letter = tmp_path / 'dead.ndjson'
+    failing = FlakySink(100)
+    dispatcher = AlertDispatcher([WebhookSink(webhook_server.url), failing], str(dead_letter),
+                                 batch_window=0, max_retries=1, backoff=0.01)
+    dispatcher.dispatch([make_event(1)])
+    dispatcher.dispatch([])
+    assert wait_for(lambda: dispatcher.stats()['flaky']['dead_lettered'] == 1)
+    assert wait_for(lambda: dispatcher.stats()['webhook']['sent'] == 1)
+    dispatcher.stop(timeout=5)
+    assert webhook_server.received == [{'count': 1, 'alerts': [make_event(1)]}]
+    assert [entry['sink'] for entry in read_dead_letter(dead_letter)] == ['flaky']
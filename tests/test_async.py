@@ -0,0 +1,74 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from storage import HitIngestQueue
+
+
+def call(app, scope, messages=()):
+    """Corre la app ASGI con los mensajes de entrada dados y retorna lo enviado."""
+    sent = []
+    pending = list(messages)
+
+    async def receive():
+        return pending.pop(0) if pending else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+def http_scope(path, method='GET', headers=()):
+    return {'type': 'http', 'http_version': '1.1', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'root_path': '', 'method': method, 'query_string': b'', 'headers': list(headers),
+            'server': ('127.0.0.1', 5000), 'client': ('10.0.0.1', 1234)}
+
+
+@pytest.fixture
+def front(server, monkeypatch):
+    import tokensnare_async
+
+    ingest = HitIngestQueue(server.persist_hits, flush_interval=0)
+    monkeypatch.setattr(server, 'ingest_queue', ingest)
+    server.db.save_token({'token': 'a', 'type': 'link', 'description': 'test',
+                          'created_at': '2024-01-01T00:00:00-03:00', 'hits': 0, 'last_hit': None})
+    yield tokensnare_async
+    ingest.stop()
+
+
+def test_tracking_is_queued_and_persisted(server, front):
+    sent = call(front.app, http_scope('/image/a.png', headers=[(b'user-agent', b'lector')]))
+    assert sent[0]['status'] == 200
+    assert sent[1]['body'] == server.TRANSPARENT_PNG
+    assert call(front.app, http_scope('/link/desconocido'))[0]['status'] == 204
+
+    server.ingest_queue.stop()
+    assert [(hit['token'], hit['user_agent']) for hit in server.db.get_hits('a')] == [('a', 'lector')]
+    assert server.db.count_hits() == 1
+
+
+def test_token_lookup_runs_off_the_event_loop(server, front, monkeypatch):
+    threads = []
+    is_known_token = server.is_known_token
+    monkeypatch.setattr(server, 'is_known_token',
+                        lambda token: threads.append(threading.current_thread()) or is_known_token(token))
+    call(front.app, http_scope('/link/a'))
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_lifespan_refuses_to_start_without_ingest_queue(server, front, monkeypatch):
+    monkeypatch.setattr(server, 'ingest_queue', None)
+    sent = call(front.app, {'type': 'lifespan'}, [{'type': 'lifespan.startup'}])
+    assert sent == [{'type': 'lifespan.startup.failed', 'message': front.INGEST_QUEUE_REQUIRED}]
+
+
+def test_other_routes_fall_through_to_flask(server, front):
+    sent = call(front.app, http_scope('/api/tokens', headers=[(b'authorization', b'Bearer test-api-key')]))
+    assert sent[0]['status'] == 200
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    assert json.loads(body)['tokens'][0]['token'] == 'a'
+    assert call(front.app, http_scope('/api/tokens'))[0]['status'] == 401
@@ -0,0 +1,69 @@
+import pytest
+
+import generators.common
+from generators import TokenSnareClient
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+def test_batch_registers_tokens_in_order(server, client, api_headers):
+    items = [{'type': 'link', 'description': f'token {index}'} for index in range(3)] + [{'type': 'pixel'}]
+    response = client.post('/api/tokens/batch', json={'tokens': items}, headers=api_headers)
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['total'] == 4
+    assert [token['description'] for token in body['tokens'][:3]] == ['token 0', 'token 1', 'token 2']
+    assert body['tokens'][3]['type'] == 'pixel'
+
+    token_ids = [token['token'] for token in body['tokens']]
+    assert len(set(token_ids)) == 4
+    assert body['tokens'][0]['tracking_url_link'].endswith(f"/link/{token_ids[0]}")
+    assert body['tokens'][0]['tracking_url_image'].endswith(f"/image/{token_ids[0]}.png")
+    assert sorted(token['token'] for token in server.db.list_tokens()) == sorted(token_ids)
+
+
+@pytest.mark.parametrize('payload', [
+    {},
+    {'tokens': []},
+    {'tokens': {'type': 'link'}},
+    {'tokens': [{'type': 'link'}, {'description': 'sin tipo'}]},
+    {'tokens': ['link']},
+    [{'type': 'link'}],
+])
+def test_batch_validation(server, client, api_headers, payload):
+    response = client.post('/api/tokens/batch', json=payload, headers=api_headers)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    # Un lote inválido no registra ningún token
+    assert server.db.count_tokens() == 0
+
+
+def test_batch_size_limit(server, client, api_headers, monkeypatch):
+    monkeypatch.setattr(server, 'MAX_BATCH_SIZE', 2)
+    response = client.post('/api/tokens/batch', json={'tokens': [{'type': 'link'}] * 3}, headers=api_headers)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == "Máximo 2 tokens por lote"
+    assert client.post('/api/tokens/batch', json={'tokens': [{'type': 'link'}] * 2},
+                       headers=api_headers).status_code == 201
+
+
+def test_batch_requires_api_key(client):
+    assert client.post('/api/tokens/batch', json={'tokens': [{'type': 'link'}]}).status_code == 401
+
+
+def test_client_splits_large_batches(monkeypatch):
+    monkeypatch.setattr(generators.common, 'BATCH_SIZE', 2)
+    client = TokenSnareClient('localhost:1', api_key='key')
+    requests = []
+
+    def post(path, payload, timeout=None):
+        requests.append((path, len(payload['tokens'])))
+        return {'tokens': [dict(token, token=f"id-{token['description']}") for token in payload['tokens']]}
+
+    monkeypatch.setattr(client, '_post', post)
+    registered = client.register_tokens([{'type': 'link', 'description': str(index)} for index in range(5)])
+    assert requests == [('/api/tokens/batch', 2), ('/api/tokens/batch', 2), ('/api/tokens/batch', 1)]
+    assert [token['token'] for token in registered] == [f'id-{index}' for index in range(5)]
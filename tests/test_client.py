@@ -0,0 +1,83 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from generators import TokenSnareClient, TokenSnareError
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Responde con los status de 'server.statuses' en orden y después 200."""
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.requests.append((self.command, self.path))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = json.dumps({'token': 'abc', 'tokens': []}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flaky_server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    httpd.requests = []
+    httpd.statuses = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_client(httpd):
+    return TokenSnareClient(f'127.0.0.1:{httpd.server_address[1]}', api_key='key', retries=3, backoff=0)
+
+
+def test_retry_policy_is_method_aware():
+    client = TokenSnareClient('localhost:1', api_key='key')
+    retry = client.session.get_adapter('http://localhost:1').max_retries
+    assert retry.is_retry('GET', 500)
+    assert retry.is_retry('POST', 503)
+    assert retry.is_retry('POST', 429)
+    assert not retry.is_retry('POST', 500)
+    # Un POST cortado después de enviarse no se repite
+    assert not retry._is_method_retryable('POST')
+    assert client.session.headers['Authorization'] == 'Bearer key'
+
+
+def test_post_retried_on_503(flaky_server):
+    flaky_server.statuses = [503, 429]
+    assert make_client(flaky_server).register_token('link', 'test') == {'token': 'abc', 'tokens': []}
+    assert flaky_server.requests == [('POST', '/api/tokens')] * 3
+
+
+def test_post_not_retried_on_500(flaky_server):
+    flaky_server.statuses = [500]
+    with pytest.raises(TokenSnareError):
+        make_client(flaky_server).register_tokens([{'type': 'link', 'description': 'test'}])
+    assert flaky_server.requests == [('POST', '/api/tokens/batch')]
+
+
+def test_get_retried_on_500(flaky_server, tmp_path):
+    flaky_server.statuses = [500, 502]
+    with open(tmp_path / 'export', 'wb') as output:
+        make_client(flaky_server).export('hits', output)
+    assert [method for method, _ in flaky_server.requests] == ['GET'] * 3
+
+
+def test_connection_error_is_reported():
+    client = TokenSnareClient('127.0.0.1:1', api_key='key', retries=1, backoff=0, timeout=1)
+    with pytest.raises(TokenSnareError):
+        client.register_token('link', 'test')
@@ -0,0 +1,113 @@
+import base64
+
+import pytest
+
+from storage import create_storage
+
+
+def make_token(token_id, description='test', token_type='link', created_minute=0):
+    return {'token': token_id, 'type': token_type, 'description': description,
+            'created_at': f'2024-01-01T00:{created_minute:02d}:00-03:00', 'hits': 0, 'last_hit': None}
+
+
+def make_hit(token_id, hour, minute=0, ip='10.0.0.1', user_agent='test'):
+    return {'token': token_id, 'timestamp': f'2024-01-01T{hour:02d}:{minute:02d}:00-03:00', 'ip': ip,
+            'user_agent': user_agent, 'headers': {'User-Agent': user_agent}}
+
+
+def open_storage(tmp_path, backend):
+    storage = create_storage(backend, str(tmp_path / ('db.json' if backend == 'json' else 'db.sqlite3')))
+    storage.load()
+    return storage
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def storage(tmp_path, request):
+    storage = open_storage(tmp_path, request.param)
+    storage.save_tokens([
+        make_token('aaa', 'Planilla de Sueldos', created_minute=1),
+        make_token('bbb', 'backup VPN', 'pixel', created_minute=2),
+        make_token('ccc', 'sueldos 2024', created_minute=3),
+        make_token('ddd', None, 'pixel', created_minute=4),
+    ])
+    storage.add_hits([make_hit('aaa', 10), make_hit('ccc', 11), make_hit('ccc', 12), make_hit('bbb', 13)])
+    yield storage
+    storage.close()
+
+
+def token_ids(result):
+    return [record['token'] for record in result[0]]
+
+
+# --- Búsqueda y orden (storage) ---
+
+def test_search_matches_description_and_id(storage):
+    assert token_ids(storage.search_tokens(search='SUELDOS')) == ['ccc', 'aaa']
+    assert token_ids(storage.search_tokens(search='bb')) == ['bbb']
+    assert storage.search_tokens(search='nada') == ([], 0)
+
+
+def test_search_filters_by_type_and_min_hits(storage):
+    assert token_ids(storage.search_tokens(token_type='pixel')) == ['ddd', 'bbb']
+    assert token_ids(storage.search_tokens(min_hits=2)) == ['ccc']
+    assert token_ids(storage.search_tokens(token_type='pixel', min_hits=1)) == ['bbb']
+
+
+def test_search_sort_and_page(storage):
+    # A igual cantidad de hits se ordena por ID
+    assert token_ids(storage.search_tokens(sort='hits')) == ['ccc', 'bbb', 'aaa', 'ddd']
+    assert token_ids(storage.search_tokens(sort='hits', descending=False)) == ['ddd', 'aaa', 'bbb', 'ccc']
+    # Los tokens sin hits van primero en orden ascendente
+    assert token_ids(storage.search_tokens(sort='last_hit', descending=False)) == ['ddd', 'aaa', 'ccc', 'bbb']
+
+    page = storage.search_tokens(sort='token', descending=False, offset=1, limit=2)
+    assert token_ids(page) == ['bbb', 'ccc']
+    assert page[1] == 4
+    with pytest.raises(ValueError):
+        storage.search_tokens(sort='ip')
+
+
+# --- Panel web ---
+
+@pytest.fixture
+def admin_client(server, monkeypatch):
+    monkeypatch.setattr(server, 'ADMIN_USER', 'admin')
+    monkeypatch.setattr(server, 'ADMIN_PASSWORD', 'secreto')
+    monkeypatch.setattr(server.dashboard_cache, 'ttl', 60)
+    server.db.save_tokens([make_token('aaa', 'Planilla de Sueldos'), make_token('bbb', 'backup VPN', 'pixel')])
+    client = server.app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = 'Basic ' + base64.b64encode(b'admin:secreto').decode()
+    return client
+
+
+def test_dashboard_requires_login(server):
+    assert server.app.test_client().get('/tokens').status_code == 401
+
+
+def test_dashboard_search_and_pagination(admin_client):
+    html = admin_client.get('/tokens?q=sueldos').get_data(as_text=True)
+    assert 'Token: aaa' in html and 'Token: bbb' not in html
+    assert '1 token(s) encontrados. Página 1 de 1.' in html
+
+    html = admin_client.get('/tokens?sort=token&order=asc&per_page=1&page=2').get_data(as_text=True)
+    assert 'Token: bbb' in html and 'Token: aaa' not in html
+    assert 'Página 2 de 2.' in html
+    # Parámetros inválidos vuelven al default en lugar de fallar
+    assert admin_client.get('/tokens?sort=ip&page=x&per_page=0').status_code == 200
+
+
+def test_dashboard_cache_invalidated_by_new_hits(server, admin_client):
+    assert '0 Hits' in admin_client.get('/tokens?q=aaa').get_data(as_text=True)
+
+    # Escribir directo al storage no invalida: se sigue viendo el fragmento cacheado
+    server.db.add_hits([make_hit('aaa', 10)])
+    assert '0 Hits' in admin_client.get('/tokens?q=aaa').get_data(as_text=True)
+
+    server.persist_hits([make_hit('aaa', 11)])
+    assert '2 Hits' in admin_client.get('/tokens?q=aaa').get_data(as_text=True)
+
+
+def test_dashboard_cache_invalidated_by_writes(server, admin_client):
+    assert '2 token(s) encontrados' in admin_client.get('/tokens').get_data(as_text=True)
+    assert admin_client.post('/web/delete/bbb').status_code == 302
+    assert '1 token(s) encontrados' in admin_client.get('/tokens').get_data(as_text=True)
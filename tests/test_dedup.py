@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+from storage import HitDeduplicator, TokenBucket, create_storage
+
+
+def make_hit(token_id='a', minute=0, ip='10.0.0.1', user_agent='test'):
+    return {'token': token_id, 'timestamp': f'2024-01-01T10:{minute:02d}:00-03:00', 'ip': ip,
+            'user_agent': user_agent, 'headers': {}}
+
+
+def test_suppresses_repeats_within_window():
+    dedup = HitDeduplicator(window=60)
+    batch = [make_hit(minute=0), make_hit(minute=1), make_hit(minute=2, ip='10.0.0.2'), make_hit(minute=3)]
+    kept = dedup.filter(batch)
+    assert kept == [batch[0], batch[2]]
+    assert dedup.stats()['suppressed'] == 2
+
+    for hit_id, hit_record in enumerate(kept, 1):
+        hit_record['id'] = hit_id
+    dedup.remember(kept)
+    assert dedup.drain() == [('a', 1, 2, make_hit(minute=3)['timestamp'])]
+    # drain resetea los contadores
+    assert dedup.drain() == []
+
+
+def test_repeats_wait_for_original_hit_id():
+    dedup = HitDeduplicator(window=60)
+    first = dedup.filter([make_hit(minute=0)])
+    dedup.filter([make_hit(minute=1)])
+    assert dedup.drain() == []
+
+    first[0]['id'] = 7
+    dedup.remember(first)
+    assert dedup.drain() == [('a', 7, 1, make_hit(minute=1)['timestamp'])]
+
+
+def test_expired_keys_start_over_and_flush_their_repeats():
+    dedup = HitDeduplicator(window=0.05)
+    first = dedup.filter([make_hit(minute=0), make_hit(minute=1)])
+    first[0]['id'] = 1
+    dedup.remember(first)
+    time.sleep(0.1)
+
+    assert dedup.filter([make_hit(minute=2)]) == [make_hit(minute=2)]
+    assert dedup.drain() == [('a', 1, 1, make_hit(minute=1)['timestamp'])]
+
+
+def test_lru_is_bounded():
+    dedup = HitDeduplicator(window=60, max_entries=2)
+    kept = dedup.filter([make_hit(ip=f'10.0.0.{index}') for index in range(3)])
+    assert len(kept) == 3
+    assert dedup.stats()['entries'] == 2
+    # La clave más vieja se olvidó: vuelve a pasar
+    assert dedup.filter([make_hit(ip='10.0.0.0')]) == [make_hit(ip='10.0.0.0')]
+
+
+def test_token_bucket_allows_burst_then_rate():
+    bucket = TokenBucket(rate=1000, burst=3)
+    assert [bucket.allow() for _ in range(4)] == [True, True, True, False]
+    time.sleep(0.01)
+    assert bucket.allow()
+    assert bucket.stats()['limited'] == 1
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_repeats_count_as_token_hits(tmp_path, backend):
+    path = tmp_path / ('db.json' if backend == 'json' else 'db.sqlite3')
+    storage = create_storage(backend, str(path))
+    storage.load()
+    storage.save_token({'token': 'a', 'type': 'link', 'description': 'test', 'created_at': '2024-01-01T00:00:00-03:00',
+                        'hits': 0, 'last_hit': None})
+
+    dedup = HitDeduplicator(window=60)
+    accepted = storage.add_hits(dedup.filter([make_hit(minute=minute) for minute in range(5)]))
+    dedup.remember(accepted)
+    storage.add_hit_repeats(dedup.drain())
+
+    hits = storage.get_hits('a')
+    assert len(hits) == 1
+    assert hits[0]['repeats'] == 4
+    assert hits[0]['last_seen'] == make_hit(minute=4)['timestamp']
+    token = storage.get_token('a')
+    assert token['hits'] == 5
+    assert token['last_hit'] == make_hit(minute=4)['timestamp']
+    stats = storage.get_hit_stats('a')
+    assert (stats['hits'], stats['repeats']) == (1, 4)
+    storage.close()
+
+    # Persisten al reabrir (replay del journal en json)
+    reopened = create_storage(backend, str(path))
+    reopened.load()
+    assert reopened.get_token('a')['hits'] == 5
+    assert reopened.get_hits('a')[0]['repeats'] == 4
+    reopened.close()
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_older_repeat_does_not_move_last_hit_back(tmp_path, backend):
+    path = tmp_path / ('db.json' if backend == 'json' else 'db.sqlite3')
+    storage = create_storage(backend, str(path))
+    storage.load()
+    storage.save_token({'token': 'a', 'type': 'link', 'description': 'test', 'created_at': '2024-01-01T00:00:00-03:00',
+                        'hits': 0, 'last_hit': None})
+    first, _ = storage.add_hits([make_hit(minute=0), make_hit(minute=9, ip='10.0.0.2')])
+    storage.add_hit_repeats([('a', first['id'], 2, make_hit(minute=5)['timestamp'])])
+    token = storage.get_token('a')
+    assert token['hits'] == 4
+    assert token['last_hit'] == make_hit(minute=9)['timestamp']
+    storage.close()
@@ -0,0 +1,130 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from storage import create_storage
+
+
+def make_token(token_id):
+    return {'token': token_id, 'type': 'link', 'description': 'test', 'created_at': '2024-01-01T00:00:00-03:00',
+            'hits': 0, 'last_hit': None}
+
+
+def make_hit(token_id, minute):
+    return {'token': token_id, 'timestamp': f'2024-01-01T10:{minute:02d}:00-03:00', 'ip': '10.0.0.1',
+            'user_agent': 'test', 'headers': {'User-Agent': 'test'}}
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.fixture
+def client(server):
+    server.db.save_tokens([make_token('a'), make_token('b')])
+    server.db.add_hits([make_hit('a', 1), make_hit('b', 2), make_hit('a', 3)])
+    return server.app.test_client()
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_iter_hits_cursor_window(tmp_path, backend):
+    storage = create_storage(backend, str(tmp_path / ('db.json' if backend == 'json' else 'db.sqlite3')))
+    storage.load()
+    storage.save_tokens([make_token('a'), make_token('b')])
+    storage.add_hits([make_hit(token_id, minute) for minute, token_id in enumerate('abab')])
+
+    assert storage.last_hit_id() == 4
+    assert [hit['id'] for hit in storage.iter_hits()] == [1, 2, 3, 4]
+    assert [hit['id'] for hit in storage.iter_hits(after=1, upto=3)] == [2, 3]
+    assert [hit['id'] for hit in storage.iter_hits(since=make_hit('a', 2)['timestamp'])] == [3, 4]
+    storage.close()
+
+
+def test_export_cursor_resumes_with_new_hits_only(server, client, api_headers):
+    response = client.get('/api/export/hits', headers=api_headers)
+    assert response.status_code == 200
+    assert [hit['id'] for hit in ndjson(response)] == [1, 2, 3]
+    cursor = response.headers['X-Export-Cursor']
+    assert cursor == '3'
+
+    server.db.add_hits([make_hit('b', 4), make_hit('a', 5)])
+    response = client.get(f'/api/export/hits?after={cursor}', headers=api_headers)
+    assert [hit['id'] for hit in ndjson(response)] == [4, 5]
+    assert response.headers['X-Export-Cursor'] == '5'
+
+    response = client.get('/api/export/hits?after=5', headers=api_headers)
+    assert response.get_data() == b''
+    assert response.headers['X-Export-Cursor'] == '5'
+
+
+def test_export_hits_since(client, api_headers):
+    response = client.get('/api/export/hits', query_string={'since': make_hit('a', 2)['timestamp']},
+                          headers=api_headers)
+    assert [hit['id'] for hit in ndjson(response)] == [2, 3]
+
+
+def test_export_csv(client, api_headers):
+    response = client.get('/api/export/hits?format=csv', headers=api_headers)
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row['id'] for row in rows] == ['1', '2', '3']
+    assert json.loads(rows[0]['headers']) == {'User-Agent': 'test'}
+
+
+def test_export_tokens_after(client, api_headers):
+    response = client.get('/api/export/tokens?after=a', headers=api_headers)
+    assert [token['token'] for token in ndjson(response)] == ['b']
+
+
+@pytest.mark.parametrize('accept_encoding, compressed', [
+    ('gzip', True),
+    ('deflate, gzip;q=0.5', True),
+    ('*', True),
+    ('gzip;q=0', False),
+    ('x-gzip-foo', False),
+    ('', False),
+])
+def test_export_gzip_negotiation(client, api_headers, accept_encoding, compressed):
+    response = client.get('/api/export/hits', headers={**api_headers, 'Accept-Encoding': accept_encoding})
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    body = response.get_data()
+    if compressed:
+        assert response.headers['Content-Encoding'] == 'gzip'
+        body = gzip.decompress(body)
+    else:
+        assert 'Content-Encoding' not in response.headers
+    assert len(body.decode().splitlines()) == 3
+
+
+@pytest.mark.parametrize('path', ['/api/export/hits?after=x', '/api/export/hits?since=ayer', '/api/export/other',
+                                  '/api/export/hits?format=xml'])
+def test_export_rejects_bad_parameters(client, api_headers, path):
+    assert client.get(path, headers=api_headers).status_code == 400
+
+
+def test_export_requires_api_key(client):
+    assert client.get('/api/export/hits').status_code == 401
+
+
+@pytest.mark.parametrize('delete', ['token', 'all'])
+def test_export_cursor_survives_delete_and_restart(server, client, api_headers, delete):
+    response = client.get('/api/export/hits', headers=api_headers)
+    assert [hit['id'] for hit in ndjson(response)] == [1, 2, 3]
+    cursor = response.headers['X-Export-Cursor']
+
+    if delete == 'token':
+        server.db.delete_token('a')
+    else:
+        server.db.delete_all()
+        server.db.save_tokens([make_token('b')])
+    server.db.close()
+    server.db = create_storage('json', str(server.db.db_file))
+    server.db.load()
+
+    assert server.db.last_hit_id() == 3
+    server.db.add_hits([make_hit('b', 4)])
+    response = client.get(f'/api/export/hits?after={cursor}', headers=api_headers)
+    assert [hit['id'] for hit in ndjson(response)] == [4]
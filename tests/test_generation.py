@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+from generators import GenerationBusy, GenerationPool, GenerationTimeout
+
+
+@pytest.fixture
+def pool():
+    pool = GenerationPool(workers=1, max_pending=1, timeout=0.3, cache_size=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_runs_in_process_pool(pool):
+    assert pool._run(abs, -3) == 3
+    assert pool.stats()['pending'] == 0
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes(pool):
+    with pytest.raises(GenerationTimeout):
+        pool._run(time.sleep, 1.0)
+    # El proceso sigue ocupado con el trabajo vencido: no se admiten más
+    assert pool.stats()['pending'] == 1
+    with pytest.raises(GenerationBusy):
+        pool._run(abs, -1)
+
+    deadline = time.monotonic() + 5
+    while pool.stats()['pending'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert pool._run(abs, -1) == 1
+
+
+def test_template_cache_is_content_addressed(pool):
+    first = pool.get_template('pdf', 'Informe', 'Autor', 'Texto')
+    assert pool.get_template('pdf', 'Informe', 'Autor', 'Texto') is first
+    pool.get_template('pdf', 'Otro', 'Autor', 'Texto')
+    assert pool.cache.stats() == {'items': 2, 'max_items': 2, 'hits': 1, 'misses': 2}
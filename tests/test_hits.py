@@ -0,0 +1,85 @@
+import sys
+
+import pytest
+
+from storage import CompactHit, create_storage
+from storage.hits import compress_headers, decompress_headers
+
+
+def make_hit(hit_id=1, headers=None):
+    return {'id': hit_id, 'token': 'abc', 'timestamp': '2024-01-01T10:00:00-03:00', 'ip': '10.0.0.1',
+            'user_agent': 'lector', 'headers': headers if headers is not None else {'User-Agent': 'lector',
+                                                                                    'Accept': '*/*'}}
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_compact_hit_round_trip(compress):
+    hit = CompactHit.from_dict(make_hit(), compress)
+    assert isinstance(hit.headers_data, bytes) == compress
+    assert hit.to_dict() == make_hit()
+    assert CompactHit.from_dict(make_hit(headers={}), compress).to_dict()['headers'] == {}
+
+
+def test_compact_hit_interns_repeated_strings():
+    first = CompactHit.from_dict(make_hit(1))
+    second = CompactHit.from_dict(make_hit(2))
+    assert first.token is second.token
+    assert first.user_agent is second.user_agent
+    assert first.headers_data[0][0] is sys.intern('User-Agent')
+
+
+def test_with_repeats_returns_a_new_hit():
+    hit = CompactHit.from_dict(make_hit())
+    repeated = hit.with_repeats(2, '2024-01-01T10:05:00-03:00').with_repeats(1, '2024-01-01T10:06:00-03:00')
+    assert 'repeats' not in hit.to_dict()
+    assert repeated.to_dict() == dict(make_hit(), repeats=3, last_seen='2024-01-01T10:06:00-03:00')
+    assert CompactHit.from_dict(repeated.to_dict()).to_dict() == repeated.to_dict()
+
+
+def test_compressed_headers_blob():
+    headers = {'User-Agent': 'lector', 'X-Forwarded-For': '10.0.0.1'}
+    assert decompress_headers(compress_headers(headers)) == headers
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_compressed_headers_survive_reload(tmp_path, backend):
+    path = str(tmp_path / ('db.json' if backend == 'json' else 'db.sqlite3'))
+    storage = create_storage(backend, path, compress_headers=True)
+    storage.load()
+    storage.save_token({'token': 'abc', 'type': 'link', 'description': 'test',
+                        'created_at': '2024-01-01T00:00:00-03:00', 'hits': 0, 'last_hit': None})
+    storage.add_hits([{key: value for key, value in make_hit().items() if key != 'id'}])
+    if backend == 'json':
+        storage.save()
+    storage.close()
+
+    # Sin compress_headers se leen igual los hits guardados comprimidos
+    reopened = create_storage(backend, path)
+    reopened.load()
+    assert reopened.get_hits('abc') == [make_hit()]
+    reopened.close()
+
+
+@pytest.mark.parametrize('whitelist, blacklist, expected', [
+    ('', '', {'User-Agent': 'lector', 'Cookie': 'sesion', 'Accept': '*/*'}),
+    ('user-agent, accept', '', {'User-Agent': 'lector', 'Accept': '*/*'}),
+    ('', 'COOKIE', {'User-Agent': 'lector', 'Accept': '*/*'}),
+    ('user-agent,cookie', 'cookie', {'User-Agent': 'lector'}),
+])
+def test_hit_header_filter(server, monkeypatch, whitelist, blacklist, expected):
+    monkeypatch.setattr(server, 'HEADERS_WHITELIST', server._header_names(whitelist))
+    monkeypatch.setattr(server, 'HEADERS_BLACKLIST', server._header_names(blacklist))
+    headers = {'User-Agent': 'lector', 'Cookie': 'sesion', 'Accept': '*/*'}
+    hit_record = server.build_hit_record('abc', headers, '10.0.0.9')
+    assert hit_record['headers'] == expected
+    assert (hit_record['ip'], hit_record['user_agent']) == ('10.0.0.9', 'lector')
+
+
+def test_tracked_hit_stores_filtered_headers(server, monkeypatch):
+    monkeypatch.setattr(server, 'HEADERS_BLACKLIST', server._header_names('cookie'))
+    server.db.save_token({'token': 'abc', 'type': 'link', 'description': 'test',
+                          'created_at': '2024-01-01T00:00:00-03:00', 'hits': 0, 'last_hit': None})
+    server.app.test_client().get('/link/abc', headers={'Cookie': 'sesion', 'User-Agent': 'lector'})
+    headers = server.db.get_hits('abc')[0]['headers']
+    assert headers['User-Agent'] == 'lector'
+    assert 'Cookie' not in headers
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from storage import HitIngestQueue
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class Recorder:
+    """write_batch que guarda los lotes; con 'gate' no escribe hasta que se abre."""
+
+    def __init__(self, gate=None, fail=False):
+        self.batches = []
+        self.gate = gate
+        self.fail = fail
+
+    def __call__(self, batch):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("storage caído")
+        self.batches.append(list(batch))
+
+
+def test_writes_in_batches():
+    recorder = Recorder()
+    ingest = HitIngestQueue(recorder, batch_size=4, flush_interval=0.2)
+    for index in range(10):
+        assert ingest.submit({'n': index})
+    ingest.stop()
+    assert [hit['n'] for batch in recorder.batches for hit in batch] == list(range(10))
+    assert all(len(batch) <= 4 for batch in recorder.batches)
+    stats = ingest.stats()
+    assert stats['accepted'] == stats['written'] == 10
+    assert stats['batches'] == len(recorder.batches)
+
+
+def test_flushes_partial_batch_after_interval():
+    recorder = Recorder()
+    ingest = HitIngestQueue(recorder, batch_size=100, flush_interval=0.05)
+    ingest.submit({'n': 1})
+    assert wait_for(lambda: recorder.batches == [[{'n': 1}]])
+    ingest.stop()
+
+
+def test_drops_when_full_without_blocking():
+    gate = threading.Event()
+    recorder = Recorder(gate)
+    ingest = HitIngestQueue(recorder, max_size=2, batch_size=1, flush_interval=0)
+    ingest.submit({'n': 0})
+    # El escritor queda bloqueado con el primer hit y la cola se llena con dos más
+    assert wait_for(lambda: ingest.stats()['queued'] == 0)
+    assert ingest.submit({'n': 1}, timeout=0)
+    assert ingest.submit({'n': 2}, timeout=0)
+    started = time.monotonic()
+    assert not ingest.submit({'n': 3}, timeout=0)
+    assert time.monotonic() - started < 0.05
+    assert ingest.stats()['dropped'] == 1
+    gate.set()
+    ingest.stop()
+    assert [hit['n'] for batch in recorder.batches for hit in batch] == [0, 1, 2]
+
+
+def test_stop_drains_pending_and_writes_later_hits_inline():
+    gate = threading.Event()
+    recorder = Recorder(gate)
+    ingest = HitIngestQueue(recorder, batch_size=2, flush_interval=0)
+    for index in range(5):
+        ingest.submit({'n': index})
+    gate.set()
+    ingest.stop()
+    assert ingest.stats()['written'] == 5
+
+    ingest.submit({'n': 5})
+    assert recorder.batches[-1] == [{'n': 5}]
+    assert ingest.stats()['written'] == 6
+
+
+def test_write_errors_are_counted_and_writer_keeps_running():
+    recorder = Recorder(fail=True)
+    ingest = HitIngestQueue(recorder, batch_size=1, flush_interval=0)
+    ingest.submit({'n': 0})
+    assert wait_for(lambda: ingest.stats()['errors'] == 1)
+    recorder.fail = False
+    ingest.submit({'n': 1})
+    ingest.stop()
+    assert recorder.batches == [[{'n': 1}]]
+    assert ingest.stats()['written'] == 1
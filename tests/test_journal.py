@@ -0,0 +1,186 @@
+import json
+
+from storage import HitJournal, JsonStorage
+
+
+def make_token(token_id):
+    return {'token': token_id, 'type': 'link', 'description': 'test', 'created_at': '2024-01-01T00:00:00-03:00',
+            'hits': 0, 'last_hit': None}
+
+
+def make_hit(token_id, minute=0, ip='10.0.0.1'):
+    return {'token': token_id, 'timestamp': f'2024-01-01T10:{minute:02d}:00-03:00', 'ip': ip,
+            'user_agent': 'test', 'headers': {'User-Agent': 'test'}}
+
+
+def open_storage(path, **options):
+    storage = JsonStorage(path, **options)
+    storage.load()
+    return storage
+
+
+def test_replay_skips_entries_covered_by_snapshot(tmp_path):
+    journal = HitJournal(tmp_path / 'db.journal')
+    journal.append_many('hit', [{'n': 1}, {'n': 2}])
+    journal.append('token', {'n': 3})
+    journal.close()
+
+    journal = HitJournal(tmp_path / 'db.journal')
+    assert list(journal.replay()) == [('hit', {'n': 1}), ('hit', {'n': 2}), ('token', {'n': 3})]
+    assert list(journal.replay(after_seq=2)) == [('token', {'n': 3})]
+    # La secuencia sigue desde la última entrada leída
+    assert journal.append('hit', {'n': 4}) == 4
+
+
+def test_replay_ignores_truncated_line(tmp_path):
+    path = tmp_path / 'db.journal'
+    journal = HitJournal(path)
+    journal.append('hit', {'n': 1})
+    journal.close()
+    with open(path, 'a') as f:
+        f.write('{"seq":2,"op":"hit","da')
+
+    assert list(HitJournal(path).replay()) == [('hit', {'n': 1})]
+
+
+def test_rotated_segments_replay_in_order_until_discarded(tmp_path):
+    journal = HitJournal(tmp_path / 'db.journal')
+    journal.append('hit', {'n': 1})
+    assert journal.rotate() == 1
+    journal.append('hit', {'n': 2})
+    assert journal.rotate() == 2
+    journal.append('hit', {'n': 3})
+
+    assert [data['n'] for _, data in journal.replay()] == [1, 2, 3]
+    journal.discard_segments(1)
+    assert [data['n'] for _, data in journal.replay()] == [2, 3]
+    journal.close()
+
+
+def test_json_storage_restores_from_journal(tmp_path):
+    path = tmp_path / 'db.json'
+    storage = open_storage(path)
+    storage.save_tokens([make_token('a'), make_token('b')])
+    accepted = storage.add_hits([make_hit('a', 1), make_hit('b', 2), make_hit('a', 3), make_hit('missing', 4)])
+    assert [hit['id'] for hit in accepted] == [1, 2, 3]
+    storage.close()
+
+    # Sin snapshot: todo sale del journal
+    restored = open_storage(path)
+    assert restored.get_token('a')['hits'] == 2
+    assert restored.get_token('a')['last_hit'] == make_hit('a', 3)['timestamp']
+    assert [hit['id'] for hit in restored.get_hits('a')] == [1, 3]
+    assert restored.count_hits() == 3
+    assert restored.add_hits([make_hit('b', 5)])[0]['id'] == 4
+    restored.close()
+
+
+def test_json_storage_snapshot_does_not_duplicate_hits(tmp_path):
+    path = tmp_path / 'db.json'
+    storage = open_storage(path)
+    storage.save_token(make_token('a'))
+    storage.add_hits([make_hit('a', 1), make_hit('a', 2)])
+    storage.save()
+    storage.add_hits([make_hit('a', 3)])
+    storage.close()
+
+    snapshot = json.loads(path.read_text())
+    assert len(snapshot['hits']) == 2
+
+    restored = open_storage(path)
+    assert [hit['id'] for hit in restored.get_hits('a')] == [1, 2, 3]
+    assert restored.get_token('a')['hits'] == 3
+    restored.close()
+
+
+def test_json_storage_recovers_from_interrupted_compaction(tmp_path):
+    path = tmp_path / 'db.json'
+    storage = open_storage(path)
+    storage.save_token(make_token('a'))
+    storage.add_hits([make_hit('a', 1)])
+    # Corte después de rotar el journal y antes de escribir el snapshot
+    storage.journal.rotate()
+    storage.add_hits([make_hit('a', 2)])
+    storage.close()
+
+    restored = open_storage(path)
+    assert [hit['id'] for hit in restored.get_hits('a')] == [1, 2]
+    restored.close()
+
+
+def test_json_storage_compacts_in_background(tmp_path):
+    path = tmp_path / 'db.json'
+    storage = open_storage(path, compact_every=5)
+    storage.save_token(make_token('a'))
+    for minute in range(12):
+        storage.add_hits([make_hit('a', minute)])
+    # Espera a la compactación en curso (save toma el mismo lock)
+    storage.save()
+    storage.close()
+
+    assert storage.saves >= 2
+    restored = open_storage(path)
+    assert restored.count_hits() == 12
+    assert restored.get_token('a')['hits'] == 12
+    restored.close()
+
+
+def test_append_after_torn_tail_survives_restart(tmp_path):
+    path = tmp_path / 'db.json'
+    storage = open_storage(path)
+    storage.save_token(make_token('a'))
+    storage.add_hits([make_hit('a', 1), make_hit('a', 2)])
+    storage.close()
+    with open(path.with_suffix('.journal'), 'a') as f:
+        f.write('{"seq":4,"op":"hit","data":{"tok')
+
+    restored = open_storage(path)
+    assert restored.count_hits() == 2
+    restored.add_hits([make_hit('a', 3)])
+    restored.close()
+
+    reloaded = open_storage(path)
+    assert [hit['id'] for hit in reloaded.get_hits('a')] == [1, 2, 3]
+    reloaded.close()
+
+
+def test_complete_entry_without_newline_is_kept(tmp_path):
+    path = tmp_path / 'db.journal'
+    path.write_text('{"seq":1,"op":"hit","data":{"n":1}}')
+    journal = HitJournal(path)
+    assert list(journal.replay()) == [('hit', {'n': 1})]
+    journal.append('hit', {'n': 2})
+    journal.close()
+
+    assert list(HitJournal(path).replay()) == [('hit', {'n': 1}), ('hit', {'n': 2})]
+
+
+def test_deletes_are_journaled_and_replayed(tmp_path):
+    path = tmp_path / 'db.json'
+    storage = open_storage(path)
+    storage.save_tokens([make_token('a'), make_token('b')])
+    storage.add_hits([make_hit('a', 1), make_hit('b', 2)])
+    assert storage.delete_token('a')
+    # Sin snapshot: el borrado queda solo en el journal
+    assert not path.exists()
+    storage.close()
+
+    restored = open_storage(path)
+    assert [token['token'] for token in restored.list_tokens()] == ['b']
+    assert restored.count_hits() == 1
+    assert restored.get_hit_stats('a') is None
+    restored.delete_all()
+    restored.save_token(make_token('c'))
+    restored.close()
+
+    reloaded = open_storage(path)
+    assert [token['token'] for token in reloaded.list_tokens()] == ['c']
+    assert reloaded.count_hits() == 0
+    assert reloaded.get_hit_stats() is None
+    reloaded.save()
+    reloaded.close()
+
+    compacted = open_storage(path)
+    assert [token['token'] for token in compacted.list_tokens()] == ['c']
+    assert compacted.last_hit_id() == 2
+    compacted.close()
@@ -0,0 +1,115 @@
+import json
+import logging
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from logs import HitLogSampler, JsonFormatter, LogPipeline
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+class ListHandler(logging.Handler):
+    def __init__(self, gate=None):
+        super().__init__()
+        self.records = []
+        self.gate = gate
+
+    def emit(self, record):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.records.append(record)
+
+
+def make_logger(pipeline, name):
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.handlers = [pipeline.handler]
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def test_pipeline_writes_from_listener_thread():
+    handler = ListHandler()
+    pipeline = LogPipeline([handler])
+    pipeline.start()
+    logger = make_logger(pipeline, 'test.pipeline.thread')
+    logger.info("hola %s", "mundo", extra={'fields': {'token': 'a'}})
+    pipeline.stop()
+    assert [record.getMessage() for record in handler.records] == ["hola mundo"]
+    assert handler.records[0].fields == {'token': 'a'}
+
+
+def test_pipeline_drops_instead_of_blocking_when_full():
+    gate = threading.Event()
+    handler = ListHandler(gate)
+    pipeline = LogPipeline([handler], queue_size=1)
+    pipeline.start()
+    logger = make_logger(pipeline, 'test.pipeline.full')
+    for index in range(5):
+        logger.info("evento %d", index)
+    gate.set()
+    pipeline.stop()
+    assert pipeline.stats()['dropped'] >= 3
+    assert len(handler.records) + pipeline.stats()['dropped'] == 5
+
+
+def test_pipeline_writes_directly_when_stopped():
+    handler = ListHandler()
+    pipeline = LogPipeline([handler])
+    logger = make_logger(pipeline, 'test.pipeline.stopped')
+    logger.warning("sin hilo")
+    assert [record.getMessage() for record in handler.records] == ["sin hilo"]
+
+
+def test_json_formatter_includes_fields_and_exception():
+    try:
+        raise ValueError("falla")
+    except ValueError:
+        record = logging.getLogger('x').makeRecord('x', logging.ERROR, __file__, 1, "error %s", ('grave',),
+                                                   sys.exc_info(), extra={'fields': {'ip': '10.0.0.1'}})
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['level'] == 'error'
+    assert entry['message'] == "error grave"
+    assert entry['ip'] == '10.0.0.1'
+    assert 'ValueError: falla' in entry['exception']
+
+
+def test_sampler_keeps_threshold_then_one_per_rate():
+    sampler = HitLogSampler(threshold=2, rate=3, window=60)
+    assert [sampler.sample('a') for _ in range(8)] == [1, 1, 0, 0, 3, 0, 0, 3]
+    # Cada token tiene su propia ventana
+    assert sampler.sample('b') == 1
+    assert sampler.stats()['sampled_out'] == 4
+
+
+def test_importing_server_has_no_logging_side_effects():
+    code = ("import logging, threading, tokensnare_server as s; "
+            "assert s.log_pipeline is None; "
+            "assert logging.getLogger().handlers == []; "
+            "assert [t.name for t in threading.enumerate()] == ['MainThread']")
+    subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, check=True, capture_output=True)
+
+
+def test_asgi_stream_logs_auth_failures(server, caplog):
+    import asyncio
+    import tokensnare_async
+
+    sent = []
+
+    async def receive():
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'path': '/api/stream', 'method': 'GET', 'query_string': b'',
+             'headers': [(b'authorization', b'Bearer incorrecta')], 'client': ('10.0.0.1', 1234)}
+    with caplog.at_level(logging.WARNING, logger='tokensnare'):
+        asyncio.run(tokensnare_async.app(scope, receive, send))
+    assert sent[0]['status'] == 401
+    record = next(record for record in caplog.records if record.name == 'tokensnare')
+    assert record.fields == {'event': 'auth_failure', 'ip': '10.0.0.1', 'path': '/api/stream'}
@@ -0,0 +1,101 @@
+import math
+import re
+
+from metrics import Histogram, MetricsRegistry, format_family
+
+# Línea de sample del formato de texto de Prometheus: nombre{labels} valor
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? '
+                         r'(NaN|[+-]Inf|-?[0-9.e+-]+)$')
+
+
+def parse_exposition(text):
+    """Valida el texto línea por línea y retorna {nombre: tipo} y las líneas de samples."""
+    assert text.endswith('\n')
+    types = {}
+    samples = []
+    current = None
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            current = line.split(' ')[2]
+        elif line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            assert name == current, f"TYPE sin HELP: {line}"
+            assert name not in types, f"Familia repetida: {name}"
+            assert kind in ('counter', 'gauge', 'histogram', 'summary', 'untyped')
+            types[name] = kind
+        else:
+            match = SAMPLE_LINE.match(line)
+            assert match, f"Línea inválida: {line!r}"
+            assert match.group(1).startswith(current), f"Sample fuera de su familia: {line}"
+            samples.append(line)
+    return types, samples
+
+
+def test_counter_and_labels_render():
+    registry = MetricsRegistry()
+    requests = registry.counter('app_requests_total', "Requests.", ('route', 'status'))
+    requests.inc('/a', '200')
+    requests.inc('/a', '200', amount=2)
+    requests.inc('/b "x"\n', '404')
+
+    text = registry.render()
+    types, samples = parse_exposition(text)
+    assert types == {'app_requests_total': 'counter'}
+    assert 'app_requests_total{route="/a",status="200"} 3' in samples
+    assert 'app_requests_total{route="/b \\"x\\"\\n",status="404"} 1' in samples
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency_seconds', "Latencia.", ('route',), buckets=(0.1, 0.5, 1.0))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        histogram.observe(value, '/a')
+    samples = {(suffix, labels.get('le')): value for suffix, labels, value in histogram.samples()}
+    assert samples[('_bucket', '0.1')] == 2
+    assert samples[('_bucket', '0.5')] == 3
+    assert samples[('_bucket', '1.0')] == 3
+    assert samples[('_bucket', '+Inf')] == 4
+    assert samples[('_count', None)] == 4
+    assert math.isclose(samples[('_sum', None)], 2.45)
+
+
+def test_histogram_time_context_manager():
+    histogram = Histogram('work_seconds', "Trabajo.")
+    with histogram.time():
+        pass
+    samples = {suffix: value for suffix, labels, value in histogram.samples() if suffix != '_bucket'}
+    assert samples['_count'] == 1
+    assert samples['_sum'] >= 0
+
+
+def test_collectors_are_read_at_render_time():
+    registry = MetricsRegistry()
+    depth = {'value': 1}
+    registry.add_collector(lambda: [('queue_depth', 'gauge', "Profundidad.", [('', {}, depth['value'])])])
+    assert 'queue_depth 1' in registry.render()
+    depth['value'] = 7
+    assert 'queue_depth 7' in registry.render()
+
+
+def test_format_family_special_values():
+    lines = format_family('x', 'gauge', "X.", [('', {}, None), ('', {'a': 'b'}, math.inf), ('', {}, 0.5)])
+    assert lines[2:] == ['x NaN', 'x{a="b"} +Inf', 'x 0.5']
+
+
+def test_metrics_endpoint_is_valid_exposition(server, api_headers):
+    client = server.app.test_client()
+    server.db.save_token({'token': 'a', 'type': 'link', 'description': 'test',
+                          'created_at': '2024-01-01T00:00:00-03:00', 'hits': 0, 'last_hit': None})
+    client.get('/link/a')
+    client.get('/api/tokens', headers=api_headers)
+
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers=api_headers)
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    types, samples = parse_exposition(response.get_data(as_text=True))
+    assert types['tokensnare_http_requests_total'] == 'counter'
+    assert types['tokensnare_http_request_duration_seconds'] == 'histogram'
+    assert types['tokensnare_tokens'] == 'gauge'
+    assert any(line.startswith('tokensnare_http_requests_total{group="tracking",route="/link/<token>",method="GET",'
+                               'status="204"}') for line in samples)
+    assert 'tokensnare_tokens 1' in samples
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+
+def make_token(token_id, token_type='link'):
+    return {'token': token_id, 'type': token_type, 'description': f'token {token_id}',
+            'created_at': '2024-01-01T00:00:00-03:00', 'hits': 0, 'last_hit': None}
+
+
+def make_hit(token_id, minute, ip='10.0.0.1'):
+    return {'token': token_id, 'timestamp': f'2024-01-01T10:{minute:02d}:00-03:00', 'ip': ip,
+            'user_agent': 'test', 'headers': {'User-Agent': 'test'}}
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.fixture
+def client(server):
+    server.db.save_tokens([make_token(token_id, 'pixel' if token_id in 'bd' else 'link') for token_id in 'abcde'])
+    server.db.add_hits([make_hit('a', minute, ip=f'10.0.0.{minute % 2}') for minute in range(5)])
+    return server.app.test_client()
+
+
+def walk(client, api_headers, url, items_key, cursor_key):
+    """Recorre todas las páginas siguiendo next_cursor; retorna los ids de cada página."""
+    pages = []
+    after = None
+    while True:
+        query = f'&after={after}' if after is not None else ''
+        body = client.get(url + query, headers=api_headers).get_json()
+        pages.append([item[cursor_key] for item in body[items_key]])
+        after = body['next_cursor']
+        if after is None:
+            return pages
+
+
+def test_tokens_pages_to_the_end(client, api_headers):
+    assert walk(client, api_headers, '/api/tokens?limit=2', 'tokens', 'token') == [['a', 'b'], ['c', 'd'], ['e']]
+    # Si la última página viene llena, la siguiente vuelve vacía y sin cursor
+    assert walk(client, api_headers, '/api/tokens?limit=5', 'tokens', 'token') == [['a', 'b', 'c', 'd', 'e'], []]
+    body = client.get('/api/tokens', headers=api_headers).get_json()
+    assert (body['total'], body['next_cursor']) == (5, None)
+
+
+def test_tokens_filter_and_projection(client, api_headers):
+    body = client.get('/api/tokens?type=pixel&fields=type', headers=api_headers).get_json()
+    assert body['tokens'] == [{'token': 'b', 'type': 'pixel'}, {'token': 'd', 'type': 'pixel'}]
+    body = client.get('/api/tokens?limit=1&exclude=token,description', headers=api_headers).get_json()
+    # El cursor no se puede excluir
+    assert body['tokens'][0]['token'] == 'a' and 'description' not in body['tokens'][0]
+    assert body['next_cursor'] == 'a'
+
+
+def test_hit_history_pages_to_the_end(client, api_headers):
+    pages = walk(client, api_headers, '/api/tokens/a?limit=2', 'hit_history', 'id')
+    assert pages == [[1, 2], [3, 4], [5]]
+    body = client.get('/api/tokens/a?ip=10.0.0.1&fields=ip', headers=api_headers).get_json()
+    assert body['hit_history'] == [{'id': 2, 'token': 'a', 'ip': '10.0.0.1'}, {'id': 4, 'token': 'a', 'ip': '10.0.0.1'}]
+
+
+def test_ndjson_pages(client, api_headers):
+    response = client.get('/api/tokens?format=ndjson&limit=3', headers=api_headers)
+    assert response.mimetype == 'application/x-ndjson'
+    assert [token['token'] for token in ndjson(response)] == ['a', 'b', 'c']
+    response = client.get('/api/tokens?format=ndjson&after=c', headers=api_headers)
+    assert [token['token'] for token in ndjson(response)] == ['d', 'e']
+
+    response = client.get('/api/tokens/a?format=ndjson&after=3&exclude=headers', headers=api_headers)
+    hits = ndjson(response)
+    assert [hit['id'] for hit in hits] == [4, 5]
+    assert 'headers' not in hits[0]
+
+
+def test_limit_is_clamped_and_validated(server, client, api_headers, monkeypatch):
+    monkeypatch.setattr(server, 'MAX_PAGE_SIZE', 2)
+    body = client.get('/api/tokens?limit=100', headers=api_headers).get_json()
+    assert [token['token'] for token in body['tokens']] == ['a', 'b']
+    assert body['next_cursor'] == 'b'
+
+    assert client.get('/api/tokens?limit=x', headers=api_headers).status_code == 400
+    assert client.get('/api/tokens/zzz', headers=api_headers).status_code == 404
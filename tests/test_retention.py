@@ -0,0 +1,139 @@
+import gzip
+import json
+
+import pytest
+
+from storage import HitArchiver, HyperLogLog, create_storage
+
+
+def make_token(token_id):
+    return {'token': token_id, 'type': 'link', 'description': 'test', 'created_at': '2024-01-01T00:00:00-03:00',
+            'hits': 0, 'last_hit': None}
+
+
+def make_hit(token_id, day, minute=0, ip='10.0.0.1'):
+    return {'token': token_id, 'timestamp': f'2024-01-{day:02d}T10:{minute:02d}:00-03:00', 'ip': ip,
+            'user_agent': 'test', 'headers': {'User-Agent': 'test'}}
+
+
+def open_storage(tmp_path, backend):
+    storage = create_storage(backend, str(tmp_path / ('db.json' if backend == 'json' else 'db.sqlite3')))
+    storage.load()
+    return storage
+
+
+def read_archive(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def backend(request):
+    return request.param
+
+
+def test_archives_hits_before_date(tmp_path, backend):
+    storage = open_storage(tmp_path, backend)
+    storage.save_tokens([make_token('a'), make_token('b')])
+    storage.add_hits([make_hit('a', 1), make_hit('a', 1, 5, ip='10.0.0.2'), make_hit('b', 2), make_hit('a', 3)])
+    storage.add_hit_repeats([('a', 1, 2, make_hit('a', 1, 30)['timestamp'])])
+
+    archiver = HitArchiver(storage, tmp_path / 'archive')
+    assert archiver.run(before='2024-01-03') == 3
+    assert [hit['id'] for hit in storage.iter_hits()] == [4]
+    assert [hit['id'] for hit in read_archive(tmp_path / 'archive' / 'hits-2024-01-01.ndjson.gz')] == [1, 2]
+    assert [hit['id'] for hit in read_archive(tmp_path / 'archive' / 'hits-2024-01-02.ndjson.gz')] == [3]
+
+    rollup = storage.get_rollup('a')
+    # Las repeticiones cuentan como hits archivados
+    assert rollup['archived_hits'] == 4
+    assert rollup['days'] == {'2024-01-01': 4}
+    assert rollup['first_seen'] == make_hit('a', 1)['timestamp']
+    assert rollup['last_seen'] == make_hit('a', 1, 30)['timestamp']
+    assert rollup['distinct_ips'] == 2
+    assert storage.get_rollup('b')['archived_hits'] == 1
+    # Los agregados no se recalculan al archivar
+    assert storage.get_hit_stats()['hits'] == 4
+    assert archiver.run(before='2024-01-03') == 0
+    storage.close()
+
+    reopened = open_storage(tmp_path, backend)
+    assert reopened.count_hits() == 1
+    assert reopened.list_rollups() == {'a': rollup, 'b': reopened.get_rollup('b')}
+    assert reopened.get_token('a')['hits'] == 5
+    reopened.close()
+
+
+def test_keep_per_token_accumulates_rollup(tmp_path, backend):
+    storage = open_storage(tmp_path, backend)
+    storage.save_tokens([make_token('a'), make_token('b')])
+    storage.add_hits([make_hit('a', 1, minute, ip=f'10.0.0.{minute}') for minute in range(5)])
+    storage.add_hits([make_hit('b', 1)])
+
+    archiver = HitArchiver(storage, tmp_path / 'archive')
+    assert archiver.run(keep_per_token=2) == 3
+    assert [hit['id'] for hit in storage.get_hits('a')] == [4, 5]
+    assert [hit['id'] for hit in storage.get_hits('b')] == [6]
+    assert storage.get_rollup('b') is None
+
+    storage.add_hits([make_hit('a', 2, minute, ip=f'10.0.0.{minute}') for minute in range(2)])
+    assert archiver.run(keep_per_token=2) == 2
+    assert [hit['id'] for hit in storage.get_hits('a')] == [7, 8]
+    rollup = storage.get_rollup('a')
+    assert rollup['archived_hits'] == 5
+    assert rollup['days'] == {'2024-01-01': 5}
+    # Las IPs de la segunda pasada ya estaban en el HyperLogLog del rollup
+    assert rollup['distinct_ips'] == 5
+    storage.close()
+
+    reopened = open_storage(tmp_path, backend)
+    assert [hit['id'] for hit in reopened.get_hits('a')] == [7, 8]
+    assert reopened.get_rollup('a') == rollup
+    reopened.close()
+
+
+def test_without_policy_nothing_is_archived(tmp_path, backend):
+    storage = open_storage(tmp_path, backend)
+    storage.save_token(make_token('a'))
+    storage.add_hits([make_hit('a', 1)])
+    assert HitArchiver(storage, tmp_path / 'archive').run() == 0
+    assert storage.count_hits() == 1
+    storage.close()
+
+
+def test_token_detail_exposes_public_rollup(server, api_headers, tmp_path):
+    server.db.save_token(make_token('a'))
+    server.db.add_hits([make_hit('a', 1), make_hit('a', 2)])
+    HitArchiver(server.db, tmp_path / 'archive').run(keep_per_token=1)
+
+    response = server.app.test_client().get('/api/tokens/a', headers=api_headers)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [hit['id'] for hit in body['hit_history']] == [2]
+    assert body['rollup']['archived_hits'] == 1
+    assert 'ips_hll' not in body['rollup']
+
+
+def test_hyperloglog_estimate_and_merge():
+    first, second = HyperLogLog(), HyperLogLog()
+    for index in range(5000):
+        first.add(f'10.0.{index // 256}.{index % 256}')
+        second.add(f'10.1.{index // 256}.{index % 256}')
+    # Error típico con p=10: ~3%
+    assert abs(first.count() - 5000) < 5000 * 0.1
+
+    restored = HyperLogLog.from_string(first.to_string())
+    assert restored.p == first.p and restored.count() == first.count()
+    restored.merge(second)
+    assert abs(restored.count() - 10000) < 10000 * 0.1
+
+    with pytest.raises(ValueError):
+        restored.merge(HyperLogLog(p=8))
+
+
+def test_hyperloglog_small_counts_are_exact():
+    hll = HyperLogLog()
+    for ip in ['10.0.0.1', '10.0.0.2', '10.0.0.1', '10.0.0.3']:
+        hll.add(ip)
+    assert hll.count() == 3
+    assert HyperLogLog().count() == 0
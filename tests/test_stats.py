@@ -0,0 +1,93 @@
+import pytest
+
+from storage import JsonStorage, create_storage
+
+
+def make_token(token_id, description='test', token_type='link', created_minute=0):
+    return {'token': token_id, 'type': token_type, 'description': description,
+            'created_at': f'2024-01-01T00:{created_minute:02d}:00-03:00', 'hits': 0, 'last_hit': None}
+
+
+def make_hit(token_id, hour, minute=0, ip='10.0.0.1', user_agent='test'):
+    return {'token': token_id, 'timestamp': f'2024-01-01T{hour:02d}:{minute:02d}:00-03:00', 'ip': ip,
+            'user_agent': user_agent, 'headers': {'User-Agent': user_agent}}
+
+
+def open_storage(tmp_path, backend):
+    storage = create_storage(backend, str(tmp_path / ('db.json' if backend == 'json' else 'db.sqlite3')))
+    storage.load()
+    return storage
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def storage(tmp_path, request):
+    storage = open_storage(tmp_path, request.param)
+    storage.save_tokens([
+        make_token('aaa', 'Planilla de Sueldos', created_minute=1),
+        make_token('bbb', 'backup VPN', 'pixel', created_minute=2),
+        make_token('ccc', 'sueldos 2024', created_minute=3),
+        make_token('ddd', None, 'pixel', created_minute=4),
+    ])
+    storage.add_hits([make_hit('aaa', 10), make_hit('ccc', 11), make_hit('ccc', 12), make_hit('bbb', 13)])
+    yield storage
+    storage.close()
+
+
+# --- Agregados (storage) ---
+
+def test_hit_stats_per_token_and_global(storage, tmp_path):
+    storage.add_hits([make_hit('ccc', 12, 30, ip='10.0.0.2', user_agent='curl')])
+    storage.add_hit_repeats([('ccc', 2, 3, make_hit('ccc', 12, 45)['timestamp'])])
+
+    stats = storage.get_hit_stats('ccc')
+    assert (stats['hits'], stats['repeats']) == (3, 3)
+    assert stats['first_seen'] == make_hit('ccc', 11)['timestamp']
+    assert stats['last_seen'] == make_hit('ccc', 12, 45)['timestamp']
+    assert stats['distinct_ips'] == 2
+    assert stats['hits_per_hour'] == {'2024-01-01T11': 1, '2024-01-01T12': 5}
+    assert stats['hits_per_day'] == {'2024-01-01': 6}
+    assert stats['top_user_agents'] == [{'user_agent': 'test', 'hits': 2}, {'user_agent': 'curl', 'hits': 1}]
+
+    global_stats = storage.get_hit_stats()
+    assert (global_stats['hits'], global_stats['repeats']) == (5, 3)
+    assert global_stats['distinct_ips'] == 2
+    assert storage.get_hit_stats('ddd') is None
+
+    backend = 'json' if isinstance(storage, JsonStorage) else 'sqlite'
+    storage.close()
+    reopened = open_storage(tmp_path, backend)
+    assert reopened.get_hit_stats('ccc') == stats
+    assert reopened.get_hit_stats() == global_stats
+    reopened.close()
+
+
+# --- API de estadísticas ---
+
+def test_stats_endpoints(server, api_headers):
+    server.db.save_tokens([make_token('aaa'), make_token('bbb')])
+    server.db.add_hits([make_hit('aaa', 10), make_hit('aaa', 11, ip='10.0.0.2'), make_hit('bbb', 12)])
+    client = server.app.test_client()
+
+    body = client.get('/api/tokens/aaa/stats', headers=api_headers).get_json()
+    assert (body['token'], body['type'], body['hits'], body['distinct_ips']) == ('aaa', 'link', 2, 2)
+    assert body['hits_per_hour'] == {'2024-01-01T10': 1, '2024-01-01T11': 1}
+
+    body = client.get('/api/stats', headers=api_headers).get_json()
+    assert (body['tokens'], body['hits'], body['distinct_ips']) == (2, 3, 2)
+
+    assert client.get('/api/tokens/zzz/stats', headers=api_headers).status_code == 404
+    assert client.get('/api/stats').status_code == 401
+
+
+def test_stats_of_token_without_hits(server, api_headers):
+    server.db.save_token(make_token('aaa'))
+    body = server.app.test_client().get('/api/tokens/aaa/stats', headers=api_headers).get_json()
+    assert (body['hits'], body['distinct_ips'], body['first_seen']) == (0, 0, None)
+
+
+@pytest.mark.parametrize('query', ['limit=x', 'since=ayer', 'after=1.5', 'until=2024-13-01'])
+def test_hit_query_validation(server, api_headers, query):
+    server.db.save_token(make_token('aaa'))
+    response = server.app.test_client().get(f'/api/tokens/aaa?{query}', headers=api_headers)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,118 @@
+import sys
+import threading
+
+import pytest
+
+import tokensnare_migrate
+from storage import create_storage
+
+
+def make_token(token_id, token_type='link'):
+    return {'token': token_id, 'type': token_type, 'description': f'token {token_id}',
+            'created_at': '2024-01-01T00:00:00-03:00', 'hits': 0, 'last_hit': None}
+
+
+def make_hit(token_id, minute, ip='10.0.0.1'):
+    return {'token': token_id, 'timestamp': f'2024-01-01T10:{minute:02d}:00-03:00', 'ip': ip,
+            'user_agent': 'test', 'headers': {'User-Agent': 'test'}}
+
+
+def db_path(tmp_path, backend):
+    return str(tmp_path / ('db.json' if backend == 'json' else 'db.sqlite3'))
+
+
+def open_storage(backend, path):
+    storage = create_storage(backend, path)
+    storage.load()
+    return storage
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_round_trip(tmp_path, backend):
+    path = db_path(tmp_path, backend)
+    storage = open_storage(backend, path)
+    storage.save_tokens([make_token('a'), make_token('b', 'pixel')])
+    storage.add_hits([make_hit('a', minute) for minute in range(5)] + [make_hit('b', 9, ip='10.0.0.2')])
+    assert not storage.add_hit(make_hit('missing', 1))
+
+    first_page = list(storage.query_hits('a', limit=2))
+    assert [hit['id'] for hit in first_page] == [1, 2]
+    assert [hit['id'] for hit in storage.query_hits('a', after=first_page[-1]['id'], limit=2)] == [3, 4]
+    assert [hit['id'] for hit in storage.query_hits('b', ip='10.0.0.2')] == [6]
+    assert [token['token'] for token in storage.query_tokens(token_type='pixel')] == ['b']
+    assert storage.get_token('a')['hits'] == 5
+
+    assert storage.delete_token('b')
+    assert not storage.delete_token('b')
+    storage.close()
+
+    reopened = open_storage(backend, path)
+    assert [token['token'] for token in reopened.list_tokens()] == ['a']
+    assert reopened.count_hits() == 5
+    assert reopened.get_hits('a')[0]['headers'] == {'User-Agent': 'test'}
+    assert reopened.get_token('a')['last_hit'] == make_hit('a', 4)['timestamp']
+    assert reopened.last_hit_id() == 6
+    reopened.close()
+
+
+def test_sqlite_releases_thread_connections(tmp_path):
+    storage = open_storage('sqlite', db_path(tmp_path, 'sqlite'))
+    storage.save_token(make_token('a'))
+
+    def worker():
+        storage.has_token('a')
+
+    for _ in range(5):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+    # Las conexiones de los hilos terminados se cierran al abrir una nueva
+    assert len(storage._connections) <= 2
+
+    storage.release_thread()
+    assert threading.current_thread() not in storage._connections
+    assert storage.has_token('a')
+    storage.close()
+
+
+def test_requests_release_sqlite_connection(server, monkeypatch, tmp_path, api_headers):
+    storage = open_storage('sqlite', db_path(tmp_path, 'sqlite'))
+    monkeypatch.setattr(server, 'db', storage)
+    client = server.app.test_client()
+
+    assert client.get('/api/tokens', headers=api_headers).status_code == 200
+    assert storage._connections == {}
+    storage.close()
+
+
+def test_migrate_json_to_sqlite(tmp_path, monkeypatch):
+    source = open_storage('json', db_path(tmp_path, 'json'))
+    source.save_tokens([make_token('a'), make_token('b')])
+    source.add_hits([make_hit('a', 1), make_hit('b', 2), make_hit('a', 3)])
+    source.add_hit_repeats([('a', 1, 2, make_hit('a', 4)['timestamp'])])
+    source.close()
+
+    monkeypatch.setattr(sys, 'argv', ['tokensnare_migrate.py', '--from', 'json', '--to', 'sqlite',
+                                      '--from-file', db_path(tmp_path, 'json'),
+                                      '--to-file', db_path(tmp_path, 'sqlite')])
+    tokensnare_migrate.main()
+
+    target = open_storage('sqlite', db_path(tmp_path, 'sqlite'))
+    assert {token['token']: token['hits'] for token in target.list_tokens()} == {'a': 4, 'b': 1}
+    assert [hit['id'] for hit in target.iter_hits()] == [1, 2, 3]
+    assert target.get_hits('a')[0]['repeats'] == 2
+    assert (target.get_hit_stats()['hits'], target.get_hit_stats()['repeats']) == (3, 2)
+    target.close()
+
+
+def test_migrate_refuses_non_empty_target(tmp_path, monkeypatch):
+    for backend in ('json', 'sqlite'):
+        storage = open_storage(backend, db_path(tmp_path, backend))
+        storage.save_token(make_token(backend))
+        storage.close()
+
+    monkeypatch.setattr(sys, 'argv', ['tokensnare_migrate.py', '--from', 'json', '--to', 'sqlite',
+                                      '--from-file', db_path(tmp_path, 'json'),
+                                      '--to-file', db_path(tmp_path, 'sqlite')])
+    with pytest.raises(SystemExit):
+        tokensnare_migrate.main()
@@ -0,0 +1,190 @@
+import asyncio
+import json
+
+import pytest
+
+from storage import HitBroker
+
+
+def make_token(token_id):
+    return {'token': token_id, 'type': 'link', 'description': 'test', 'created_at': '2024-01-01T00:00:00-03:00',
+            'hits': 0, 'last_hit': None}
+
+
+def make_hit(token_id, minute):
+    return {'token': token_id, 'timestamp': f'2024-01-01T10:{minute:02d}:00-03:00', 'ip': '10.0.0.1',
+            'user_agent': 'test', 'headers': {'User-Agent': 'test'}}
+
+
+def parse_sse(text):
+    """Lista de (event, id, data) de los mensajes SSE; los comentarios son ('keepalive', None, None)."""
+    messages = []
+    for block in text.split('\n\n'):
+        if not block:
+            continue
+        if block.startswith(':'):
+            messages.append(('keepalive', None, None))
+            continue
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        messages.append((fields['event'], fields.get('id'), json.loads(fields['data'])))
+    return messages
+
+
+@pytest.fixture
+def stream_server(server, monkeypatch):
+    monkeypatch.setattr(server, 'hit_broker', HitBroker(buffer_size=2, max_subscribers=1))
+    monkeypatch.setattr(server, 'STREAM_KEEPALIVE', 0.01)
+    server.db.save_tokens([make_token('a'), make_token('b')])
+    server.db.add_hits([make_hit('a', 1), make_hit('b', 2), make_hit('a', 3)])
+    return server
+
+
+# --- Broker ---
+
+def test_broker_fans_out_and_filters_by_token():
+    broker = HitBroker(buffer_size=10)
+    everything = broker.subscribe()
+    only_a = broker.subscribe('a')
+    notified = []
+    woken = broker.subscribe(notify=lambda: notified.append(True))
+
+    broker.publish([{'id': 1, 'token': 'a'}, {'id': 2, 'token': 'b'}])
+    assert everything.get(0) == ([{'id': 1, 'token': 'a'}, {'id': 2, 'token': 'b'}], 0)
+    assert only_a.get(0) == ([{'id': 1, 'token': 'a'}], 0)
+    assert notified == [True]
+    assert len(woken.get(0)[0]) == 2
+    assert broker.stats()['published'] == 2
+
+
+def test_slow_subscriber_drops_oldest_events():
+    broker = HitBroker(buffer_size=2)
+    subscription = broker.subscribe()
+    broker.publish([{'id': index, 'token': 'a'} for index in range(1, 6)])
+
+    events, dropped = subscription.get(0)
+    assert [event['id'] for event in events] == [4, 5]
+    assert dropped == 3
+    # Lo descartado se informa una sola vez, el total queda en las stats
+    assert subscription.get(0) == ([], 0)
+    assert broker.stats()['dropped'] == 3
+
+
+def test_subscriber_cap_and_close():
+    broker = HitBroker(max_subscribers=1)
+    subscription = broker.subscribe()
+    assert broker.subscribe() is None
+    broker.unsubscribe(subscription)
+    assert subscription.closed
+    assert broker.subscribe() is not None
+
+    broker.close()
+    assert broker.stats()['subscribers'] == 0
+
+
+# --- /api/stream (Flask) ---
+
+def open_stream(server, api_headers, query='', headers=None):
+    client = server.app.test_client()
+    return client.get(f'/api/stream{query}', headers={**api_headers, **(headers or {})}, buffered=False)
+
+
+def read_messages(chunks, count, keepalive=False):
+    """Los próximos 'count' mensajes del stream (sin los keepalive, salvo que se pidan)."""
+    messages = []
+    while len(messages) < count:
+        messages.extend(message for message in parse_sse(next(chunks).decode())
+                        if keepalive or message[0] != 'keepalive')
+    return messages
+
+
+@pytest.mark.parametrize('query, headers', [('?after=1', None), ('', {'Last-Event-ID': '1'})])
+def test_stream_replays_stored_hits_then_live(stream_server, api_headers, query, headers):
+    response = open_stream(stream_server, api_headers, query, headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+
+    assert [(event, event_id) for event, event_id, _ in read_messages(chunks, 2)] == [('hit', '2'), ('hit', '3')]
+    stream_server.persist_hits([make_hit('b', 4)])
+    event, event_id, data = read_messages(chunks, 1)[0]
+    assert (event, event_id) == ('hit', '4')
+    assert (data['token'], data['type']) == ('b', 'link')
+
+    response.close()
+    assert stream_server.hit_broker.stats()['subscribers'] == 0
+
+
+def test_stream_sends_keepalive_when_idle(stream_server, api_headers):
+    response = open_stream(stream_server, api_headers, '?token=a')
+    assert read_messages(iter(response.response), 1, keepalive=True) == [('keepalive', None, None)]
+    response.close()
+
+
+def test_stream_reports_dropped_events(stream_server, api_headers):
+    response = open_stream(stream_server, api_headers)
+    stream_server.hit_broker.publish([{'id': index, 'token': 'a'} for index in range(10, 15)])
+
+    messages = read_messages(iter(response.response), 3)
+    assert messages[0] == ('dropped', None, {'count': 3})
+    assert [event_id for _, event_id, _ in messages[1:]] == ['13', '14']
+    response.close()
+
+
+def test_stream_subscriber_cap(stream_server, api_headers):
+    first = open_stream(stream_server, api_headers)
+    second = open_stream(stream_server, api_headers)
+    assert second.status_code == 503
+    first.close()
+    assert open_stream(stream_server, api_headers).status_code == 200
+
+
+def test_stream_rejects_bad_cursor(stream_server, api_headers):
+    assert open_stream(stream_server, api_headers, '?after=x').status_code == 400
+    assert open_stream(stream_server, {}).status_code == 401
+
+
+# --- /api/stream (ASGI) ---
+
+def run_stream(app, query, done, headers=()):
+    """Corre el stream ASGI hasta que done(texto recibido) es verdadero y el cliente se desconecta."""
+    sent = []
+
+    def text():
+        return ''.join(message.get('body', b'').decode() for message in sent[1:])
+
+    async def receive():
+        while not done(text()):
+            await asyncio.sleep(0.01)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'path': '/api/stream', 'method': 'GET', 'query_string': query.encode(),
+             'headers': [(b'authorization', b'Bearer test-api-key'), *headers], 'client': ('10.0.0.1', 1234)}
+    asyncio.run(asyncio.wait_for(app(scope, receive, send), 5))
+    return sent[0], parse_sse(text())
+
+
+def test_async_stream_replays_and_keeps_alive(stream_server):
+    import tokensnare_async
+
+    start, messages = run_stream(tokensnare_async.app, 'after=1', lambda text: ': keepalive' in text)
+    assert start['status'] == 200
+    assert [(event, event_id) for event, event_id, _ in messages[:2]] == [('hit', '2'), ('hit', '3')]
+    assert messages[2] == ('keepalive', None, None)
+    assert stream_server.hit_broker.stats()['subscribers'] == 0
+
+
+def test_async_stream_live_hits_and_drops(stream_server):
+    import tokensnare_async
+
+    def done(text):
+        if not stream_server.hit_broker.stats()['published']:
+            stream_server.hit_broker.publish([{'id': index, 'token': 'a'} for index in range(10, 15)])
+        return 'id: 14' in text
+
+    _, messages = run_stream(tokensnare_async.app, '', done, [(b'last-event-id', b'3')])
+    messages = [message for message in messages if message[0] != 'keepalive']
+    assert messages == [('dropped', None, {'count': 3}), ('hit', '13', {'id': 13, 'token': 'a'}),
+                        ('hit', '14', {'id': 14, 'token': 'a'})]
@@ -0,0 +1,141 @@
+import io
+import re
+import zipfile
+
+import pytest
+from docx import Document
+from pypdf import PdfReader
+
+from generators.binary_gen import PLACEHOLDER, BinaryTemplate
+from generators.docx_gen import build_docx_template, patch_docx_template
+from generators.epub_gen import build_epub_template, patch_epub_template
+from generators.pdf_gen import build_pdf_template, patch_pdf_template
+from generators.templates import PLACEHOLDER_CREATED, PLACEHOLDER_MODIFIED, PLACEHOLDER_URL, PdfTemplate, ZipTemplate
+from generators.xlsx_gen import build_xlsx_template, patch_xlsx_template
+
+
+def token_data(token_id):
+    base = 'http://tokensnare.test:5000'
+    return {'token': token_id, 'tracking_url_image': f'{base}/image/{token_id}.png',
+            'tracking_url_link': f'{base}/link/{token_id}'}
+
+
+def zip_text(data):
+    """Contenido de todos los miembros del ZIP (valida los CRC al leerlos)."""
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        assert z.testzip() is None
+        return {name: z.read(name).decode('utf-8', 'replace') for name in z.namelist()}
+
+
+def check_pdf_xref(data):
+    """startxref apunta a la tabla y cada objeto en uso empieza exactamente en su offset."""
+    xref_offset = int(re.search(rb"startxref\s+(\d+)\s+%%EOF\s*$", data).group(1))
+    table = re.match(rb"xref\s+0 (\d+)\s*\n", data[xref_offset:])
+    assert table is not None
+    entries = data[xref_offset + table.end():]
+    for number in range(int(table.group(1))):
+        entry = entries[number * 20:number * 20 + 20]
+        if entry[17:18] == b'n':
+            offset, generation = int(entry[:10]), int(entry[11:16])
+            assert data[offset:].startswith(f"{number} {generation} obj".encode())
+    return PdfReader(io.BytesIO(data), strict=True)
+
+
+ZIP_FORMATS = {
+    'docx': (build_docx_template, patch_docx_template, 'tracking_url_image'),
+    'xlsx': (build_xlsx_template, patch_xlsx_template, 'tracking_url_image'),
+    'epub': (build_epub_template, patch_epub_template, 'tracking_url_image'),
+}
+
+
+@pytest.mark.parametrize('file_type', sorted(ZIP_FORMATS))
+def test_zip_document_is_patched_per_token(file_type):
+    build, patch, url_field = ZIP_FORMATS[file_type]
+    template = build("Informe Q3", "Finanzas", "Contenido confidencial")
+    first = zip_text(patch(template, token_data('tok000001')))
+    second = zip_text(patch(template, token_data('tok000002')))
+
+    first_text = ''.join(first.values())
+    assert token_data('tok000001')[url_field] in first_text
+    assert token_data('tok000002')[url_field] not in first_text
+    assert token_data('tok000002')[url_field] in ''.join(second.values())
+    for placeholder in (PLACEHOLDER_URL, PLACEHOLDER_CREATED, PLACEHOLDER_MODIFIED):
+        assert placeholder not in first_text
+    # Los miembros sin reemplazos son idénticos entre tokens
+    assert first.keys() == second.keys()
+
+
+def test_docx_still_opens():
+    template = build_docx_template("Informe", "Autor", "Texto del documento")
+    document = Document(io.BytesIO(patch_docx_template(template, token_data('tok000001'))))
+    assert any("Texto del documento" in paragraph.text for paragraph in document.paragraphs)
+    assert document.core_properties.author == "Autor"
+
+
+def test_pdf_is_patched_with_valid_xref():
+    template = build_pdf_template("Informe", "Autor", "Contenido")
+    data = patch_pdf_template(template, token_data('tok000001'))
+    assert PLACEHOLDER_URL.encode() not in data
+    reader = check_pdf_xref(data)
+    assert reader.metadata.author == "Autor"
+    action = reader.trailer['/Root']['/OpenAction']
+    assert action['/URI'] == token_data('tok000001')['tracking_url_link']
+
+
+def test_zip_template_moves_patched_members_to_the_end():
+    source = io.BytesIO()
+    with zipfile.ZipFile(source, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('a.xml', '<a>fijo</a>' * 50)
+        z.writestr('b.xml', '<b>URL</b>')
+        z.writestr('c.xml', '<c>fijo</c>')
+    template = ZipTemplate(source.getvalue(), ['b.xml'])
+
+    data = template.render({b'URL': b'http://valor-mucho-mas-largo-que-el-relleno/'})
+    members = zip_text(data)
+    assert members == {'a.xml': '<a>fijo</a>' * 50, 'c.xml': '<c>fijo</c>',
+                       'b.xml': '<b>http://valor-mucho-mas-largo-que-el-relleno/</b>'}
+
+
+def test_zip_template_requires_patched_members():
+    source = io.BytesIO()
+    with zipfile.ZipFile(source, 'w') as z:
+        z.writestr('a.xml', 'x')
+    with pytest.raises(ValueError):
+        ZipTemplate(source.getvalue(), ['missing.xml'])
+
+
+@pytest.mark.parametrize('value', [b'()', b'(corto)', b'(' + b'x' * 500 + b')'])
+def test_pdf_template_recomputes_offsets(value):
+    template = build_pdf_template("T", "A", "C")
+    assert isinstance(template, PdfTemplate)
+    # Valores más cortos y más largos que el relleno corren los objetos siguientes
+    check_pdf_xref(template.render({key: value for key in template.keys}))
+
+
+def make_binary_template(path):
+    data = b'\x7fELF' + b'\x01' * 1000 + PLACEHOLDER + b'\x02' * 5000 + PLACEHOLDER + b'\x03' * 100
+    path.write_bytes(data)
+    return data
+
+
+@pytest.mark.parametrize('copy_file_range', [True, False])
+def test_binary_template_pads_url_in_every_placeholder(tmp_path, copy_file_range):
+    original = make_binary_template(tmp_path / 'template')
+    template = BinaryTemplate(str(tmp_path / 'template'))
+    template._use_copy_file_range = copy_file_range and template._use_copy_file_range
+    url = token_data('tok000001')['tracking_url_link'].encode()
+    template.write(str(tmp_path / 'out'), url)
+
+    padded = url + b'\x00' * (len(PLACEHOLDER) - len(url))
+    assert (tmp_path / 'out').read_bytes() == original.replace(PLACEHOLDER, padded)
+
+
+def test_binary_template_rejects_long_url_and_missing_placeholder(tmp_path):
+    make_binary_template(tmp_path / 'template')
+    template = BinaryTemplate(str(tmp_path / 'template'))
+    with pytest.raises(ValueError):
+        template.write(str(tmp_path / 'out'), b'x' * (len(PLACEHOLDER) + 1))
+
+    (tmp_path / 'empty').write_bytes(b'\x00' * 64)
+    with pytest.raises(Exception):
+        BinaryTemplate(str(tmp_path / 'empty'))
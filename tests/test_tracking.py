@@ -0,0 +1,49 @@
+import pytest
+
+
+@pytest.fixture
+def client(server):
+    server.db.save_token({'token': 'a', 'type': 'link', 'description': 'test',
+                          'created_at': '2024-01-01T00:00:00-03:00', 'hits': 0, 'last_hit': None})
+    return server.app.test_client()
+
+
+def test_known_token_hit_is_stored(server, client):
+    response = client.get('/image/a.png', headers={'User-Agent': 'lector'})
+    assert response.status_code == 200
+    assert response.data == server.TRANSPARENT_PNG
+    hits = server.db.get_hits('a')
+    assert [(hit['token'], hit['user_agent']) for hit in hits] == [('a', 'lector')]
+    assert server.db.get_token('a')['hits'] == 1
+
+
+def test_unknown_token_gets_same_response_without_storing(server, client):
+    known = client.get('/image/a.png')
+    unknown = client.get('/image/desconocido.png')
+    assert unknown.status_code == known.status_code
+    assert unknown.data == known.data
+    assert client.get('/link/desconocido').status_code == 204
+    assert server.db.count_hits() == 1
+
+
+def test_pixel_revalidation(server, client, monkeypatch):
+    monkeypatch.setattr(server, 'PIXEL_CACHE_MODE', 'revalidate')
+    monkeypatch.setattr(server, 'PIXEL_HEADERS', server.build_pixel_headers('revalidate', 0))
+    response = client.get('/image/a.png', headers={'If-None-Match': server.PIXEL_ETAG})
+    assert response.status_code == 304
+    # Cada revalidación cuenta como apertura
+    assert server.db.get_token('a')['hits'] == 1
+
+
+def test_clone_logo_saves_token_only_when_new_or_changed(server, client, monkeypatch):
+    saved = []
+    save_token = server.db.save_token
+    monkeypatch.setattr(server.db, 'save_token', lambda record: (saved.append(record['description']),
+                                                                 save_token(record)))
+    for referer in ('http://clon.test/', 'http://clon.test/otra', 'http://otro.test/'):
+        assert client.get('/assets/honey_logo.svg', headers={'Referer': referer}).status_code == 200
+    client.get('/assets/honey_logo.svg', headers={'Referer': 'http://localhost/'})
+
+    assert saved == ["Sitio clonado detectado desde clon.test", "Sitio clonado detectado desde otro.test"]
+    token = server.db.get_token(server.generate_token_id("WEBSITE_CLONE_PROTECION_CSS"))
+    assert token['hits'] == 3
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+TokenSnare Async
+Frontend ASGI para los endpoints de tracking.
+
+Atiende /image/<token>.png, /link/<token> y /api/callback en el event loop,
+sin un hilo por conexión, así puede sostener muchas conexiones lentas
+(lectores de documentos con mala red). /api/stream (hits en vivo) también
+se sirve desde el event loop, porque cada suscriptor es una conexión larga.
+
+Los hits se encolan sin bloquear en la cola de ingesta del servidor y las
+escrituras al storage quedan en el hilo escritor. El resto de las rutas
+(admin, API, sitio demo) las sigue respondiendo la app Flask, montada en
+el mismo proceso para que compartan el storage.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import textwrap
+import time
+from itertools import islice
+from urllib.parse import parse_qs
+
+import uvicorn
+from a2wsgi import WSGIMiddleware
+
+import tokensnare_server as server
+from storage import STORAGE_BACKENDS
+
+# Hilos para las rutas que caen en la app Flask (admin y API)
+WSGI_WORKERS = 10
+
+CALLBACK_ALLOWED_HEADERS = "Content-Type, X-Cloned-Domain, X-Cloned-Url, X-Screen-Res"
+
+INGEST_QUEUE_REQUIRED = "El frontend ASGI requiere la cola de ingesta (INGEST_QUEUE_SIZE > 0)"
+
+flask_app = WSGIMiddleware(server.app, workers=WSGI_WORKERS)
+
+
+def _headers_from_scope(scope):
+    """Headers del request con el mismo formato que dict(request.headers) en Flask."""
+    headers = {}
+    for raw_name, raw_value in scope['headers']:
+        name = raw_name.decode('latin-1').title()
+        value = raw_value.decode('latin-1')
+        headers[name] = f"{headers[name]}, {value}" if name in headers else value
+    return headers
+
+
+def _header(scope, name):
+    """Primer valor del header 'name' (los nombres llegan en minúscula en ASGI)."""
+    raw_name = name.lower().encode('latin-1')
+    for header_name, value in scope['headers']:
+        if header_name == raw_name:
+            return value.decode('latin-1')
+    return None
+
+
+def _remote_addr(scope):
+    client = scope.get('client')
+    return client[0] if client else None
+
+
+async def _respond(send, status, body=b'', content_type=None, extra_headers=()):
+    headers = [(b'content-length', str(len(body)).encode())]
+    if content_type:
+        headers.append((b'content-type', content_type.encode()))
+    headers.extend((name.encode(), value.encode()) for name, value in extra_headers)
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _track(scope, token):
+    started = time.perf_counter()
+    # El chequeo toca el storage (query en sqlite, lock en json): fuera del event loop.
+    # Tokens desconocidos: nada que registrar
+    if not await asyncio.to_thread(server.is_known_token, token):
+        return
+    hit_record = server.build_hit_record(token, _headers_from_scope(scope), _remote_addr(scope))
+    # Sin espera: si la cola está llena el hit se descarta y se cuenta
+    server.submit_hit(hit_record, timeout=0)
+    server.hit_register_latency.observe(time.perf_counter() - started)
+
+
+# Hits guardados que se reenvían por vez al retomar un stream
+STREAM_REPLAY_CHUNK = 500
+
+
+async def _stream(scope, receive, send):
+    """Versión ASGI de /api/stream (ver stream_hits en tokensnare_server.py)."""
+    auth_header = _header(scope, 'Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        server.log_print("Acceso denegado. Se requiere header Authorization: Bearer <API_KEY>", logging.WARNING,
+                         event='auth_failure', ip=_remote_addr(scope), path=scope['path'])
+        body = json.dumps({"error": "Acceso denegado. Se requiere header Authorization: Bearer <API_KEY>"}).encode()
+        await _respond(send, 401, body, content_type='application/json')
+        return
+    supplied_key = auth_header.split(' ')[1]
+    if not server.API_KEY or supplied_key != server.API_KEY:
+        server.log_print(f"Acceso denegado. API KEY inválida provista {supplied_key}", logging.WARNING,
+                         event='auth_failure', ip=_remote_addr(scope), path=scope['path'])
+        body = json.dumps({"error": "Acceso denegado. Clave de API inválida."}).encode()
+        await _respond(send, 401, body, content_type='application/json')
+        return
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    token = query.get('token', [None])[0]
+    try:
+        after = _header(scope, 'Last-Event-ID') or query.get('after', [None])[0]
+        after = int(after) if after else None
+    except ValueError:
+        body = json.dumps({"error": "Cursor 'after' / Last-Event-ID inválido"}).encode()
+        await _respond(send, 400, body, content_type='application/json')
+        return
+
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    subscription = server.hit_broker.subscribe(token, notify=lambda: loop.call_soon_threadsafe(wake.set))
+    if subscription is None:
+        body = json.dumps({"error": "Demasiadas suscripciones en vivo, reintentar más tarde"}).encode()
+        await _respond(send, 503, body, content_type='application/json')
+        return
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+        wake.set()
+
+    async def write(text):
+        await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        headers = [(b'content-type', b'text/event-stream')]
+        headers.extend((name.encode(), value.encode()) for name, value in server.SSE_HEADERS.items())
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+        last_id = after
+        if after is not None:
+            # La lectura del storage se hace fuera del event loop, de a bloques
+            replay = server.replay_hit_events(after, token)
+            while not disconnected.is_set():
+                events = await asyncio.to_thread(lambda: list(islice(replay, STREAM_REPLAY_CHUNK)))
+                if not events:
+                    break
+                last_id = events[-1]['id']
+                await write(''.join(server.sse_message('hit', event, event['id']) for event in events))
+
+        while not disconnected.is_set() and not subscription.closed:
+            try:
+                await asyncio.wait_for(wake.wait(), server.STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                await write(server.SSE_KEEPALIVE_MESSAGE)
+                continue
+            wake.clear()
+            events, dropped = subscription.get(0)
+            messages = [server.sse_message('dropped', {'count': dropped})] if dropped else []
+            messages.extend(server.sse_message('hit', event, event['id']) for event in events
+                            if last_id is None or event['id'] > last_id)
+            if messages:
+                await write(''.join(messages))
+        if not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        watcher.cancel()
+        server.hit_broker.unsubscribe(subscription)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if server.ingest_queue is None:
+                # Sin cola, submit_hit escribiría en el storage y alertaría dentro del event loop
+                await send({'type': 'lifespan.startup.failed', 'message': INGEST_QUEUE_REQUIRED})
+                return
+            server.start_logging()
+            server.start_retention()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Vacía la cola de ingesta antes de terminar
+            await asyncio.to_thread(server.shutdown)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    path = scope['path']
+    method = scope['method']
+    started = time.perf_counter()
+
+    if path.startswith('/image/') and path.endswith('.png') and method in ('GET', 'OPTIONS'):
+        token = path[len('/image/'):-len('.png')]
+        if token and '/' not in token:
+            if method == 'OPTIONS':
+                await _respond(send, 204)
+                return
+            await _track(scope, token)
+            if server.pixel_not_modified(_header(scope, 'If-None-Match')):
+                status = 304
+                await _respond(send, status, extra_headers=server.PIXEL_HEADERS)
+            else:
+                status = 200
+                await _respond(send, status, server.TRANSPARENT_PNG, extra_headers=server.PIXEL_HEADERS)
+            server.record_request('/image/<token>.png', method, status, time.perf_counter() - started)
+            return
+
+    if path.startswith('/link/') and method in ('GET', 'OPTIONS'):
+        token = path[len('/link/'):]
+        if token and '/' not in token:
+            if method == 'GET':
+                await _track(scope, token)
+            await _respond(send, 204)
+            server.record_request('/link/<token>', method, 204, time.perf_counter() - started)
+            return
+
+    # Los streams son conexiones largas, no se cuentan en las latencias
+    if path == '/api/stream' and method == 'GET':
+        await _stream(scope, receive, send)
+        return
+
+    if path == '/api/callback' and method in ('POST', 'OPTIONS'):
+        if method == 'OPTIONS':
+            await _respond(send, 204, extra_headers=(
+                ('Access-Control-Allow-Origin', '*'),
+                ('Access-Control-Allow-Methods', 'POST, OPTIONS'),
+                ('Access-Control-Allow-Headers', CALLBACK_ALLOWED_HEADERS),
+            ))
+            server.record_request('/api/callback', method, 204, time.perf_counter() - started)
+            return
+        headers = _headers_from_scope(scope)
+        # El alta del token toca el storage, se hace fuera del event loop
+        token_id = await asyncio.to_thread(server.ensure_clone_js_token, headers.get('X-Cloned-Domain'))
+        server.submit_hit(server.build_hit_record(token_id, headers, _remote_addr(scope)), timeout=0)
+        body = json.dumps({"status": "ok"}).encode()
+        await _respond(send, 200, body, content_type='application/json',
+                       extra_headers=(('Access-Control-Allow-Origin', '*'),))
+        server.record_request('/api/callback', method, 200, time.perf_counter() - started)
+        return
+
+    await flask_app(scope, receive, send)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="TokenSnare Async - Frontend ASGI de tracking",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=textwrap.dedent("""
+            Rutas atendidas en el event loop:
+            GET    /image/<token>.png   - Tracking (Imagen)
+            GET    /link/<token>        - Tracking (Link)
+            POST   /api/callback        - Reporte JS de sitio clonado
+
+            El resto de las rutas las atiende la app Flask de tokensnare_server.py.
+        """)
+    )
+
+    parser.add_argument('--host', default='0.0.0.0',
+                        help='Host del servidor (default: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=5000,
+                        help='Puerto del servidor (default: 5000)')
+    parser.add_argument('--storage', default=server.STORAGE_BACKEND, choices=STORAGE_BACKENDS,
+                        help=f'Backend de persistencia (default: {server.STORAGE_BACKEND})')
+    parser.add_argument('--db-file', default=server.DB_FILE,
+                        help='Archivo de la base de datos (default según el backend)')
+    parser.add_argument('--backlog', type=int, default=16384,
+                        help='Conexiones pendientes de aceptar (default: 16384)')
+    parser.add_argument('--keep-alive', type=int, default=30,
+                        help='Segundos que se mantiene abierta una conexión inactiva (default: 30)')
+
+    args = parser.parse_args()
+
+    if server.ingest_queue is None:
+        parser.error(INGEST_QUEUE_REQUIRED)
+
+    server.db = server.build_storage(args.storage, args.db_file)
+    server.load_database()
+
+    print("=" * 60)
+    print("TokenSnare Async Server")
+    print("=" * 60)
+    print(f"Servidor corriendo en: http://{args.host}:{args.port}")
+    print(f"Storage: {args.storage}")
+    print(f"Honeytokens registrados hasta el momento: {server.db.count_tokens()}")
+    print("=" * 60)
+
+    uvicorn.run(app, host=args.host, port=args.port, backlog=args.backlog,
+                timeout_keep_alive=args.keep_alive, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
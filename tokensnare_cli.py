@@ -4,12 +4,22 @@ TokenSnare CLI
 Herramienta centralizada para generación de Honeytokens.
 """
 import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
-from generators import generate_pdf_honeytoken, generate_binary_honeytoken, generate_epub_honeytoken, generate_xlsx_honeytoken, generate_docx_honeytoken, generate_qrcode_honeytoken
+from generators import generate_pdf_honeytoken, generate_binary_honeytoken, generate_epub_honeytoken, generate_xlsx_honeytoken, generate_docx_honeytoken, generate_qrcode_honeytoken, get_client, register_tokens, TokenSnareError
 
 OUTPUT_FOLDER_NAME = "honeyTokens"
 FILE_TYPE_SUPPORTED = ['pdf', 'epub', 'xlsx', 'docx', 'qrcode', 'binary']
+MANIFEST_FIELDS = ['type', 'output', 'description', 'title', 'author', 'content', 'platform']
+EXPORT_KINDS = ['hits', 'tokens']
+EXPORT_FORMATS = ['ndjson', 'csv']
 
 
 def get_output_path(filename):
@@ -19,17 +29,277 @@ def get_output_path(filename):
     return str(full_path)
 
 
+def generate_honeytoken(file_type, server_url, output_file, description=None, title=None,
+                        author=None, content=None, platform='linux', token_data=None):
+    """
+    Genera un honeytoken del tipo pedido.
+    Si se pasa 'token_data' se usa ese token ya registrado.
+    """
+    match file_type:
+        case 'pdf':
+            generate_pdf_honeytoken(
+                server_url=server_url,
+                output_file=output_file,
+                description=description,
+                title=title,
+                author=author,
+                content=content,
+                token_data=token_data
+            )
+        case 'epub':
+            generate_epub_honeytoken(
+                server_url=server_url,
+                output_file=output_file,
+                title=title,
+                author=author,
+                description=description,
+                content=content,
+                token_data=token_data
+            )
+        case 'xlsx':
+            generate_xlsx_honeytoken(
+                server_url=server_url,
+                output_file=output_file,
+                description=description,
+                title=title,
+                author=author,
+                content=content,
+                token_data=token_data
+            )
+        case 'docx':
+            generate_docx_honeytoken(
+                server_url=server_url,
+                output_file=output_file,
+                description=description,
+                title=title,
+                author=author,
+                content=content,
+                token_data=token_data
+            )
+        case 'qrcode':
+            generate_qrcode_honeytoken(
+                server_url=server_url,
+                output_file=output_file,
+                description=description,
+                token_data=token_data
+            )
+        case 'binary':
+            generate_binary_honeytoken(
+                server_url=server_url,
+                output_file=output_file,
+                platform=platform,
+                description=description,
+                token_data=token_data
+            )
+        case _:
+            print("Tipo no reconocido")
+
+
+def load_manifest(manifest_path):
+    """
+    Lee un manifiesto CSV (con encabezado) o JSON (lista de objetos) con las
+    columnas: type, output, description, title, author, content, platform.
+    Solo 'type' y 'output' son obligatorias.
+    """
+    path = Path(manifest_path)
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.suffix.lower() == '.json':
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+
+    entries = []
+    for line, row in enumerate(rows, start=1):
+        entry = {field: (row.get(field) or None) for field in MANIFEST_FIELDS}
+        if entry['type'] not in FILE_TYPE_SUPPORTED:
+            raise ValueError(f"Entrada {line}: tipo '{entry['type']}' no soportado")
+        if not entry['output']:
+            raise ValueError(f"Entrada {line}: falta 'output'")
+        entry['platform'] = entry['platform'] or 'linux'
+        entries.append(entry)
+    return entries
+
+
+def expand_count(args):
+    """
+    Arma 'count' entradas iguales a partir de los argumentos de la línea de
+    comandos, numerando el archivo de salida (ej: informe_00001.pdf).
+    """
+    output = Path(args.output)
+    return [
+        {
+            'type': args.type,
+            'output': f"{output.stem}_{index:05d}{output.suffix}",
+            'description': args.description,
+            'title': args.title,
+            'author': args.author,
+            'content': args.content,
+            'platform': args.platform,
+        }
+        for index in range(1, args.count + 1)
+    ]
+
+
+def _generate_entry(entry, server_url, token_data):
+    """Genera una entrada del lote. Corre dentro de los procesos del pool."""
+    start = time.perf_counter()
+    generate_honeytoken(
+        entry['type'],
+        server_url=server_url,
+        output_file=get_output_path(entry['output']),
+        description=entry['description'],
+        title=entry['title'],
+        author=entry['author'],
+        content=entry['content'],
+        platform=entry['platform'],
+        token_data=token_data
+    )
+    return time.perf_counter() - start
+
+
+def print_summary(elapsed_by_type, failed, wall_time):
+    total = sum(len(times) for times in elapsed_by_type.values())
+    print(f"Generados {total} honeytoken(s) en {OUTPUT_FOLDER_NAME}/ en {wall_time:.1f}s "
+          f"({total / wall_time if wall_time else 0:.1f}/s), {failed} con error")
+    print(f"{'Tipo':<8} {'Archivos':>9} {'ms/archivo':>11} {'archivos/s':>11}")
+    for file_type, times in sorted(elapsed_by_type.items()):
+        cpu_time = sum(times)
+        per_file = cpu_time / len(times) * 1000
+        throughput = len(times) / cpu_time if cpu_time else 0
+        print(f"{file_type:<8} {len(times):>9} {per_file:>11.1f} {throughput:>11.1f}")
+
+
+def generate_bulk(entries, server_url, workers):
+    """
+    Registra todos los tokens en lote y reparte la generación de los archivos
+    en un pool de 'workers' procesos, mostrando el progreso y un resumen
+    por tipo al final (ms/archivo y archivos/s son por worker).
+    """
+    tokens_data = register_tokens(
+        server_url,
+        [{"type": entry['type'], "description": entry['description']} for entry in entries]
+    )
+
+    # Se crea acá para que los workers no compitan creando la carpeta
+    Path(OUTPUT_FOLDER_NAME).mkdir(exist_ok=True)
+
+    total = len(entries)
+    elapsed_by_type = defaultdict(list)
+    failed = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_generate_entry, entry, server_url, token_data): entry
+            for entry, token_data in zip(entries, tokens_data)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            entry = futures[future]
+            try:
+                elapsed = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"\nError generando {entry['output']}: {e}")
+            else:
+                elapsed_by_type[entry['type']].append(elapsed)
+            print(f"\r[{done}/{total}] {done * 100 // total}%", end='', flush=True)
+
+    print()
+    print_summary(elapsed_by_type, failed, time.perf_counter() - start)
+
+
+def export(args):
+    """
+    Descarga el export de hits o tokens a --output (o a stdout).
+    Con --cursor-file se exportan solo los hits nuevos desde la última
+    corrida y, si la descarga termina bien, se guarda el cursor nuevo.
+    """
+    after = args.after
+    cursor_file = Path(args.cursor_file) if args.cursor_file else None
+    if after is None and cursor_file is not None and cursor_file.exists():
+        after = int(cursor_file.read_text().strip() or 0)
+
+    client = get_client(args.server)
+    if args.output:
+        with open(args.output, 'wb') as output:
+            cursor = client.export(args.export, output, args.format, after, args.since, args.gzip)
+    else:
+        cursor = client.export(args.export, sys.stdout.buffer, args.format, after, args.since, args.gzip)
+        sys.stdout.buffer.flush()
+
+    if cursor_file is not None and cursor is not None:
+        cursor_file.write_text(f"{cursor}\n")
+
+
+def run(parser, args):
+    if args.export:
+        export(args)
+        return
+
+    if args.manifest:
+        try:
+            entries = load_manifest(args.manifest)
+        except ValueError as e:
+            parser.error(str(e))
+        generate_bulk(entries, args.server, args.workers)
+        return
+
+    if not args.type or not args.output:
+        parser.error("--type y --output son obligatorios (salvo con --manifest)")
+
+    if args.count is not None:
+        if args.count < 1:
+            parser.error("--count debe ser mayor a 0")
+        generate_bulk(expand_count(args), args.server, args.workers)
+        return
+
+    generate_honeytoken(
+        args.type,
+        server_url=args.server,
+        output_file=get_output_path(args.output),
+        description=args.description,
+        title=args.title,
+        author=args.author,
+        content=args.content,
+        platform=args.platform
+    )
+
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="TokenSnare CLI - Generador de Honeytokens"
     )
 
-    # Parámetros Obligatorios
-    parser.add_argument('--type', required=True, choices=FILE_TYPE_SUPPORTED,
+    # Parámetros Obligatorios (salvo con --manifest)
+    parser.add_argument('--type', choices=FILE_TYPE_SUPPORTED,
                         help='Tipo de honeytoken a generar')
 
-    parser.add_argument('--output', required=True,
-                        help='Nombre del archivo de salida (se guardará en honeyTokens/)')
+    parser.add_argument('--output',
+                        help='Nombre del archivo de salida (se guardará en honeyTokens/; con --export, ruta del archivo o stdout si se omite)')
+
+    parser.add_argument('--manifest',
+                        help='CSV/JSON con varios honeytokens a generar (type, output, description, title, author, content, platform)')
+
+    parser.add_argument('--count', type=int, default=None,
+                        help='Generar N honeytokens iguales numerando el archivo de salida')
+
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Procesos para generar en paralelo con --manifest/--count (default: CPUs)')
+
+    # Export de hits/tokens
+    parser.add_argument('--export', choices=EXPORT_KINDS,
+                        help='Exportar todos los hits o tokens del servidor (NDJSON/CSV, en streaming)')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson',
+                        help='Formato del export (default: ndjson)')
+    parser.add_argument('--after', type=int, default=None,
+                        help='Exportar solo los hits con id mayor a este cursor')
+    parser.add_argument('--since', default=None,
+                        help='Exportar solo los hits desde este timestamp ISO 8601')
+    parser.add_argument('--cursor-file', default=None,
+                        help='Archivo donde se guarda el cursor para exportar solo los hits nuevos en la próxima corrida')
+    parser.add_argument('--gzip', action='store_true',
+                        help='Guardar el export comprimido con gzip')
 
     # Argumentos Generales
     parser.add_argument('--server', default='http://127.0.0.1:5000',
@@ -50,60 +320,11 @@ def main():
 
     args = parser.parse_args()
 
-    final_output_path = get_output_path(args.output)
-
-    match args.type:
-        case 'pdf':
-            generate_pdf_honeytoken(
-                server_url=args.server,
-                output_file=final_output_path,
-                description=args.description,
-                title=args.title,
-                author=args.author,
-                content=args.content
-            )
-        case 'epub':
-            generate_epub_honeytoken(
-                server_url=args.server,
-                output_file=final_output_path,
-                title=args.title,
-                author=args.author,
-                description=args.description,
-                content=args.content
-            )
-        case 'xlsx':
-            generate_xlsx_honeytoken(
-                server_url=args.server,
-                output_file=final_output_path,
-                description=args.description,
-                title=args.title,
-                author=args.author,
-                content=args.content
-            )
-        case 'docx':
-            generate_docx_honeytoken(
-                server_url=args.server,
-                output_file=final_output_path,
-                description=args.description,
-                title=args.title,
-                author=args.author,
-                content=args.content
-            )
-        case 'qrcode':
-            generate_qrcode_honeytoken(
-                server_url=args.server,
-                output_file=final_output_path,
-                description=args.description,
-            )
-        case 'binary':
-            generate_binary_honeytoken(
-                server_url=args.server,
-                output_file=final_output_path,
-                platform=args.platform,
-                description=args.description
-            )
-        case _:
-            print("Tipo no reconocido")
+    try:
+        run(parser, args)
+    except TokenSnareError as e:
+        print(e)
+        exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+TokenSnare Migrate
+Copia todos los tokens y hits de un backend de storage a otro.
+"""
+import argparse
+import sys
+
+from storage import STORAGE_BACKENDS, create_storage
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="TokenSnare Migrate - Migración entre backends de storage"
+    )
+
+    parser.add_argument('--from', dest='source', required=True, choices=STORAGE_BACKENDS,
+                        help='Backend de origen')
+    parser.add_argument('--to', dest='target', required=True, choices=STORAGE_BACKENDS,
+                        help='Backend de destino')
+    parser.add_argument('--from-file', default=None,
+                        help='Archivo de la DB de origen (default según el backend)')
+    parser.add_argument('--to-file', default=None,
+                        help='Archivo de la DB de destino (default según el backend)')
+    parser.add_argument('--force', action='store_true',
+                        help='Migrar aunque el destino ya tenga datos')
+
+    args = parser.parse_args()
+
+    if args.source == args.target and args.from_file == args.to_file:
+        print("El origen y el destino son la misma base de datos.")
+        sys.exit(1)
+
+    source = create_storage(args.source, args.from_file)
+    target = create_storage(args.target, args.to_file)
+    source.load()
+    target.load()
+
+    if target.count_tokens() and not args.force:
+        print("El destino ya tiene tokens. Usar --force para migrar igualmente.")
+        sys.exit(1)
+
+    total_tokens = source.count_tokens()
+    total_hits = source.count_hits()
+    print(f"Migrando {total_tokens} token(s) y {total_hits} hit(s): {args.source} -> {args.target}")
+
+    target.bulk_import(source.list_tokens(), source.iter_hits(), source.list_rollups(), source.list_hit_stats())
+
+    print(f"Destino: {target.count_tokens()} token(s) y {target.count_hits()} hit(s)")
+
+    source.close()
+    target.close()
+
+
+if __name__ == "__main__":
+    main()
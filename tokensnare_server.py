@@ -1,16 +1,30 @@
 import argparse
-from flask import Flask, Response, request, jsonify, render_template, send_file, redirect, url_for
+from flask import Flask, Response, g, request, jsonify, render_template, send_file, redirect, url_for, stream_with_context
 from flask_httpauth import HTTPBasicAuth
 from datetime import datetime, timezone, timedelta
 import logging
 import json
-import os, textwrap
+import os, sys, textwrap
+import atexit
+import signal
 import hashlib
-from pathlib import Path
+import io
+import threading
+import time
+from collections import OrderedDict
 from urllib.parse import urlparse
 
 from dotenv import load_dotenv
 
+from storage import (STORAGE_BACKENDS, EXPORT_FORMATS, TOKEN_SORT_FIELDS, HIT_EXPORT_FIELDS, TOKEN_EXPORT_FIELDS, HitArchiver, HitBroker,
+                     HitDeduplicator, HitIngestQueue, TokenBucket, create_storage, encode_records, gzip_chunks)
+from storage.retention import public_rollup
+from storage.stats import HitStats
+from alerts import AlertDispatcher, SmtpSink, SyslogSink, WebhookSink
+from metrics import MetricsRegistry, process_metrics
+from logs import HitLogSampler, configure_logging
+from generators import GENERATION_TYPES, GenerationPool, GenerationBusy, GenerationTimeout
+
 # Cargar variables de entorno desde .env
 load_dotenv()
 
@@ -28,32 +42,442 @@ TRANSPARENT_PNG = (
     b'\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9cc\x00\x01'
     b'\x00\x00\x05\x00\x01\r\n-\xb4\x00\x00\x00\x00IEND\xaeB`\x82'
 )
+PIXEL_ETAG = f'"{hashlib.sha256(TRANSPARENT_PNG).hexdigest()[:16]}"'
 
-# Base de datos simple (en memoria + persistencia JSON)
-tokens_db = {}
-hits_db = []
+# Cache del pixel en el cliente:
+#   no-store   -> nunca se cachea, cada apertura vuelve a pedir el pixel (default)
+#   revalidate -> se cachea pero se revalida siempre con If-None-Match (responde 304)
+#   cache      -> se cachea PIXEL_MAX_AGE segundos, las re-aperturas no llegan al servidor
+PIXEL_CACHE_MODES = ['no-store', 'revalidate', 'cache']
+PIXEL_CACHE_MODE = os.environ.get("PIXEL_CACHE_MODE", "no-store")
+PIXEL_MAX_AGE = int(os.environ.get("PIXEL_MAX_AGE", "86400"))
 
 API_KEY = os.environ.get("API_KEY")
 
 ADMIN_USER = os.environ.get("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "admin")
 
-DB_FILE = Path("tokensnare_db.json")
+# Backend de persistencia: 'json' (legacy, todo en memoria) o 'sqlite'
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
+DB_FILE = os.environ.get("DB_FILE")
+
+# Cada cuántas entradas del journal se compacta en un snapshot (solo json)
+JOURNAL_COMPACT_EVERY = int(os.environ.get("JOURNAL_COMPACT_EVERY", "10000"))
+JOURNAL_FSYNC = os.environ.get("JOURNAL_FSYNC", "0") == "1"
+
+# Cola de ingesta de hits (INGEST_QUEUE_SIZE=0 los persiste en el mismo request)
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", "10000"))
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_INTERVAL = float(os.environ.get("INGEST_FLUSH_INTERVAL", "0.2"))
+
+# Tamaño máximo de página en los listados de la API
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", "1000"))
+# Cantidad máxima de tokens por alta en lote
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "1000"))
+
+# Ventana de deduplicación de hits por (token, IP, UA) en segundos (0 = desactivada)
+HIT_DEDUP_WINDOW = float(os.environ.get("HIT_DEDUP_WINDOW", "0"))
+HIT_DEDUP_MAX_ENTRIES = int(os.environ.get("HIT_DEDUP_MAX_ENTRIES", "100000"))
+# Alertas por segundo en consola (0 = sin límite) y ráfaga permitida
+ALERT_RATE = float(os.environ.get("ALERT_RATE", "0"))
+ALERT_BURST = int(os.environ.get("ALERT_BURST", "20"))
+
+# Alertas salientes (cada destino se activa al configurarlo): webhook (POST JSON),
+# syslog ('host:puerto', udp o tcp) y mail por SMTP
+ALERT_WEBHOOK_URL = os.environ.get("ALERT_WEBHOOK_URL")
+ALERT_SYSLOG_ADDRESS = os.environ.get("ALERT_SYSLOG_ADDRESS")
+ALERT_SYSLOG_PROTOCOL = os.environ.get("ALERT_SYSLOG_PROTOCOL", "udp")
+ALERT_SMTP_HOST = os.environ.get("ALERT_SMTP_HOST")
+ALERT_SMTP_PORT = int(os.environ.get("ALERT_SMTP_PORT", "25"))
+ALERT_SMTP_FROM = os.environ.get("ALERT_SMTP_FROM", "tokensnare@localhost")
+ALERT_SMTP_TO = os.environ.get("ALERT_SMTP_TO", "")
+ALERT_SMTP_USERNAME = os.environ.get("ALERT_SMTP_USERNAME")
+ALERT_SMTP_PASSWORD = os.environ.get("ALERT_SMTP_PASSWORD")
+ALERT_SMTP_STARTTLS = os.environ.get("ALERT_SMTP_STARTTLS", "0") == "1"
+# Agrupado de ráfagas, reintentos y alertas no entregadas
+ALERT_QUEUE_SIZE = int(os.environ.get("ALERT_QUEUE_SIZE", "10000"))
+ALERT_BATCH_SIZE = int(os.environ.get("ALERT_BATCH_SIZE", "50"))
+ALERT_BATCH_WINDOW = float(os.environ.get("ALERT_BATCH_WINDOW", "2"))
+ALERT_MAX_RETRIES = int(os.environ.get("ALERT_MAX_RETRIES", "5"))
+ALERT_RETRY_BACKOFF = float(os.environ.get("ALERT_RETRY_BACKOFF", "1"))
+ALERT_DEAD_LETTER_FILE = os.environ.get("ALERT_DEAD_LETTER_FILE", "alerts_dead_letter.ndjson")
+
+# Headers que se guardan con cada hit (nombres separados por coma, sin distinguir
+# mayúsculas). Con whitelist solo se guardan esos; la blacklist se descarta siempre.
+HIT_HEADERS_WHITELIST = os.environ.get("HIT_HEADERS_WHITELIST", "")
+HIT_HEADERS_BLACKLIST = os.environ.get("HIT_HEADERS_BLACKLIST", "")
+# Guardar los headers de los hits comprimidos (zlib)
+HIT_HEADERS_COMPRESS = os.environ.get("HIT_HEADERS_COMPRESS", "0") == "1"
+
+# Filtro de Bloom de tokens para el backend sqlite (0 = desactivado)
+TOKEN_FILTER_CAPACITY = int(os.environ.get("TOKEN_FILTER_CAPACITY", "0"))
+TOKEN_FILTER_REFRESH = float(os.environ.get("TOKEN_FILTER_REFRESH", "1.0"))
+
+# Generación de archivos en el servidor (POST /api/generate/<tipo>)
+GENERATE_WORKERS = int(os.environ.get("GENERATE_WORKERS", "2"))
+GENERATE_MAX_PENDING = int(os.environ.get("GENERATE_MAX_PENDING", "32"))
+GENERATE_TIMEOUT = float(os.environ.get("GENERATE_TIMEOUT", "30"))
+GENERATE_CACHE_SIZE = int(os.environ.get("GENERATE_CACHE_SIZE", "64"))
+
+# Hits en vivo por Server-Sent Events (GET /api/stream): eventos que se guardan
+# por suscriptor antes de descartar los más viejos, máximo de suscriptores y
+# cada cuántos segundos se manda un keepalive
+STREAM_BUFFER_SIZE = int(os.environ.get("STREAM_BUFFER_SIZE", "1000"))
+STREAM_MAX_SUBSCRIBERS = int(os.environ.get("STREAM_MAX_SUBSCRIBERS", "100"))
+STREAM_KEEPALIVE = float(os.environ.get("STREAM_KEEPALIVE", "15"))
+
+# Panel web: tokens por página (máximo DASHBOARD_MAX_PAGE_SIZE) y segundos que se
+# cachea el listado renderizado (los hits y altas nuevas lo invalidan antes)
+DASHBOARD_PAGE_SIZE = int(os.environ.get("DASHBOARD_PAGE_SIZE", "50"))
+DASHBOARD_MAX_PAGE_SIZE = int(os.environ.get("DASHBOARD_MAX_PAGE_SIZE", "500"))
+DASHBOARD_CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", "5"))
+
+# Retención de hits: los más viejos que RETENTION_DAYS días o que exceden los
+# RETENTION_MAX_HITS_PER_TOKEN más recientes de su token se mueven a archivos
+# diarios en ARCHIVE_DIR y quedan resumidos en un rollup por token (0 = sin límite)
+RETENTION_DAYS = float(os.environ.get("RETENTION_DAYS", "0"))
+RETENTION_MAX_HITS_PER_TOKEN = int(os.environ.get("RETENTION_MAX_HITS_PER_TOKEN", "0"))
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archive")
+# Cada cuántos segundos se aplica la retención
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", "3600"))
+
+# Logs: nivel, formato de consola (text o json) y archivo opcional en JSON Lines,
+# que rota por tamaño (LOG_MAX_BYTES) o por tiempo (LOG_ROTATE_WHEN, ej: midnight)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+LOG_FILE = os.environ.get("LOG_FILE")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.environ.get("LOG_ROTATE_WHEN")
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "5"))
+# Eventos en espera de ser escritos; con la cola llena se descartan
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# Muestreo de los logs de hits: pasados LOG_SAMPLE_THRESHOLD hits de un token en
+# LOG_SAMPLE_WINDOW segundos se registra uno de cada LOG_SAMPLE_RATE (0 = sin muestreo)
+LOG_SAMPLE_THRESHOLD = int(os.environ.get("LOG_SAMPLE_THRESHOLD", "0"))
+LOG_SAMPLE_RATE = int(os.environ.get("LOG_SAMPLE_RATE", "100"))
+LOG_SAMPLE_WINDOW = float(os.environ.get("LOG_SAMPLE_WINDOW", "60"))
+
+# Se arma al arrancar el servidor (ver start_logging), no al importar el módulo
+log_pipeline = None
+logger = logging.getLogger("tokensnare")
+# Hasta que arranque el pipeline (o si solo se importa el módulo) no se escribe nada
+logger.addHandler(logging.NullHandler())
+hit_logger = logging.getLogger("tokensnare.hits")
+hit_log_sampler = HitLogSampler(LOG_SAMPLE_THRESHOLD, LOG_SAMPLE_RATE, LOG_SAMPLE_WINDOW) if LOG_SAMPLE_THRESHOLD > 0 else None
+
+def start_logging():
+    """
+    Manda los logs por el pipeline (ver configure_logging). La primera vez
+    lo arma; después solo lo vuelve a arrancar (por ejemplo en un worker
+    recién forkeado, donde el hilo del padre no existe).
+    """
+    global log_pipeline
+    if log_pipeline is None:
+        log_pipeline = configure_logging(
+            level=LOG_LEVEL,
+            log_format=LOG_FORMAT,
+            log_file=LOG_FILE,
+            max_bytes=LOG_MAX_BYTES,
+            rotate_when=LOG_ROTATE_WHEN,
+            backup_count=LOG_BACKUP_COUNT,
+            queue_size=LOG_QUEUE_SIZE,
+            tz=BUENOS_AIRES_TZ
+        )
+    else:
+        log_pipeline.start()
+    return log_pipeline
+
+def build_storage(backend, db_file=None):
+    if backend == 'json':
+        return create_storage(backend, db_file, compact_every=JOURNAL_COMPACT_EVERY, fsync=JOURNAL_FSYNC,
+                              compress_headers=HIT_HEADERS_COMPRESS)
+    return create_storage(backend, db_file, token_filter_capacity=TOKEN_FILTER_CAPACITY,
+                          token_filter_refresh=TOKEN_FILTER_REFRESH, compress_headers=HIT_HEADERS_COMPRESS)
+
+db = build_storage(STORAGE_BACKEND, DB_FILE)
+
+# Métricas del proceso, expuestas en /metrics (ver collect_server_metrics)
+metrics_registry = MetricsRegistry()
+http_requests = metrics_registry.counter(
+    'tokensnare_http_requests_total', "Requests atendidos por grupo, ruta, método y status.",
+    ('group', 'route', 'method', 'status'))
+http_latency = metrics_registry.histogram(
+    'tokensnare_http_request_duration_seconds', "Latencia de los requests por grupo y ruta.", ('group', 'route'))
+hit_register_latency = metrics_registry.histogram(
+    'tokensnare_hit_register_duration_seconds', "Tiempo de registrar un hit en el request (chequeo del token y encolado).")
+hits_persisted = metrics_registry.counter(
+    'tokensnare_hits_persisted_total', "Hits guardados en el storage (rate() da los hits por segundo).")
+hit_repeats = metrics_registry.counter(
+    'tokensnare_hit_repeats_total', "Hits repetidos (HIT_DEDUP_WINDOW) sumados al hit original en lugar de guardarse.")
+persist_latency = metrics_registry.histogram(
+    'tokensnare_persist_batch_duration_seconds', "Tiempo de persistir un lote de hits (storage, alertas y eventos).")
+generation_latency = metrics_registry.histogram(
+    'tokensnare_generation_duration_seconds', "Tiempo de generar un honeytoken por tipo.", ('type',),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+load_duration = None
+
+# Rutas de tracking; el resto se agrupa como api (/api/*, /metrics) o web
+TRACKING_ROUTES = frozenset(['/image/<token>.png', '/link/<token>', '/api/callback', '/assets/honey_logo.svg'])
+
+def route_group(route):
+    if route in TRACKING_ROUTES:
+        return 'tracking'
+    if route.startswith('/api/') or route == '/metrics':
+        return 'api'
+    return 'web'
+
+def record_request(route, method, status, seconds):
+    """Cuenta un request y su latencia. Lo comparten la app Flask y el frontend ASGI."""
+    group = route_group(route)
+    http_requests.inc(group, route, method, str(status))
+    http_latency.observe(seconds, group, route)
 
 def load_database():
-    global tokens_db, hits_db
-    if DB_FILE.exists():
-        with open(DB_FILE, 'r') as f:
-            data = json.load(f)
-            tokens_db = data.get('tokens', {})
-            hits_db = data.get('hits', [])
-
-def save_database():
-    with open(DB_FILE, 'w') as f:
-        json.dump({
-            'tokens': tokens_db,
-            'hits': hits_db
-        }, f, indent=2)
+    global load_duration
+    started = time.perf_counter()
+    db.load()
+    load_duration = time.perf_counter() - started
+
+hit_dedup = HitDeduplicator(HIT_DEDUP_WINDOW, HIT_DEDUP_MAX_ENTRIES) if HIT_DEDUP_WINDOW > 0 else None
+alert_limiter = TokenBucket(ALERT_RATE, ALERT_BURST) if ALERT_RATE > 0 else None
+suppressed_alerts = 0
+hit_broker = HitBroker(STREAM_BUFFER_SIZE, STREAM_MAX_SUBSCRIBERS)
+
+def build_alert_sinks():
+    sinks = []
+    if ALERT_WEBHOOK_URL:
+        sinks.append(WebhookSink(ALERT_WEBHOOK_URL))
+    if ALERT_SYSLOG_ADDRESS:
+        sinks.append(SyslogSink(ALERT_SYSLOG_ADDRESS, ALERT_SYSLOG_PROTOCOL))
+    if ALERT_SMTP_HOST and ALERT_SMTP_TO:
+        sinks.append(SmtpSink(ALERT_SMTP_HOST, ALERT_SMTP_PORT, ALERT_SMTP_FROM,
+                              [address.strip() for address in ALERT_SMTP_TO.split(',') if address.strip()],
+                              ALERT_SMTP_USERNAME, ALERT_SMTP_PASSWORD, ALERT_SMTP_STARTTLS))
+    return sinks
+
+alert_sinks = build_alert_sinks()
+alert_dispatcher = AlertDispatcher(
+    alert_sinks,
+    ALERT_DEAD_LETTER_FILE,
+    queue_size=ALERT_QUEUE_SIZE,
+    batch_size=ALERT_BATCH_SIZE,
+    batch_window=ALERT_BATCH_WINDOW,
+    max_retries=ALERT_MAX_RETRIES,
+    backoff=ALERT_RETRY_BACKOFF
+) if alert_sinks else None
+
+def alert(hit_record, token_data):
+    """
+    Registra la alerta de un hit (logger 'tokensnare.hits'), respetando el
+    rate limit de alertas y el muestreo de logs por token.
+    """
+    global suppressed_alerts
+    if alert_limiter is not None and not alert_limiter.allow():
+        suppressed_alerts += 1
+        return
+    sample = hit_log_sampler.sample(hit_record['token']) if hit_log_sampler is not None else 1
+    if not sample:
+        return
+    # Demora entre el request de tracking y la alerta (cola de ingesta + escritura)
+    latency = datetime.now(BUENOS_AIRES_TZ) - datetime.fromisoformat(hit_record['timestamp'])
+    fields = {
+        'event': 'hit',
+        'token': hit_record['token'],
+        'type': token_data['type'],
+        'description': token_data['description'],
+        'ip': hit_record['ip'],
+        'user_agent': hit_record['user_agent'],
+        'hit_id': hit_record.get('id'),
+        'latency_ms': round(latency.total_seconds() * 1000, 1),
+    }
+    message = f"ALERTA HIT | ID: {hit_record['token']} | Tipo: {token_data['type']} | Descripción: {token_data['description']} | IP: {hit_record['ip']} | UA: {hit_record['user_agent']}"
+    if sample > 1:
+        fields['sampled'] = sample
+        message += f" | (muestra: 1 de cada {sample} hits de este token)"
+    if suppressed_alerts:
+        fields['suppressed_alerts'] = suppressed_alerts
+        message += f" | (+{suppressed_alerts} alertas suprimidas por rate limit)"
+        suppressed_alerts = 0
+    hit_logger.warning(message, extra={'fields': fields})
+
+def persist_hits(hit_records):
+    """
+    Persiste un lote de hits y alerta por los que corresponden a tokens
+    registrados. Lo llama el escritor de la cola de ingesta.
+    Con deduplicación, los hits repetidos dentro de la ventana solo suman
+    'repeats' al hit original (y 'hits' al token) y no generan alerta.
+    """
+    started = time.perf_counter()
+    if hit_dedup is not None:
+        hit_records = hit_dedup.filter(hit_records)
+    accepted = db.add_hits(hit_records)
+    if hit_dedup is not None:
+        hit_dedup.remember(accepted)
+        repeats = hit_dedup.drain()
+        db.add_hit_repeats(repeats)
+        hit_repeats.inc(amount=sum(repeat[2] for repeat in repeats))
+
+    events = []
+    for hit_record in accepted:
+        token_data = db.get_token(hit_record['token'])
+        if token_data is None:
+            continue
+        alert(hit_record, token_data)
+        events.append(hit_event(hit_record, token_data))
+    hit_broker.publish(events)
+    if accepted:
+        dashboard_cache.invalidate()
+    if alert_dispatcher is not None:
+        alert_dispatcher.dispatch(events)
+    hits_persisted.inc(amount=len(accepted))
+    persist_latency.observe(time.perf_counter() - started)
+
+def hit_event(hit_record, token_data):
+    """Evento de un hit para /api/stream: el hit con el tipo y la descripción del token."""
+    event = dict(hit_record)
+    event['type'] = token_data['type']
+    event['description'] = token_data['description']
+    return event
+
+def replay_hit_events(after, token=None):
+    """Eventos de los hits ya guardados con id mayor a 'after' (para retomar un stream)."""
+    hits = db.query_hits(token, after=after) if token else db.iter_hits(after=after)
+    tokens = {}
+    for hit_record in hits:
+        if hit_record['token'] not in tokens:
+            tokens[hit_record['token']] = db.get_token(hit_record['token'])
+        token_data = tokens[hit_record['token']]
+        if token_data is not None:
+            yield hit_event(hit_record, token_data)
+
+def sse_message(event, data, event_id=None):
+    message = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{message}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+SSE_KEEPALIVE_MESSAGE = ": keepalive\n\n"
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+ingest_queue = HitIngestQueue(
+    persist_hits,
+    max_size=INGEST_QUEUE_SIZE,
+    batch_size=INGEST_BATCH_SIZE,
+    flush_interval=INGEST_FLUSH_INTERVAL
+) if INGEST_QUEUE_SIZE > 0 else None
+
+generation_pool = GenerationPool(
+    workers=GENERATE_WORKERS,
+    max_pending=GENERATE_MAX_PENDING,
+    timeout=GENERATE_TIMEOUT,
+    cache_size=GENERATE_CACHE_SIZE
+)
+
+def collect_server_metrics():
+    """
+    Métricas que ya llevan otros componentes (colas, storage, generación),
+    leídas al exportar /metrics en lugar de actualizarse en cada request.
+    """
+    families = []
+    if ingest_queue is not None:
+        ingest = ingest_queue.stats()
+        families += [
+            ('tokensnare_ingest_queue_depth', 'gauge', "Hits encolados esperando al escritor.",
+             [('', {}, ingest['queued'])]),
+            ('tokensnare_ingest_queue_capacity', 'gauge', "Capacidad de la cola de ingesta.",
+             [('', {}, ingest['max_size'])]),
+            ('tokensnare_ingest_dropped_total', 'counter', "Hits descartados por la cola llena.",
+             [('', {}, ingest['dropped'])]),
+        ]
+    if alert_dispatcher is not None:
+        sinks = alert_dispatcher.stats()
+        families += [
+            ('tokensnare_alert_queue_depth', 'gauge', "Alertas encoladas por destino.",
+             [('', {'sink': name}, stats['queued']) for name, stats in sinks.items()]),
+            ('tokensnare_alerts_sent_total', 'counter', "Alertas entregadas por destino.",
+             [('', {'sink': name}, stats['sent']) for name, stats in sinks.items()]),
+            ('tokensnare_alerts_dead_lettered_total', 'counter', "Alertas que fueron al dead-letter por destino.",
+             [('', {'sink': name}, stats['dead_lettered'] + stats['dropped']) for name, stats in sinks.items()]),
+        ]
+    if log_pipeline is not None:
+        families.append(('tokensnare_log_dropped_total', 'counter', "Eventos de log descartados por la cola llena.",
+                         [('', {}, log_pipeline.stats()['dropped'])]))
+    stream = hit_broker.stats()
+    families.append(('tokensnare_stream_subscribers', 'gauge', "Suscriptores de /api/stream.",
+                     [('', {}, stream['subscribers'])]))
+
+    storage = db.stats()
+    families.append(('tokensnare_db_size_bytes', 'gauge', "Espacio en disco de la DB.",
+                     [('', {}, storage['size_bytes'])]))
+    if 'saves' in storage:
+        families += [
+            ('tokensnare_db_save_duration_seconds', 'summary', "Duración de los snapshots de la DB.",
+             [('_sum', {}, storage['save_seconds']), ('_count', {}, storage['saves'])]),
+            ('tokensnare_db_save_bytes', 'summary', "Bytes escritos por los snapshots de la DB.",
+             [('_sum', {}, storage['save_bytes']), ('_count', {}, storage['saves'])]),
+            ('tokensnare_db_last_save_duration_seconds', 'gauge', "Duración del último snapshot.",
+             [('', {}, storage['last_save_seconds'])]),
+        ]
+    families.append(('tokensnare_db_load_duration_seconds', 'gauge', "Duración de la carga de la DB al arrancar.",
+                     [('', {}, load_duration)]))
+    tokens_total, hits_total = dashboard_cache.get_or_render(('totals',), lambda: (db.count_tokens(), db.count_hits()))
+    families += [
+        ('tokensnare_tokens', 'gauge', "Honeytokens registrados.", [('', {}, tokens_total)]),
+        ('tokensnare_hits', 'gauge', "Hits guardados (sin los archivados).", [('', {}, hits_total)]),
+    ]
+
+    cache = generation_pool.cache.stats()
+    families.append(('tokensnare_generation_template_cache_total', 'counter', "Búsquedas en el cache de plantillas.",
+                     [('', {'result': 'hit'}, cache['hits']), ('', {'result': 'miss'}, cache['misses'])]))
+    return families
+
+metrics_registry.add_collector(collect_server_metrics)
+metrics_registry.add_collector(process_metrics)
+
+retention_stop = threading.Event()
+retention_thread = None
+
+def retention_enabled():
+    return RETENTION_DAYS > 0 or RETENTION_MAX_HITS_PER_TOKEN > 0
+
+def apply_retention():
+    """Archiva los hits vencidos según RETENTION_DAYS y RETENTION_MAX_HITS_PER_TOKEN."""
+    before = None
+    if RETENTION_DAYS > 0:
+        before = (datetime.now(BUENOS_AIRES_TZ) - timedelta(days=RETENTION_DAYS)).isoformat()
+    archived = HitArchiver(db, ARCHIVE_DIR).run(before=before, keep_per_token=RETENTION_MAX_HITS_PER_TOKEN or None)
+    if archived:
+        log_print(f"Retención | {archived} hit(s) archivados en {ARCHIVE_DIR}")
+    return archived
+
+def _retention_loop():
+    while True:
+        try:
+            apply_retention()
+        except Exception as e:
+            log_print(f"Error aplicando la retención de hits: {e}", logging.ERROR)
+        if retention_stop.wait(RETENTION_INTERVAL):
+            return
+
+def start_retention():
+    """Aplica la retención al arrancar y después cada RETENTION_INTERVAL segundos."""
+    global retention_thread
+    if retention_enabled() and retention_thread is None:
+        retention_thread = threading.Thread(target=_retention_loop, name="hit-retention", daemon=True)
+        retention_thread.start()
+
+def shutdown():
+    """Vacía la cola de ingesta, frena el pool de generación y cierra el storage."""
+    hit_broker.close()
+    retention_stop.set()
+    if retention_thread is not None:
+        retention_thread.join()
+    if ingest_queue is not None:
+        ingest_queue.stop()
+    if alert_dispatcher is not None:
+        alert_dispatcher.stop()
+    generation_pool.shutdown()
+    db.close()
+    if log_pipeline is not None:
+        log_pipeline.stop()
 
 def generate_token_id(data_string):
     return hashlib.sha256(data_string.encode()).hexdigest()[:16]
@@ -61,9 +485,6 @@ def generate_token_id(data_string):
 def get_timestamp():
     return datetime.now(BUENOS_AIRES_TZ).isoformat()
 
-def get_timestamp_human():
-    return datetime.now(BUENOS_AIRES_TZ).strftime("%Y-%m-%d %H:%M:%S")
-
 def construct_response_with_urls(token_id, record):
     """
     Reconstruye las URLs de tracking para responder al cliente.
@@ -75,13 +496,14 @@ def construct_response_with_urls(token_id, record):
     response_data['tracking_url_link'] = f"{base_url}/link/{token_id}"
     return response_data
 
-def log_print(message):
+def log_print(message, level=logging.INFO, **fields):
     """
-    Imprime en consola con formato estándar y hora de Buenos Aires.
-    Formato: [dd/Mes/YYYY:HH:MM:SS] Mensaje
+    Registra un evento del servidor (logger 'tokensnare'). No escribe en el
+    momento: pasa por la cola de logs (ver LogPipeline). En consola sale
+    como '[YYYY-MM-DD HH:MM:SS] Mensaje' con hora de Buenos Aires, o en JSON
+    con los 'fields' como campos si LOG_FORMAT=json.
     """
-    timestamp = get_timestamp_human()
-    print(f"[{timestamp}] {message}")
+    logger.log(level, message, extra={'fields': fields} if fields else None)
 
 # ============================================================================
 # RUTAS DE ADMIN PARA VISUALIZACIÓN WEB
@@ -93,29 +515,139 @@ def verify_password(username, password):
         return username
     return None
 
+class FragmentCache:
+    """
+    Cache de fragmentos HTML del panel con vencimiento ('ttl' segundos) y
+    un máximo de entradas. invalidate la vacía cuando cambian los datos
+    (hits nuevos, altas y bajas de tokens).
+    """
+
+    def __init__(self, ttl, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+        value = render()
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+dashboard_cache = FragmentCache(DASHBOARD_CACHE_TTL)
+
+@app.after_request
+def invalidate_dashboard(response):
+    # Cualquier request que modifica datos (altas, bajas, callbacks) invalida el panel
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        dashboard_cache.invalidate()
+    return response
+
+@app.teardown_appcontext
+def release_storage_thread(exc):
+    # Sin esto cada hilo de request deja abierta su conexión a SQLite
+    db.release_thread()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        record_request(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+def display_timestamp(value):
+    """'2025-01-31T12:34:56.789-03:00' -> '2025-01-31 a las 12:34:56'."""
+    return f"{value[:10]} a las {value[11:19]}" if value else None
+
+def dashboard_row(record):
+    """Token con los campos que muestra el panel ya formateados."""
+    record['created_display'] = display_timestamp(record['created_at'])
+    record['last_hit_display'] = display_timestamp(record['last_hit'])
+    return record
+
+def _dashboard_args():
+    """Filtros, orden y página del panel leídos de la query string (inválidos -> default)."""
+    def int_arg(name, default):
+        try:
+            return int(request.args.get(name, default))
+        except ValueError:
+            return default
+
+    sort = request.args.get('sort', 'created_at')
+    return {
+        'q': request.args.get('q', '').strip(),
+        'type': request.args.get('type', ''),
+        'min_hits': max(0, int_arg('min_hits', 0)),
+        'sort': sort if sort in TOKEN_SORT_FIELDS else 'created_at',
+        'order': 'asc' if request.args.get('order') == 'asc' else 'desc',
+        'page': max(1, int_arg('page', 1)),
+        'per_page': max(1, min(int_arg('per_page', DASHBOARD_PAGE_SIZE), DASHBOARD_MAX_PAGE_SIZE)),
+    }
+
+def _render_token_list(args):
+    records, total = db.search_tokens(
+        search=args['q'] or None,
+        token_type=args['type'] or None,
+        min_hits=args['min_hits'] or None,
+        sort=args['sort'],
+        descending=args['order'] == 'desc',
+        offset=(args['page'] - 1) * args['per_page'],
+        limit=args['per_page']
+    )
+    pages = max(1, -(-total // args['per_page']))
+    return render_template(
+        "_tokens_list.html",
+        tokens=[dashboard_row(record) for record in records],
+        total=total,
+        pages=pages,
+        args=args,
+        sort_fields=TOKEN_SORT_FIELDS,
+        token_types=list(GENERATION_TYPES) + ['WEB_CLONE', 'WEB_CLONE_JS']
+    )
+
 @app.route("/tokens")
-@app.route("/api/tokens", methods=['GET'])
 @auth.login_required
 def honeytokens_index():
-    # In your Flask route:
-    return render_template("tokens_index.html", tokens=tokens_db, hits_list=hits_db)
-
-# Assuming tokens_db and hits_db are available globally
+    """
+    Panel de tokens paginado. Query string: q (texto en la descripción o
+    el ID), type, min_hits, sort (ver TOKEN_SORT_FIELDS), order=asc|desc,
+    page y per_page.
+    """
+    args = _dashboard_args()
+    key = ('tokens',) + tuple(sorted(args.items()))
+    token_list = dashboard_cache.get_or_render(key, lambda: _render_token_list(args))
+    totals = dashboard_cache.get_or_render(('totals',), lambda: (db.count_tokens(), db.count_hits()))
+    return render_template("tokens_index.html", token_list=token_list, tokens_total=totals[0], hits_total=totals[1])
 
 @app.route("/tokens/<token>", methods=['GET'])
 @auth.login_required
 def show_token_details(token):
-    if token not in tokens_db:
+    # Get the token's base info
+    ht_info = db.get_token(token)
+    if ht_info is None:
         # If the token is not found, render a simple 404 page (or redirect)
         return render_template("404.html", error_message=f"Honeytoken '{token}' no encontrado"), 404
 
-    # Get the token's base info
-    ht_info = tokens_db[token].copy()
-    
-    # Filter the global hits_db to get only hits for this token
-    hit_history = [
-        hit for hit in hits_db if hit['token'] == token
-    ]
+    hit_history = db.get_hits(token)
 
     # Render the detail template
     return render_template(
@@ -129,14 +661,9 @@ def show_token_details(token):
 @auth.login_required
 def delete_token_web(token):
     """Borra el token y redirige a la lista (Usado por el botón web)"""
-    global hits_db
-    
-    if token in tokens_db:
-        del tokens_db[token]
-        # Limpiar hits asociados
-        hits_db = [hit for hit in hits_db if hit['token'] != token]
-        save_database()
-        log_print(f"Honeytoken eliminado desde Web | ID: {token}")
+    # Borra también los hits asociados
+    if db.delete_token(token):
+        log_print(f"Honeytoken eliminado desde Web | ID: {token}", event='token_deleted', token=token)
     
     # Redirigir a la lista de tokens
     return redirect(url_for('honeytokens_index'))
@@ -149,13 +676,15 @@ def require_api_key(func):
         auth_header = request.headers.get('Authorization')
         
         if not auth_header or not auth_header.startswith('Bearer '):
-            log_print(f"Acceso denegado. Se requiere header Authorization: Bearer <API_KEY>")
+            log_print(f"Acceso denegado. Se requiere header Authorization: Bearer <API_KEY>", logging.WARNING,
+                      event='auth_failure', ip=request.remote_addr, path=request.path)
             return jsonify({"error": "Acceso denegado. Se requiere header Authorization: Bearer <API_KEY>"}), 401
         
         supplied_key = auth_header.split(' ')[1]
         
         if supplied_key != API_KEY:
-            log_print(f"Acceso denegado. API KEY inválida provista {supplied_key}")
+            log_print(f"Acceso denegado. API KEY inválida provista {supplied_key}", logging.WARNING,
+                      event='auth_failure', ip=request.remote_addr, path=request.path)
             return jsonify({"error": "Acceso denegado. Clave de API inválida."}), 401
         
         return func(*args, **kwargs)
@@ -163,21 +692,77 @@ def require_api_key(func):
     wrapper.__name__ = func.__name__
     return wrapper
 
-@app.route("/api/tokens", methods=['POST'])
-@require_api_key
-def register_honeytoken():
-    data = request.get_json()
-    
-    if not data or 'type' not in data:
-        return jsonify({"error": "Campo 'type' requerido"}), 400
-    
-    current_time = get_timestamp()
+def _int_arg(name):
+    value = request.args.get(name)
+    return int(value) if value else None
+
+def _limit_arg():
+    limit = _int_arg('limit')
+    return max(1, min(limit, MAX_PAGE_SIZE)) if limit is not None else None
 
+def _timestamp_arg(name):
+    """
+    Normaliza un timestamp ISO de la query string a la zona horaria del
+    servidor, para poder compararlo con los timestamps guardados.
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=BUENOS_AIRES_TZ)
+    return parsed.astimezone(BUENOS_AIRES_TZ).isoformat()
+
+def _hit_query_args():
+    """
+    Lee de la query string la paginación y los filtros de hits.
+    Lanza ValueError si algún parámetro es inválido.
+    """
+    return {
+        'after': _int_arg('after'),
+        'limit': _limit_arg(),
+        'since': _timestamp_arg('since'),
+        'until': _timestamp_arg('until'),
+        'ip': request.args.get('ip'),
+        'user_agent': request.args.get('user_agent'),
+    }
+
+def _projection():
+    """
+    Retorna una función que recorta cada registro según 'fields' (campos a
+    incluir) o 'exclude' (campos a omitir). 'id' y 'token' se mantienen
+    siempre porque son los cursores.
+    """
+    fields = request.args.get('fields')
+    exclude = request.args.get('exclude')
+    if fields:
+        keep = set(fields.split(',')) | {'id', 'token'}
+        return lambda record: {key: value for key, value in record.items() if key in keep}
+    if exclude:
+        drop = set(exclude.split(',')) - {'id', 'token'}
+        return lambda record: {key: value for key, value in record.items() if key not in drop}
+    return lambda record: record
+
+def _wants_ndjson():
+    return request.args.get('format') == 'ndjson'
+
+def _ndjson_response(records, project):
+    """Respuesta NDJSON que va serializando los registros a medida que se leen."""
+    def generate():
+        for record in records:
+            yield json.dumps(project(record)) + '\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def build_token_record(data, current_time, id_suffix=""):
+    """
+    Arma el registro de un token nuevo a partir del JSON recibido.
+    'id_suffix' diferencia los tokens creados en el mismo instante (lotes).
+    """
     ht_type = data['type']
     ht_desc = data.get('description') or "Sin descripción"
-    token_id = generate_token_id(ht_type + ht_desc + current_time)
+    token_id = generate_token_id(ht_type + ht_desc + current_time + id_suffix)
 
-    token_record = {
+    return {
         'token': token_id,
         'type': ht_type,
         'description': ht_desc,
@@ -185,56 +770,335 @@ def register_honeytoken():
         'hits': 0,
         'last_hit': None
     }
-    tokens_db[token_id] = token_record
-    save_database()
 
-    log_print(f"Nuevo honeytoken registrado | ID: {token_id} | Tipo: {ht_type}")
+@app.route("/api/tokens", methods=['POST'])
+@require_api_key
+def register_honeytoken():
+    data = request.get_json()
+    
+    if not data or 'type' not in data:
+        return jsonify({"error": "Campo 'type' requerido"}), 400
+    
+    token_record = build_token_record(data, get_timestamp())
+    token_id = token_record['token']
+    db.save_token(token_record)
+
+    log_print(f"Nuevo honeytoken registrado | ID: {token_id} | Tipo: {token_record['type']}",
+              event='token_created', token=token_id, type=token_record['type'])
 
     return jsonify(construct_response_with_urls(token_id, token_record)), 201
 
+@app.route("/api/tokens/batch", methods=['POST'])
+@require_api_key
+def register_honeytokens_batch():
+    """
+    Registra varios honeytokens en un solo request y una sola escritura.
+    Body: {"tokens": [{"type": ..., "description": ...}, ...]}
+    Las respuestas vuelven en el mismo orden que el pedido.
+    """
+    data = request.get_json()
+    items = data.get('tokens') if isinstance(data, dict) else None
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Campo 'tokens' requerido (lista no vacía)"}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Máximo {MAX_BATCH_SIZE} tokens por lote"}), 400
+    if any(not isinstance(item, dict) or 'type' not in item for item in items):
+        return jsonify({"error": "Campo 'type' requerido en cada token"}), 400
+
+    current_time = get_timestamp()
+    token_records = [build_token_record(item, current_time, str(index)) for index, item in enumerate(items)]
+    db.save_tokens(token_records)
+
+    log_print(f"Nuevos honeytokens registrados en lote | Cantidad: {len(token_records)}")
+
+    output_list = [construct_response_with_urls(record['token'], record) for record in token_records]
+    return jsonify({'tokens': output_list, 'total': len(output_list)}), 201
+
+@app.route("/api/generate/<file_type>", methods=['POST'])
+@require_api_key
+def generate_honeytoken_file(file_type):
+    """
+    Registra un honeytoken y responde directamente con el archivo generado.
+    Body (opcional): {"description", "title", "author", "content", "platform", "filename"}
+    El ID y las URLs del token vuelven en los headers X-Token-*.
+    """
+    if file_type not in GENERATION_TYPES:
+        return jsonify({"error": f"Tipo no soportado. Opciones: {', '.join(GENERATION_TYPES)}"}), 400
+
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "El body debe ser un objeto JSON"}), 400
+
+    platform = data.get('platform') or 'linux'
+    if file_type == 'binary' and platform not in ('linux', 'windows'):
+        return jsonify({"error": "Las plataformas soportadas son windows y linux"}), 400
+
+    token_record = build_token_record({**data, 'type': file_type}, get_timestamp())
+    token_id = token_record['token']
+    token_data = construct_response_with_urls(token_id, token_record)
+
+    try:
+        with generation_latency.time(file_type):
+            file_bytes = generation_pool.generate(
+                file_type,
+                token_data,
+                title=data.get('title'),
+                author=data.get('author'),
+                content=data.get('content'),
+                platform=platform
+            )
+    except GenerationBusy as e:
+        return jsonify({"error": str(e)}), 503
+    except GenerationTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except Exception as e:
+        log_print(f"Error generando honeytoken | Tipo: {file_type} | {e}", logging.ERROR,
+                  event='generation_error', type=file_type)
+        return jsonify({"error": f"No se pudo generar el honeytoken: {e}"}), 500
+
+    # Se registra recién con el archivo listo, así un error no deja tokens huérfanos
+    db.save_token(token_record)
+
+    log_print(f"Nuevo honeytoken generado | ID: {token_id} | Tipo: {file_type}",
+              event='token_created', token=token_id, type=file_type)
+
+    extension, mimetype = GENERATION_TYPES[file_type]
+    if file_type == 'binary' and platform == 'windows':
+        extension = '.exe'
+    response = send_file(
+        io.BytesIO(file_bytes),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=data.get('filename') or f"{token_id}{extension}"
+    )
+    response.headers['X-Token-Id'] = token_id
+    response.headers['X-Token-Tracking-Url-Image'] = token_data['tracking_url_image']
+    response.headers['X-Token-Tracking-Url-Link'] = token_data['tracking_url_link']
+    return response
+
+@app.route("/api/generate", methods=['GET'])
+@require_api_key
+def generation_stats():
+    """Estado del pool de generación y del cache de plantillas."""
+    return jsonify(generation_pool.stats())
+
 @app.route("/api/tokens", methods=['GET'])
 @require_api_key
 def list_honeytokens():
-    output_list = list(tokens_db.values())
-    return jsonify({'tokens': output_list, 'total': len(output_list)})
+    """
+    Lista los tokens ordenados por ID.
+    Query string: limit, after (ID del último token de la página anterior),
+    type, fields/exclude y format=ndjson.
+    """
+    try:
+        limit = _limit_arg()
+    except ValueError:
+        return jsonify({"error": "Parámetro 'limit' inválido"}), 400
+
+    project = _projection()
+    tokens = db.query_tokens(after=request.args.get('after'), limit=limit, token_type=request.args.get('type'))
+    if _wants_ndjson():
+        return _ndjson_response(tokens, project)
+
+    output_list = [project(record) for record in tokens]
+    next_cursor = output_list[-1]['token'] if limit and len(output_list) == limit else None
+    return jsonify({'tokens': output_list, 'total': db.count_tokens(), 'next_cursor': next_cursor})
 
 @app.route("/api/tokens/<token>", methods=['GET'])
 @require_api_key
 def get_honeytoken_info(token):
-    if token not in tokens_db:
+    """
+    Detalle de un token con su historial de hits.
+    Query string: limit, after (id del último hit de la página anterior),
+    since/until (ISO 8601), ip, user_agent, fields/exclude y format=ndjson
+    (devuelve solo los hits, uno por línea).
+    """
+    ht_info = db.get_token(token)
+    if ht_info is None:
         return jsonify({"error": "Honeytoken no encontrado"}), 404
 
-    ht_info = tokens_db[token].copy()
-    ht_info['hit_history'] = [
-        hit for hit in hits_db if hit['token'] == token
-    ]
+    try:
+        query_args = _hit_query_args()
+    except ValueError:
+        return jsonify({"error": "Parámetros de paginación o filtros inválidos"}), 400
+
+    project = _projection()
+    hits = db.query_hits(token, **query_args)
+    if _wants_ndjson():
+        return _ndjson_response(hits, project)
+
+    ht_info['hit_history'] = [project(hit) for hit in hits]
+    rollup = db.get_rollup(token)
+    if rollup is not None:
+        ht_info['rollup'] = public_rollup(rollup)
+    limit = query_args['limit']
+    ht_info['next_cursor'] = ht_info['hit_history'][-1]['id'] if limit and len(ht_info['hit_history']) == limit else None
 
     return jsonify(ht_info)
 
+@app.route("/api/tokens/<token>/stats", methods=['GET'])
+@require_api_key
+def get_honeytoken_stats(token):
+    """
+    Estadísticas de los hits de un token: totales, primer y último hit, IPs
+    distintas (aproximado), hits por hora/día y user agents más frecuentes.
+    Salen de agregados que se actualizan con cada hit, no del historial.
+    """
+    ht_info = db.get_token(token)
+    if ht_info is None:
+        return jsonify({"error": "Honeytoken no encontrado"}), 404
+
+    stats = db.get_hit_stats(token) or HitStats().summary()
+    return jsonify({'token': token, 'type': ht_info['type'], **stats})
+
+@app.route("/api/stats", methods=['GET'])
+@require_api_key
+def get_global_stats():
+    """Las mismas estadísticas que /api/tokens/<token>/stats sobre todos los tokens."""
+    stats = db.get_hit_stats() or HitStats().summary()
+    return jsonify({'tokens': db.count_tokens(), **stats})
+
+@app.route("/api/export/<kind>", methods=['GET'])
+@require_api_key
+def export_records(kind):
+    """
+    Exporta todos los hits ('hits') o tokens ('tokens') en streaming.
+    Query string: format=ndjson|csv (default ndjson); para hits, after (id
+    del último hit ya exportado) y since (ISO 8601); para tokens, after (ID
+    del último token). Si el cliente acepta gzip la salida va comprimida.
+
+    El header X-Export-Cursor trae el id del último hit incluido: pasándolo
+    como 'after' en el próximo pedido se obtienen solo los hits nuevos.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if kind not in ('hits', 'tokens') or export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Export no soportado. Opciones: hits|tokens con format {'|'.join(EXPORT_FORMATS)}"}), 400
+
+    headers = {}
+    if kind == 'hits':
+        try:
+            after = _int_arg('after')
+            since = _timestamp_arg('since')
+        except ValueError:
+            return jsonify({"error": "Parámetros 'after' o 'since' inválidos"}), 400
+        # El export se corta en el último hit al momento del pedido, así el
+        # cursor es exacto aunque sigan llegando hits mientras se descarga
+        upto = db.last_hit_id()
+        records = db.iter_hits(after=after, upto=upto, since=since)
+        fields = HIT_EXPORT_FIELDS
+        headers['X-Export-Cursor'] = str(upto)
+    else:
+        records = db.query_tokens(after=request.args.get('after'))
+        fields = TOKEN_EXPORT_FIELDS
+
+    chunks = encode_records(records, export_format, fields)
+    # Calidad negociada (gzip;q=0 es un rechazo explícito)
+    if request.accept_encodings['gzip'] > 0:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    headers['Vary'] = 'Accept-Encoding'
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
 @app.route("/api/tokens/<token>", methods=['DELETE'])
 @require_api_key
 def delete_honeytoken(token):
     """Elimina un honeytoken específico y sus hits asociados."""
-    global hits_db
-    if token not in tokens_db:
+    if not db.delete_token(token):
         return jsonify({"error": "Honeytoken no encontrado"}), 404
-    
-    del tokens_db[token]
-    hits_db = [hit for hit in hits_db if hit['token'] != token]
-    save_database()
 
-    log_print(f"Honeytoken eliminado | ID: {token}")
+    log_print(f"Honeytoken eliminado | ID: {token}", event='token_deleted', token=token)
 
     return jsonify({"message": f"Honeytoken {token} eliminado"}), 200
 
+@app.route("/api/ingest", methods=['GET'])
+@require_api_key
+def ingest_stats():
+    """
+    Estado de la cola de ingesta (hits encolados, escritos y descartados),
+    de la deduplicación, del rate limit de alertas, de los suscriptores en
+    vivo, de los destinos de alertas salientes y de la cola de logs.
+    """
+    stats = {"enabled": ingest_queue is not None}
+    if ingest_queue is not None:
+        stats.update(ingest_queue.stats())
+    if hit_dedup is not None:
+        stats['dedup'] = hit_dedup.stats()
+    if alert_limiter is not None:
+        stats['alerts'] = alert_limiter.stats()
+    stats['stream'] = hit_broker.stats()
+    if alert_dispatcher is not None:
+        stats['alert_sinks'] = alert_dispatcher.stats()
+    if log_pipeline is not None:
+        stats['logging'] = log_pipeline.stats()
+    if hit_log_sampler is not None:
+        stats.setdefault('logging', {})['sampling'] = hit_log_sampler.stats()
+    return jsonify(stats)
+
+@app.route("/metrics", methods=['GET'])
+@require_api_key
+def prometheus_metrics():
+    """
+    Métricas en el formato de texto de Prometheus: requests y latencias por
+    ruta, hits guardados, colas, snapshots y tamaño de la DB y memoria del
+    proceso. Con --workers cada proceso reporta solo lo suyo.
+    """
+    return Response(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _stream_after():
+    """Cursor para retomar el stream: header Last-Event-ID o parámetro 'after'."""
+    value = request.headers.get('Last-Event-ID') or request.args.get('after')
+    return int(value) if value else None
+
+@app.route("/api/stream", methods=['GET'])
+@require_api_key
+def stream_hits():
+    """
+    Hits en vivo como Server-Sent Events ('event: hit', con el id del hit
+    como id del evento). Query string: token (solo los hits de ese token)
+    y after (o el header Last-Event-ID) para recibir primero los hits
+    guardados después de ese id. Si el cliente no lee a tiempo se descartan
+    los eventos más viejos de su buffer y se avisa con 'event: dropped'.
+    """
+    try:
+        after = _stream_after()
+    except ValueError:
+        return jsonify({"error": "Cursor 'after' / Last-Event-ID inválido"}), 400
+    token = request.args.get('token')
+
+    subscription = hit_broker.subscribe(token)
+    if subscription is None:
+        return jsonify({"error": "Demasiadas suscripciones en vivo, reintentar más tarde"}), 503
+
+    def generate():
+        last_id = after
+        try:
+            if after is not None:
+                for event in replay_hit_events(after, token):
+                    last_id = event['id']
+                    yield sse_message('hit', event, event['id'])
+            while not subscription.closed:
+                events, dropped = subscription.get(STREAM_KEEPALIVE)
+                if dropped:
+                    yield sse_message('dropped', {'count': dropped})
+                for event in events:
+                    # Los publicados mientras se reenviaban los guardados ya salieron
+                    if last_id is not None and event['id'] <= last_id:
+                        continue
+                    yield sse_message('hit', event, event['id'])
+                if not events and not dropped:
+                    yield SSE_KEEPALIVE_MESSAGE
+        finally:
+            hit_broker.unsubscribe(subscription)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
 @app.route("/api/tokens/all", methods=['DELETE'])
 @require_api_key
 def delete_all():
     """Elimina TODOS los honeytokens y hits. Útil para reiniciar."""
-    global tokens_db, hits_db
-    tokens_db.clear()
-    hits_db.clear()
-    save_database()
+    db.delete_all()
 
     log_print(f"DB Reset")
     return jsonify({"message": "DB Reset"}), 200
@@ -243,38 +1107,90 @@ def delete_all():
 # TRACKING
 # ============================================================================
 
-def _register_hit(token: str):
+def _header_names(value):
+    return frozenset(name.strip().lower() for name in value.split(',') if name.strip())
+
+HEADERS_WHITELIST = _header_names(HIT_HEADERS_WHITELIST)
+HEADERS_BLACKLIST = _header_names(HIT_HEADERS_BLACKLIST)
+
+def filter_headers(headers):
+    """Deja solo los headers a guardar según la whitelist/blacklist."""
+    if not HEADERS_WHITELIST and not HEADERS_BLACKLIST:
+        return headers
+    return {
+        name: value for name, value in headers.items()
+        if (not HEADERS_WHITELIST or name.lower() in HEADERS_WHITELIST) and name.lower() not in HEADERS_BLACKLIST
+    }
+
+def build_hit_record(token, headers, remote_addr):
     """
-    Función helper interna.
-    Registra un hit para un honeytoken, actualiza la DB y guarda en disco.
+    Arma el registro de un hit a partir de los headers (dict) y la IP
+    del cliente. Lo comparten la app Flask y el frontend ASGI.
     """
     ts_iso = get_timestamp()
-    
-    ip = request.headers.getlist("X-Forwarded-For")[0] if request.headers.getlist("X-Forwarded-For") else request.remote_addr
-    user_agent = request.headers.get('User-Agent', 'Unknown')
-    
-    # Registra el hit
-    hit_record = {
+
+    ip = headers.get("X-Forwarded-For") or remote_addr
+    user_agent = headers.get('User-Agent', 'Unknown')
+
+    return {
         'token': token,
         'timestamp': ts_iso,
         'ip': ip,
         'user_agent': user_agent,
-        'headers': dict(request.headers)
+        'headers': filter_headers(headers)
     }
-    
-    # Alerta
-    if token in tokens_db:
-        hits_db.append(hit_record)
 
-        tokens_db[token]['hits'] += 1
-        tokens_db[token]['last_hit'] = ts_iso
-        token_type = tokens_db[token]['type']
-        description = tokens_db[token]['description']
-        log_print(f"ALERTA HIT | ID: {token} | Tipo: {token_type} | Descripción: {description} | IP: {ip} | UA: {user_agent}")
+def submit_hit(hit_record, timeout=None):
+    """
+    Encola el hit para que el escritor lo persista (o lo persiste
+    directamente si la cola está desactivada).
+    """
+    if ingest_queue is not None:
+        ingest_queue.submit(hit_record, timeout=timeout)
+    else:
+        persist_hits([hit_record])
+
+def build_pixel_headers(mode, max_age):
+    """Headers fijos de la respuesta del pixel según el modo de cache."""
+    headers = [('Content-Type', 'image/png')]
+    if mode == 'no-store':
+        headers += [('Cache-Control', 'no-store, no-cache, must-revalidate, max-age=0'),
+                    ('Pragma', 'no-cache'),
+                    ('Expires', '0')]
+    elif mode == 'revalidate':
+        headers += [('Cache-Control', 'no-cache'), ('ETag', PIXEL_ETAG)]
+    elif mode == 'cache':
+        headers += [('Cache-Control', f'public, max-age={max_age}'), ('ETag', PIXEL_ETAG)]
+    else:
+        raise ValueError(f"PIXEL_CACHE_MODE no soportado: {mode}. Opciones: {', '.join(PIXEL_CACHE_MODES)}")
+    return headers
+
+PIXEL_HEADERS = build_pixel_headers(PIXEL_CACHE_MODE, PIXEL_MAX_AGE)
+
+def pixel_not_modified(if_none_match):
+    """True si el cliente ya tiene el pixel cacheado (If-None-Match con nuestro ETag)."""
+    if PIXEL_CACHE_MODE == 'no-store' or not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or PIXEL_ETAG in if_none_match
+
+def is_known_token(token):
+    """
+    Chequeo O(1) de que el token existe. Los tokens desconocidos (escaneos
+    de URLs al azar) se descartan sin armar el hit ni tocar la cola.
+    """
+    return db.has_token(token)
 
-    # else:
-    #     log_print(f"ALERTA HIT NO ESPERADO | IP: {ip} | UA: {user_agent}")
-    save_database()
+def _register_hit(token: str):
+    """
+    Función helper interna.
+    Registra un hit para un honeytoken con los datos del request actual.
+    """
+    started = time.perf_counter()
+    if not is_known_token(token):
+        return
+    hit_record = build_hit_record(token, dict(request.headers), request.remote_addr)
+    submit_hit(hit_record)
+    hit_register_latency.observe(time.perf_counter() - started)
 
 @app.route("/image/<token>.png", methods=['GET', 'OPTIONS'])
 def image_hit(token):
@@ -282,11 +1198,14 @@ def image_hit(token):
     Endpoint de tracking (IMAGEN). 
     Se activa cuando se carga la imagen.
     Registra el hit y retorna una imagen transparente.
+    La respuesta es la misma exista o no el token.
     """
     if request.method == 'OPTIONS':
         return ('', 204)
     _register_hit(token)
-    return Response(TRANSPARENT_PNG, mimetype="image/png")
+    if pixel_not_modified(request.headers.get('If-None-Match')):
+        return Response(status=304, headers=PIXEL_HEADERS)
+    return Response(TRANSPARENT_PNG, headers=PIXEL_HEADERS)
 
 @app.route("/link/<token>", methods=['GET', 'OPTIONS'])
 def link_hit(token):
@@ -303,7 +1222,8 @@ def link_hit(token):
 
 @app.route("/", methods=['GET'])
 def index():
-    return render_template("home.html", active_tokens=len(tokens_db), hits=len(hits_db))
+    tokens_total, hits_total = dashboard_cache.get_or_render(('totals',), lambda: (db.count_tokens(), db.count_hits()))
+    return render_template("home.html", active_tokens=tokens_total, hits=hits_total)
 
 # ============================================================================
 # Sitio web demo
@@ -335,19 +1255,21 @@ def logo():
             if ref_host and ref_host != current_host:
                 token_id = generate_token_id("WEBSITE_CLONE_PROTECION_CSS")
 
-                if token_id not in tokens_db:
-                    tokens_db[token_id] = {
+                description = f"Sitio clonado detectado desde {ref_host}"
+                token_record = db.get_token(token_id)
+                # Solo se escribe si el token es nuevo o cambió el dominio, no en cada hit
+                if token_record is None:
+                    db.save_token({
                         "token": token_id,
                         "type": "WEB_CLONE",
-                        "description": f"Sitio clonado detectado desde {ref_host}",
+                        "description": description,
                         "created_at": get_timestamp(),
                         "hits": 0,
                         "last_hit": None,
-                    }
-                else:
-                    tokens_db[token_id]["description"] = (
-                        f"Sitio clonado detectado desde {ref_host}"
-                    )
+                    })
+                elif token_record["description"] != description:
+                    token_record["description"] = description
+                    db.save_token(token_record)
 
                 _register_hit(token_id)
 
@@ -356,22 +1278,17 @@ def logo():
 
     return send_file("assets/honey_logo.svg", mimetype="image/svg+xml")
 
-@app.route("/api/callback", methods=["POST", "OPTIONS"])
-def js_callback():
-    if request.method == "OPTIONS":
-        response = Response("", status=204)
-        response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
-
-        response.headers["Access-Control-Allow-Headers"] = (
-            "Content-Type, X-Cloned-Domain, X-Cloned-Url, X-Screen-Res"
-        )
-        return response
-
+def ensure_clone_js_token(cloned_domain):
+    """
+    Crea (o actualiza con el dominio reportado) el token fijo que recibe
+    los reportes JS del sitio demo clonado. Retorna su ID.
+    """
     token_id = generate_token_id("WEBSITE_CLONE_PROTECTION_JS")
 
-    if token_id not in tokens_db:
-        tokens_db[token_id] = {
+    token_record = db.get_token(token_id)
+    is_new = token_record is None
+    if is_new:
+        token_record = {
             "token": token_id,
             "type": "WEB_CLONE_JS",
             "description": "Sitio web clonado (Reporte JS)",
@@ -380,10 +1297,26 @@ def js_callback():
             "last_hit": None,
         }
 
-    cloned_domain = request.headers.get("X-Cloned-Domain")
     if cloned_domain:
-        tokens_db[token_id]["description"] = f"Sitio web clonado en: {cloned_domain}"
+        token_record["description"] = f"Sitio web clonado en: {cloned_domain}"
+
+    if is_new or cloned_domain:
+        db.save_token(token_record)
+    return token_id
+
+@app.route("/api/callback", methods=["POST", "OPTIONS"])
+def js_callback():
+    if request.method == "OPTIONS":
+        response = Response("", status=204)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        response.headers["Access-Control-Allow-Methods"] = "POST, OPTIONS"
 
+        response.headers["Access-Control-Allow-Headers"] = (
+            "Content-Type, X-Cloned-Domain, X-Cloned-Url, X-Screen-Res"
+        )
+        return response
+
+    token_id = ensure_clone_js_token(request.headers.get("X-Cloned-Domain"))
     _register_hit(token_id)
 
     response = jsonify({"status": "ok"})
@@ -394,6 +1327,46 @@ def js_callback():
 # MAIN
 # ============================================================================
 
+def post_worker_init(worker):
+    # Los hilos no sobreviven al fork: cada worker arranca el de los logs.
+    # La retención corre en cada worker; un lock de archivo evita que se pisen
+    start_logging()
+    start_retention()
+
+def run_gunicorn(host, port, workers, threads):
+    """
+    Levanta la app con gunicorn en varios procesos. Los workers comparten
+    el estado solo a través del storage, por eso requiere sqlite.
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("Para usar --workers se necesita gunicorn (pip install gunicorn)")
+        sys.exit(1)
+
+    class TokenSnareApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{host}:{port}")
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread' if threads > 1 else 'sync')
+            # Cada worker vacía su cola de ingesta al terminar
+            self.cfg.set('worker_exit', lambda arbiter, worker: shutdown())
+            self.cfg.set('post_worker_init', post_worker_init)
+
+        def load(self):
+            return app
+
+    TokenSnareApplication().run()
+
+def run_waitress(host, port, threads):
+    try:
+        from waitress import serve
+    except ImportError:
+        print("Para usar --threads se necesita waitress (pip install waitress)")
+        sys.exit(1)
+    serve(app, host=host, port=port, threads=threads)
+
 def main():
     parser = argparse.ArgumentParser(
         description="TokenSnare Alert Server - Servidor de honeytokens",
@@ -401,15 +1374,27 @@ def main():
         epilog=textwrap.dedent("""
             Endpoints:
             POST   /api/tokens          - Registrar
-            GET    /api/tokens          - Listar
-            GET    /api/tokens/<token>  - Detalles
+            POST   /api/tokens/batch    - Registrar en lote
+            POST   /api/generate/<tipo> - Registrar y descargar el archivo (pdf, docx, xlsx, epub, qrcode, binary)
+            GET    /api/generate        - Estado del pool de generación
+            GET    /api/tokens          - Listar (?limit=&after=&type=&format=ndjson)
+            GET    /api/tokens/<token>  - Detalles (?limit=&after=&since=&until=&ip=&user_agent=&fields=&exclude=&format=ndjson)
+            GET    /api/tokens/<token>/stats - Estadísticas de hits de un token
+            GET    /api/stats           - Estadísticas de hits de todos los tokens
             DELETE /api/tokens/<token>  - Borrar uno
             DELETE /api/tokens/all      - Borrar todo
+            GET    /api/ingest          - Estado de la cola de ingesta
+            GET    /api/export/<tipo>   - Exportar hits o tokens (?format=ndjson|csv&after=&since=)
+            GET    /api/stream          - Hits en vivo, Server-Sent Events (?token=&after=)
+            GET    /metrics             - Métricas en formato Prometheus
             
             GET    /image/<token>.png   - Tracking (Imagen)
             GET    /link/<token>        - Tracking (Link)
 
-            La base de datos se guarda en: tokensnare_db.json
+            Storage json (default): tokensnare_db.json + tokensnare_db.journal
+            Storage sqlite: tokensnare_db.sqlite3
+            Para migrar entre backends: tokensnare_migrate.py
+            Retención de hits: RETENTION_DAYS / RETENTION_MAX_HITS_PER_TOKEN (archivos en ARCHIVE_DIR)
         """)
     )
 
@@ -417,21 +1402,51 @@ def main():
                        help='Host del servidor (default: 0.0.0.0 para escuchar todas las interfaces)')
     parser.add_argument('--port', type=int, default=5000,
                        help='Puerto del servidor (default: 5000)')
+    parser.add_argument('--storage', default=STORAGE_BACKEND, choices=STORAGE_BACKENDS,
+                       help=f'Backend de persistencia (default: {STORAGE_BACKEND})')
+    parser.add_argument('--db-file', default=DB_FILE,
+                       help='Archivo de la base de datos (default según el backend)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Procesos worker (>1 usa gunicorn y requiere --storage sqlite)')
+    parser.add_argument('--threads', type=int, default=1,
+                       help='Hilos por worker (>1 usa waitress, o gunicorn gthread con --workers)')
     
     args = parser.parse_args()
+
+    if args.workers > 1 and args.storage != 'sqlite':
+        parser.error("--workers > 1 requiere --storage sqlite: el backend json vive en memoria de cada proceso")
     
+    start_logging()
+
     # Cargar base de datos
+    global db
+    db = build_storage(args.storage, args.db_file)
     load_database()
+    if args.workers > 1:
+        # Las conexiones no deben cruzar el fork, cada worker abre las suyas
+        db.close()
+
+    # Al recibir SIGTERM se sale de forma ordenada para vaciar la cola
+    atexit.register(shutdown)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     
     print("=" * 60)
     print("TokenSnare Alert Server")
     print("=" * 60)
     print(f"Servidor corriendo en: http://{args.host}:{args.port}")
-    print(f"Honeytokens registrados hasta el momento: {len(tokens_db)}")
+    print(f"Storage: {args.storage} | Workers: {args.workers} | Hilos: {args.threads}")
+    print(f"Honeytokens registrados hasta el momento: {db.count_tokens()}")
     print("=" * 60)
     
     # Iniciar servidor
-    app.run(host=args.host, port=args.port)
+    if args.workers > 1:
+        run_gunicorn(args.host, args.port, args.workers, args.threads)
+    elif args.threads > 1:
+        start_retention()
+        run_waitress(args.host, args.port, args.threads)
+    else:
+        start_retention()
+        app.run(host=args.host, port=args.port)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file